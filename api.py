@@ -0,0 +1,284 @@
+import json
+import math
+import time
+
+from flask import Blueprint, Flask, Response, request
+from flask_cors import CORS
+
+from db import get_pool
+from leaderboard_stream import STREAM_RETRY_AFTER, LeaderboardBroadcaster, StreamFullError
+from metrics import counter, histogram, render_all, start_snapshots
+from response_cache import VersionedResponseCache, VersionProbe
+from standings import StandingsWindow, get_leaderboard_version, read_standings, resolve_window
+from static_assets import send_static
+from wallet_names import resolve_usernames
+
+
+# ==============================
+# CONFIG
+# ==============================
+LEADERBOARD_VERSION_TTL = 1.0  # seconds between data-version checks per worker
+
+web = Blueprint("web", __name__)
+
+LEADERBOARD_QUERY_SECONDS = histogram(
+    "swapfest_leaderboard_query_seconds", "Time to read standings and resolve usernames for a leaderboard build.")
+LEADERBOARD_RENDER_SECONDS = histogram(
+    "swapfest_leaderboard_render_seconds", "Time to serialize and compress a rebuilt leaderboard response.")
+LEADERBOARD_CACHE = counter(
+    "swapfest_leaderboard_cache_requests_total", "/api/leaderboard requests by response cache result.", ("result",))
+
+
+# ==============================
+# ROUTES
+# ==============================
+@web.route("/api/db_pool")
+def api_db_pool():
+    """
+    Get database connection pool statistics for operators.
+    
+    Returns:
+        JSON response with in_use, idle, waiting, created, recycled and max_size.
+    """
+    return get_pool().stats()
+
+@web.route("/metrics")
+def api_metrics():
+    """
+    Export metrics in Prometheus text format.
+    
+    Includes this worker's live metrics and the latest snapshot of every
+    other process (scanner, bot, other web workers), labelled by role and
+    instance.
+    
+    Returns:
+        text/plain exposition.
+    """
+    return Response(render_all("web"), mimetype="text/plain; version=0.0.4")
+
+@web.route('/', defaults={'path': ''})
+@web.route('/<path:path>')
+def serve_react(path: str):
+    """
+    Serve React application files with fallback to index.html for client-side routing.
+    
+    Args:
+        path: Requested file path within the React build directory.
+    
+    Returns:
+        File response from the react-build directory, precompressed when possible.
+    """
+    return send_static(request, path)
+
+def build_leaderboard(window: StandingsWindow | None = None) -> dict:
+    """
+    Build the Swapfest leaderboard payload with points and prizes.
+    
+    Standings are read on a pooled connection that is returned before
+    usernames are resolved, so a build never holds two connections.
+    
+    Args:
+        window: Contest or time range to build the leaderboard for (default: current contest).
+    
+    Returns:
+        Dictionary with prize_pool and leaderboard entries.
+    
+    Raises:
+        LookupError: If the window's contest is not registered.
+    """
+    # Per-address totals and hourly rollups are maintained by the scanner (see standings.py)
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        rows = read_standings(conn.cursor(), window or resolve_window())
+
+    def _to_iso(ts):
+        # Works if ts is already a string (SQLite) or a datetime (Postgres)
+        try:
+            return ts.isoformat(sep=' ')
+        except AttributeError:
+            return str(ts) if ts is not None else None
+
+    # Map wallets to usernames (one batched lookup) + attach last_scored_at
+    usernames = resolve_usernames(from_address for from_address, _, _ in rows)
+    LEADERBOARD_QUERY_SECONDS.observe(time.perf_counter() - started)
+    leaderboard_data = [
+        {
+            "username": usernames[from_address],
+            "points": total_points,
+            "last_scored_at": _to_iso(last_scored_at),
+        }
+        for (from_address, total_points, last_scored_at) in rows
+    ]
+
+    # 1️⃣ Total prize pool
+    prize_pool = sum(float(entry["points"]) for entry in leaderboard_data)
+
+    # 2️⃣ Prize percentage mapping by rank
+    prize_percentages = {1: 25, 2: 20, 3: 15, 4: 11, 5: 8, 6: 6, 7: 5, 8: 4, 9: 3, 10: 2}
+
+    # 3️⃣ Add prize info
+    for index, entry in enumerate(leaderboard_data, start=1):
+        if index in prize_percentages:
+            percent = prize_percentages[index]
+            pet_count = math.ceil(prize_pool * (percent / 100))
+            entry["prize"] = f"{entry['points']} sweepstake entries + Pet your horse {pet_count} times"
+        else:
+            entry["prize"] = "-"
+
+    return {
+        "prize_pool": prize_pool,
+        "leaderboard": leaderboard_data
+    }
+
+
+def read_leaderboard_version() -> int:
+    """
+    Read the leaderboard data version on a pooled connection.
+    
+    The connection is returned right away rather than kept for the request,
+    since a leaderboard build checks out its own.
+    
+    Returns:
+        Current leaderboard data version.
+    """
+    with get_pool().connection() as conn:
+        return get_leaderboard_version(conn.cursor())
+
+
+leaderboard_cache = VersionedResponseCache()
+leaderboard_version = VersionProbe(read_leaderboard_version, ttl=LEADERBOARD_VERSION_TTL)
+
+
+@web.route("/api/leaderboard")
+def api_leaderboard():
+    """
+    Get Swapfest leaderboard with points, prizes, and timing multipliers.
+    
+    Query parameters pick the window: contest=<id> for a registered
+    contest, or start=<UTC>[&end=<UTC>] or hours=<n> (ending now) for any
+    time range, not both; the current contest by default. Ranges are summed from hourly
+    rollups, so past seasons and "last 24h" cost about the same.
+    
+    The serialized JSON is cached per window and leaderboard data version
+    and served with a strong ETag (304 on If-None-Match) and gzip/brotli
+    variants.
+    
+    Returns:
+        JSON response containing prize pool and leaderboard data with entries,
+        400 on an invalid range or 404 on an unknown contest.
+    """
+    args = request.args
+    hours = None
+    if "hours" in args:
+        try:
+            hours = float(args["hours"])
+        except ValueError:
+            return {"error": "hours must be a number"}, 400
+    try:
+        window = resolve_window(args.get("contest"), args.get("start"), args.get("end"), hours)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    version = leaderboard_version.get()
+    cached = leaderboard_cache.get(window.key, version)
+    LEADERBOARD_CACHE.labels("miss" if cached is None else "hit").inc()
+    if cached is None:
+        try:
+            payload = build_leaderboard(window)
+        except LookupError as e:
+            return {"error": str(e)}, 404
+        started = time.perf_counter()
+        cached = leaderboard_cache.put(window.key, version, json.dumps(payload).encode())
+        LEADERBOARD_RENDER_SECONDS.observe(time.perf_counter() - started)
+    return cached.to_response(request)
+
+
+def build_stream_snapshot(version: int) -> dict:
+    """
+    Build the leaderboard for the stream and share it with /api/leaderboard's cache.
+    
+    Args:
+        version: Data version the snapshot is built for.
+    
+    Returns:
+        Leaderboard payload.
+    """
+    window = resolve_window()
+    payload = build_leaderboard(window)
+    started = time.perf_counter()
+    leaderboard_cache.put(window.key, version, json.dumps(payload).encode())
+    LEADERBOARD_RENDER_SECONDS.observe(time.perf_counter() - started)
+    return payload
+
+
+leaderboard_broadcaster = LeaderboardBroadcaster(read_leaderboard_version, build_stream_snapshot)
+
+
+@web.route("/api/leaderboard/stream")
+def api_leaderboard_stream():
+    """
+    Stream leaderboard updates as Server-Sent Events.
+    
+    Clients get a "snapshot" event (same payload as /api/leaderboard plus
+    version), then a "delta" event per change with version, from_version,
+    prize_pool, length and the changed rank positions. All clients share one
+    leaderboard build per change. Each client holds a worker thread, so a
+    worker with STREAM_MAX_SUBSCRIBERS clients answers 503 with Retry-After.
+    
+    Returns:
+        text/event-stream response.
+    """
+    try:
+        subscriber = leaderboard_broadcaster.subscribe()
+    except StreamFullError:
+        return (
+            {"error": "Too many live viewers, retry shortly"}, 503,
+            {"Retry-After": str(STREAM_RETRY_AFTER), "Cache-Control": "no-cache"}
+        )
+    response = Response(
+        leaderboard_broadcaster.stream(subscriber),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Runs even if the body is never iterated, unlike the generator's finally
+    response.call_on_close(lambda: leaderboard_broadcaster.unsubscribe(subscriber))
+    return response
+
+
+@web.route("/api/leaderboard/stream/stats")
+def api_leaderboard_stream_stats():
+    """
+    Get leaderboard stream statistics for operators.
+    
+    Returns:
+        JSON response with subscribers, max_subscribers, rejected and version.
+    """
+    return leaderboard_broadcaster.stats()
+
+
+# ==============================
+# APP FACTORY
+# ==============================
+def create_app() -> Flask:
+    """
+    Create the web application: leaderboard API, live stream and React frontend.
+    
+    Run it under the production server (see gunicorn.conf.py), e.g.
+    gunicorn -c gunicorn.conf.py "api:create_app()". Migrations are applied
+    once by the server's master process, not per worker.
+    
+    Returns:
+        Flask application.
+    """
+    app = Flask(__name__)
+    CORS(app)
+    start_snapshots("web")
+    app.register_blueprint(web)
+    return app
+
+
+if __name__ == "__main__":
+    # Development server only
+    from migrations import migrate
+    migrate()
+    create_app().run(host="0.0.0.0", port=8000, threaded=True)
@@ -0,0 +1,253 @@
+# ==============================
+# IMPORTS
+# ==============================
+import argparse
+import asyncio
+import sys
+
+import swapfest
+from db import get_pool, prepare_query
+from gift_store import get_checkpoint, save_gifts
+from metrics import start_snapshots
+from migrations import migrate
+
+
+# ==============================
+# CONFIG
+# ==============================
+BACKFILL_SHARDS = 16
+BACKFILL_WORKERS = 4
+BACKFILL_WINDOW = 500  # blocks per get_range_gifts call inside a shard
+
+
+# ==============================
+# JOBS
+# ==============================
+def load_job(start_height: int) -> tuple[int, int] | None:
+    """
+    Read the range of an unfinished backfill started at a height.
+    
+    Shard checkpoints are named after the shard ranges, so a re-run must
+    split exactly the same range to resume them.
+    
+    Args:
+        start_height: First block height of the job.
+    
+    Returns:
+        Tuple of (end height, shard count), or None.
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(prepare_query('''
+            SELECT end_height, shards FROM backfill_jobs WHERE start_height = ?
+        '''), (start_height,))
+        row = cursor.fetchone()
+        conn.commit()
+    return (int(row[0]), int(row[1])) if row else None
+
+
+def save_job(start_height: int, end_height: int, shards: int) -> None:
+    """
+    Record the resolved range of a backfill so re-runs resume the same shards.
+    
+    Args:
+        start_height: First block height of the job.
+        end_height: Last block height of the job.
+        shards: Number of shards.
+    """
+    with get_pool().connection() as conn:
+        conn.cursor().execute(prepare_query('''
+            INSERT INTO backfill_jobs (start_height, end_height, shards)
+            VALUES (?, ?, ?)
+            ON CONFLICT (start_height) DO UPDATE SET
+                end_height = excluded.end_height,
+                shards = excluded.shards
+        '''), (start_height, end_height, shards))
+        conn.commit()
+
+
+def finish_job(start_height: int) -> None:
+    """
+    Drop a job's range once every shard is done, so the next run starts afresh.
+    """
+    with get_pool().connection() as conn:
+        conn.cursor().execute(prepare_query('''
+            DELETE FROM backfill_jobs WHERE start_height = ?
+        '''), (start_height,))
+        conn.commit()
+
+
+# ==============================
+# SHARDS
+# ==============================
+def split_range(start_height: int, end_height: int, shards: int) -> list[tuple[int, int]]:
+    """
+    Split an inclusive block range into contiguous shards of near-equal size.
+    
+    Args:
+        start_height: First block height (inclusive).
+        end_height: Last block height (inclusive).
+        shards: Number of shards to produce.
+    
+    Returns:
+        List of (from_height, to_height) pairs, inclusive, in block order.
+    """
+    total = end_height - start_height + 1
+    shards = max(1, min(shards, total))
+    size, extra = divmod(total, shards)
+    ranges = []
+    height = start_height
+    for i in range(shards):
+        shard_end = height + size - 1 + (1 if i < extra else 0)
+        ranges.append((height, shard_end))
+        height = shard_end + 1
+    return ranges
+
+
+def shard_checkpoint_name(from_height: int, to_height: int) -> str:
+    """
+    Name of the checkpoint row for a shard. The live scanner's checkpoint is never used.
+    
+    Args:
+        from_height: First block height of the shard.
+        to_height: Last block height of the shard.
+    
+    Returns:
+        Checkpoint name.
+    """
+    return f"backfill:{from_height}-{to_height}"
+
+
+async def backfill_shard(from_height: int, to_height: int, window: int = BACKFILL_WINDOW) -> int:
+    """
+    Scan one shard window by window, resuming from its checkpoint.
+    
+    Args:
+        from_height: First block height of the shard.
+        to_height: Last block height of the shard.
+        window: Blocks per range query.
+    
+    Returns:
+        Number of new gifts inserted.
+    """
+    name = shard_checkpoint_name(from_height, to_height)
+    done = await asyncio.to_thread(get_checkpoint, name)
+    height = from_height if done is None else done + 1
+    inserted = 0
+
+    while height <= to_height:
+        window_end = min(height + window - 1, to_height)
+        gifts = await swapfest.get_range_gifts(height, window_end)
+        rows = await swapfest.score_gifts(gifts)
+        new_gifts, _ = await asyncio.to_thread(save_gifts, rows, name, window_end)
+        inserted += new_gifts
+        height = window_end + 1
+
+    print(f"Shard {from_height}-{to_height} done: {inserted} new gifts")
+    return inserted
+
+
+async def backfill(
+    start_height: int,
+    end_height: int,
+    shards: int = BACKFILL_SHARDS,
+    workers: int = BACKFILL_WORKERS,
+    window: int = BACKFILL_WINDOW
+) -> tuple[int, int]:
+    """
+    Rescan a historical block range with a pool of concurrent shard workers.
+    
+    Each shard keeps its own checkpoint, so re-running with the same range
+    and shard count resumes an interrupted backfill (the command line
+    reuses the range recorded by the first run; see resolve_job()). Gifts are upserted on
+    txn_id, so gifts already stored by the live scanner are not duplicated.
+    
+    Args:
+        start_height: First block height (inclusive).
+        end_height: Last block height (inclusive).
+        shards: Number of shards to split the range into.
+        workers: Number of shards processed at the same time.
+        window: Blocks per range query inside a shard.
+    
+    Returns:
+        Tuple of (new gifts inserted, shards that failed).
+    """
+    queue: asyncio.Queue[tuple[int, int]] = asyncio.Queue()
+    for shard in split_range(start_height, end_height, shards):
+        queue.put_nowait(shard)
+
+    inserted = 0
+    failed = []
+
+    async def worker() -> None:
+        nonlocal inserted
+        while not queue.empty():
+            from_height, to_height = queue.get_nowait()
+            try:
+                count = await backfill_shard(from_height, to_height, window)
+                inserted += count
+            except Exception as e:
+                print(f"Shard {from_height}-{to_height} failed: {e}", file=sys.stderr, flush=True)
+                failed.append((from_height, to_height))
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    finally:
+        await swapfest.close_http_session()
+
+    if failed:
+        print(f"{len(failed)} shards failed; re-run the same command to resume them.", file=sys.stderr, flush=True)
+    print(f"Backfill {start_height}-{end_height} finished: {inserted} new gifts")
+    return inserted, len(failed)
+
+
+async def resolve_job(start_height: int, end_height: int | None, shards: int | None) -> tuple[int, int]:
+    """
+    Pick the range and shard count of a backfill run and record them.
+    
+    Values given on the command line win. Missing ones come from the
+    unfinished job with the same start height, if any; otherwise the end is
+    the indexed chain head at the first run, which is then kept for re-runs.
+    
+    Args:
+        start_height: First block height.
+        end_height: Last block height, or None.
+        shards: Number of shards, or None.
+    
+    Returns:
+        Tuple of (end height, shard count).
+    """
+    job = await asyncio.to_thread(load_job, start_height)
+    if job is not None:
+        print(f"Resuming backfill {start_height}-{job[0]} in {job[1]} shards")
+        end_height = job[0] if end_height is None else end_height
+        shards = job[1] if shards is None else shards
+    if end_height is None:
+        end_height = await swapfest.get_chain_head() - swapfest.TIP_DELAY
+    shards = BACKFILL_SHARDS if shards is None else shards
+    if job != (end_height, shards):
+        await asyncio.to_thread(save_job, start_height, end_height, shards)
+    print(f"Backfill range {start_height}-{end_height} in {shards} shards "
+          f"(same as --start {start_height} --end {end_height} --shards {shards})")
+    return end_height, shards
+
+
+async def _main(args: argparse.Namespace) -> None:
+    await asyncio.to_thread(migrate)
+    start_snapshots("backfill")
+    end_height, shards = await resolve_job(args.start, args.end, args.shards)
+    _, failed = await backfill(args.start, end_height, shards, args.workers, args.window)
+    if not failed:
+        await asyncio.to_thread(finish_job, args.start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill Swapfest gifts for a historical block range.")
+    parser.add_argument("--start", type=int, default=swapfest.STARTING_HEIGHT, help="first block height")
+    parser.add_argument("--end", type=int, default=None,
+                        help="last block height (default: that of the unfinished job, else the indexed chain head)")
+    parser.add_argument("--shards", type=int, default=None,
+                        help=f"shard count (default: that of the unfinished job, else {BACKFILL_SHARDS})")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--window", type=int, default=BACKFILL_WINDOW)
+    asyncio.run(_main(parser.parse_args()))
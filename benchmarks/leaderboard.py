@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from datetime import datetime, timedelta
+
+# Benchmarks always run against a throwaway SQLite database; db binds the
+# backend from DATABASE_URL at import time, so drop it before importing.
+os.environ.pop("DATABASE_URL", None)
+
+import aiohttp  # noqa: E402
+from werkzeug.serving import make_server  # noqa: E402
+
+import db  # noqa: E402
+import wallet_names  # noqa: E402
+from benchmarks.report import latency_summary, print_report  # noqa: E402
+from gift_store import save_gifts  # noqa: E402
+from migrations import migrate  # noqa: E402
+from standings import CONTESTS, CURRENT_CONTEST_ID  # noqa: E402
+
+
+# ==============================
+# CONFIG
+# ==============================
+BENCH_GIFTS = 50_000
+BENCH_ADDRESSES = 2_000
+BENCH_REQUESTS = 5_000
+BENCH_CONCURRENCY = 32
+SEED_BATCH_SIZE = 1_000
+
+
+# ==============================
+# SETUP
+# ==============================
+def _gift(rng: random.Random, index: int, addresses: int, start: datetime, span: float) -> dict:
+    return {
+        "txn_id": f"bench{index:059x}",
+        "moment_id": index,
+        "from_address": f"0x{rng.randrange(addresses):016x}",
+        "points": rng.choice([0, 1, 1, 1, 5, 20, 100]),
+        "timestamp": (start + timedelta(seconds=rng.random() * span)).strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def seed(path: str, gifts: int, addresses: int, seed_value: int = 1) -> None:
+    """
+    Create a SQLite database holding `gifts` gifts from `addresses` senders
+    inside the current contest, stored the way the scanner stores them.
+    
+    Usernames resolve to the address itself, so no wallet service is called.
+    """
+    db.SQLITE_PATH = path
+    migrate()
+    wallet_names.username_cache = wallet_names.UsernameCache(lookup=lambda batch: {a: a for a in batch})
+
+    contest = CONTESTS[CURRENT_CONTEST_ID]
+    start = datetime.strptime(contest.start_time, '%Y-%m-%d %H:%M:%S')
+    span = (datetime.strptime(contest.end_time, '%Y-%m-%d %H:%M:%S') - start).total_seconds()
+    rng = random.Random(seed_value)
+    for first in range(0, gifts, SEED_BATCH_SIZE):
+        batch = range(first, min(first + SEED_BATCH_SIZE, gifts))
+        save_gifts([_gift(rng, index, addresses, start, span) for index in batch])
+
+
+def serve_locally() -> tuple[str, Callable[[], None]]:
+    """
+    Serve api.create_app() on a free port with werkzeug's threaded server.
+    
+    Returns:
+        Tuple of (base URL, shutdown function).
+    """
+    from api import create_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # no per-request access log
+    server = make_server("127.0.0.1", 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-web", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+def start_writer(interval: float, addresses: int, stop: threading.Event) -> threading.Thread:
+    """
+    Store one new gift every `interval` seconds, as the scanner would, so
+    the leaderboard data version keeps changing under load.
+    """
+    def write() -> None:
+        rng = random.Random(2)
+        contest = CONTESTS[CURRENT_CONTEST_ID]
+        start = datetime.strptime(contest.start_time, '%Y-%m-%d %H:%M:%S')
+        index = 10 ** 12
+        while not stop.wait(interval):
+            save_gifts([_gift(rng, index, addresses, start, 3600)])
+            index += 1
+
+    thread = threading.Thread(target=write, name="bench-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+# ==============================
+# LOAD
+# ==============================
+async def load(url: str, requests: int, concurrency: int, revalidate: bool, query: str = "") -> dict:
+    """
+    Issue `requests` GETs of /api/leaderboard from `concurrency` clients.
+    
+    Args:
+        url: Base URL of the web app.
+        requests: Total requests.
+        concurrency: Clients issuing requests back to back.
+        revalidate: Send each client's last ETag as If-None-Match.
+        query: Query string selecting the window, e.g. "hours=24".
+    
+    Returns:
+        Scenario result.
+    """
+    remaining = requests
+    latencies: list[float] = []
+    statuses: Counter = Counter()
+    received = 0
+
+    async def client(session: aiohttp.ClientSession) -> None:
+        nonlocal remaining, received
+        etag = None
+        while remaining > 0:
+            remaining -= 1
+            headers = {"Accept-Encoding": "gzip, br"}
+            if revalidate and etag:
+                headers["If-None-Match"] = etag
+            started = time.monotonic()
+            async with session.get(f"{url}/api/leaderboard?{query}", headers=headers, auto_decompress=False) as response:
+                body = await response.read()
+                latencies.append(time.monotonic() - started)
+            statuses[str(response.status)] += 1
+            received += len(body)
+            etag = response.headers.get("ETag", etag)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.monotonic()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        seconds = time.monotonic() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 2),
+        "requests_per_s": round(requests / seconds, 1),
+        "latency": latency_summary(latencies),
+        "status": dict(statuses),
+        "not_modified_ratio": round(statuses["304"] / requests, 3),
+        "kb_received": round(received / 1024, 1),
+    }
+
+
+def run(args: argparse.Namespace, url: str) -> None:
+    for revalidate in (False, True):
+        result = asyncio.run(load(url, args.requests, args.concurrency, revalidate, args.query))
+        print_report(f"leaderboard.{'revalidate' if revalidate else 'full'}", result, args.json)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /api/leaderboard.")
+    parser.add_argument("--url", default=None, help="benchmark a running server instead of a seeded local one")
+    parser.add_argument("--gifts", type=int, default=BENCH_GIFTS, help="gifts seeded in the local database")
+    parser.add_argument("--addresses", type=int, default=BENCH_ADDRESSES, help="distinct senders seeded")
+    parser.add_argument("--requests", type=int, default=BENCH_REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=BENCH_CONCURRENCY)
+    parser.add_argument("--write-interval", type=float, default=0.0,
+                        help="store a new gift every N seconds during the run (local server only)")
+    parser.add_argument("--query", default="",
+                        help="leaderboard window, e.g. 'hours=24' or 'start=2025-10-01&end=2025-10-08'")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per scenario")
+    args = parser.parse_args()
+
+    if args.url:
+        run(args, args.url.rstrip("/"))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with contextlib.redirect_stdout(sys.stderr):
+            seed(os.path.join(directory, "bench.db"), args.gifts, args.addresses)
+        url, shutdown = serve_locally()
+        stop = threading.Event()
+        if args.write_interval > 0:
+            start_writer(args.write_interval, args.addresses, stop)
+        try:
+            run(args, url)
+        finally:
+            stop.set()
+            shutdown()
@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from aiohttp import web
+
+
+# ==============================
+# CONFIG
+# ==============================
+TREASURY = "0xf853bd09d46e7db6"
+DEPOSIT_EVENT = "A.0b2a3299cc857e29.TopShot.Deposit"
+WITHDRAW_EVENT = "A.0b2a3299cc857e29.TopShot.Withdraw"
+TIERS = ["MOMENT_TIER_COMMON", "MOMENT_TIER_FANDOM", "MOMENT_TIER_RARE", "MOMENT_TIER_LEGENDARY"]
+TIMESTAMP = "2025-10-01T12:00:00Z"
+
+
+@dataclass
+class MockConfig:
+    """
+    Knobs of the synthetic chain and of the fault injection.
+    
+    Attributes:
+        head: Chain head height reported by /blocks.
+        gifts_per_block: Mean treasury deposits (gifts) per block.
+        deposits_per_block: Mean deposits to other accounts per block (noise on /events).
+        latency: Base response latency in seconds.
+        jitter: Extra uniform random latency in seconds.
+        rate_429: Probability that a request is answered with 429 Too Many Requests.
+        rate_5xx: Probability that a request is answered with 503.
+        retry_after: Retry-After seconds sent with 429s.
+        jokic_share: Share of moments that score (Jokic headline).
+        purchase_share: Share of treasury deposits that are purchases (a
+            fungible token withdrawal first), which are not gifts.
+        seed: Seed for the chain contents; the same seed gives the same chain.
+    """
+    head: int = 118_600_000
+    gifts_per_block: float = 0.05
+    deposits_per_block: float = 2.0
+    latency: float = 0.02
+    jitter: float = 0.01
+    rate_429: float = 0.0
+    rate_5xx: float = 0.0
+    retry_after: float = 0.0
+    jokic_share: float = 0.5
+    purchase_share: float = 0.0
+    seed: int = 1
+
+
+@dataclass
+class MockStats:
+    """
+    Requests served by route, and faults injected.
+    """
+    requests: Counter = field(default_factory=Counter)
+    faults: Counter = field(default_factory=Counter)
+
+    def reset(self) -> None:
+        self.requests.clear()
+        self.faults.clear()
+
+
+# ==============================
+# SYNTHETIC CHAIN
+# ==============================
+def _count(rng: random.Random, mean: float) -> int:
+    whole = int(mean)
+    return whole + (1 if rng.random() < mean - whole else 0)
+
+
+def block_events(config: MockConfig, height: int) -> tuple[dict, ...]:
+    """
+    Deterministic TopShot events of one block: a Withdraw and a Deposit per
+    transfer, where deposits go to the treasury (gifts) or elsewhere (noise).
+    
+    Transaction hashes encode (height, index) so /transaction can rebuild them.
+    """
+    return _block_events(config.seed, config.gifts_per_block, config.deposits_per_block, config.purchase_share, height)
+
+
+def _sender(moment_id: str) -> str:
+    return f"0x{random.Random(moment_id).getrandbits(64) % 500:016x}"  # 500 distinct senders
+
+
+@lru_cache(maxsize=100_000)
+def _block_events(
+    seed: int, gifts_per_block: float, deposits_per_block: float, purchase_share: float, height: int
+) -> tuple[dict, ...]:
+    rng = random.Random(seed * 1_000_003 + height)
+    gifts = _count(rng, gifts_per_block)
+    noise = _count(rng, deposits_per_block)
+    recipients = [TREASURY] * gifts + [f"0x{rng.getrandbits(64):016x}" for _ in range(noise)]
+    rng.shuffle(recipients)
+    events = []
+    for index, recipient in enumerate(recipients):
+        txn_id = f"{height:016x}{index:08x}" + "0" * 40
+        moment_id = str(height * 100 + index)
+        purchase = rng.random() < purchase_share
+        common = {"block_height": height, "transaction_hash": txn_id, "timestamp": TIMESTAMP}
+        events.append({**common, "name": WITHDRAW_EVENT, "event_index": 1 if purchase else 0,
+                       "fields": {"id": moment_id, "from": _sender(moment_id)}})
+        events.append({**common, "name": DEPOSIT_EVENT, "event_index": 4 if purchase else 3,
+                       "fields": {"id": moment_id, "to": recipient}})
+    return tuple(events)
+
+
+def transaction(config: MockConfig, txn_id: str) -> dict | None:
+    """
+    The /transaction body of a synthetic transfer transaction.
+    """
+    try:
+        height, index = int(txn_id[:16], 16), int(txn_id[16:24], 16)
+        withdraw, deposit = block_events(config, height)[2 * index:2 * index + 2]
+    except (ValueError, IndexError):
+        return None
+    events = [
+        {"name": "A.0b2a3299cc857e29.TopShot.MomentTransferred", "fields": {}},
+        {"name": "A.f233dcee88fe0abe.FungibleToken.Withdrawn", "fields": {}},
+    ]
+    if withdraw["event_index"] == 1:  # purchase: payment is withdrawn first
+        events.insert(0, {"name": "A.f233dcee88fe0abe.FungibleToken.Withdrawn", "fields": {}})
+    events.insert(withdraw["event_index"], {"name": WITHDRAW_EVENT, "fields": withdraw["fields"]})
+    events.insert(deposit["event_index"], {"name": DEPOSIT_EVENT, "fields": deposit["fields"]})
+    return {
+        "transactions": [{
+            "id": txn_id,
+            "status": "SEALED",
+            "timestamp": TIMESTAMP,
+            "events": events,
+        }]
+    }
+
+
+def moment(config: MockConfig, moment_id: str) -> dict:
+    """
+    The getMintedMoment data of a synthetic moment.
+    """
+    rng = random.Random(f"{config.seed}:{moment_id}")
+    jokic = rng.random() < config.jokic_share
+    return {
+        "id": moment_id,
+        "tier": rng.choice(TIERS),
+        "set": {"flowId": 2 if rng.random() < 0.02 else 7},
+        "play": {"headline": "Nikola Jokic" if jokic else "Someone Else"},
+    }
+
+
+# ==============================
+# SERVER
+# ==============================
+GRAPHQL_ALIAS = re.compile(r"(m\d+): getMintedMoment\(momentId: \$(m\d+)\)")
+
+
+class MockUpstream:
+    """
+    aiohttp stand-in for the Find API (/simple/v1/blocks, /events,
+    /transaction, /auth/v1/generate) and Top Shot GraphQL (getMintedMoment).
+    """
+
+    def __init__(self, config: MockConfig | None = None):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self._fault_rng = random.Random(self.config.seed)
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler):
+        route = request.path.rsplit("/", 1)[-1]
+        self.stats.requests[route] += 1
+        config = self.config
+        await asyncio.sleep(config.latency + self._fault_rng.random() * config.jitter)
+        roll = self._fault_rng.random()
+        if roll < config.rate_429:
+            self.stats.faults["429"] += 1
+            return web.Response(status=429, headers={"Retry-After": str(config.retry_after)})
+        if roll < config.rate_429 + config.rate_5xx:
+            self.stats.faults["503"] += 1
+            return web.Response(status=503)
+        return await handler(request)
+
+    async def blocks(self, request: web.Request) -> web.Response:
+        height = min(int(request.query.get("height", self.config.head)), self.config.head)
+        return web.json_response({"blocks": [{"height": height}]})
+
+    async def events(self, request: web.Request) -> web.Response:
+        query = request.query
+        from_height = int(query["from_height"])
+        to_height = min(int(query["to_height"]), self.config.head)
+        limit, offset = int(query.get("limit", 100)), int(query.get("offset", 0))
+        events = [
+            event
+            for height in range(from_height, to_height + 1)
+            for event in block_events(self.config, height)
+            if event["name"] == query.get("name", DEPOSIT_EVENT)
+        ]
+        return web.json_response({"events": events[offset:offset + limit]})
+
+    async def transaction(self, request: web.Request) -> web.Response:
+        body = transaction(self.config, request.query.get("id", ""))
+        if body is None:
+            return web.json_response({"error": "not found"}, status=404)
+        return web.json_response(body)
+
+    async def generate(self, request: web.Request) -> web.Response:
+        return web.json_response({"access_token": "bench-token", "token_type": "Bearer", "expires_in": 3600})
+
+    async def graphql(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        variables = payload.get("variables", {})
+        data = {
+            alias: {"data": moment(self.config, variables[variable])}
+            for alias, variable in GRAPHQL_ALIAS.findall(payload.get("query", ""))
+        }
+        return web.json_response({"data": data})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._faults])
+        app.router.add_get("/simple/v1/blocks", self.blocks)
+        app.router.add_get("/simple/v1/events", self.events)
+        app.router.add_get("/simple/v1/transaction", self.transaction)
+        app.router.add_post("/auth/v1/generate", self.generate)
+        app.router.add_post("/graphql", self.graphql)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Start serving in the current event loop.
+        
+        Args:
+            host: Interface to bind.
+            port: Port to bind, 0 for any free port.
+        
+        Returns:
+            Base URL of the server.
+        """
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self.url = f"http://{host}:{self._runner.addresses[0][1]}"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def environment(self) -> dict[str, str]:
+        """
+        Environment variables pointing swapfest.py at this server.
+        """
+        return {
+            "FIND_BASE_URL": f"{self.url}/simple/v1",
+            "FIND_AUTH_URL": f"{self.url}/auth/v1/generate",
+            "TOPSHOT_GRAPHQL_URL": f"{self.url}/graphql",
+        }
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add a --flag for every MockConfig knob.
+    """
+    for name, default in vars(MockConfig()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(**{name: getattr(args, name) for name in vars(MockConfig())})
+
+
+async def _serve(config: MockConfig, port: int) -> None:
+    upstream = MockUpstream(config)
+    await upstream.start(port=port)
+    for name, value in upstream.environment().items():
+        print(f"export {name}={value}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await upstream.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve mock Find and Top Shot APIs for benchmarks.")
+    parser.add_argument("--port", type=int, default=8089)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(config_from_args(args), args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,55 @@
+import json
+import math
+
+
+# ==============================
+# REPORTING
+# ==============================
+def percentile(samples: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of a sample.
+    
+    Args:
+        samples: Measured values.
+        pct: Percentile in [0, 100].
+    
+    Returns:
+        The percentile, or 0.0 for an empty sample.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(samples: list[float]) -> dict:
+    """
+    p50/p99/max of latencies in seconds, reported in milliseconds.
+    """
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 1),
+        "p99_ms": round(percentile(samples, 99) * 1000, 1),
+        "max_ms": round(max(samples, default=0.0) * 1000, 1),
+    }
+
+
+def print_report(name: str, result: dict, as_json: bool = False) -> None:
+    """
+    Print one scenario's result as aligned lines, or as one JSON line for
+    comparing runs.
+    
+    Args:
+        name: Scenario name.
+        result: Flat or one-level nested dictionary of numbers.
+        as_json: Print {"scenario": name, **result} as JSON instead.
+    """
+    if as_json:
+        print(json.dumps({"scenario": name, **result}, sort_keys=True))
+        return
+    print(f"== {name}")
+    for key, value in result.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{k}={v}" for k, v in sorted(value.items())) or "-"
+        print(f"   {key:<22} {value}")
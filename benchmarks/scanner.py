@@ -0,0 +1,190 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+# Benchmarks always run against a throwaway SQLite database; db binds the
+# backend from DATABASE_URL at import time, so drop it before importing.
+os.environ.pop("DATABASE_URL", None)
+
+import db  # noqa: E402
+import swapfest  # noqa: E402
+from benchmarks.mock_upstream import MockUpstream, add_config_arguments, config_from_args  # noqa: E402
+from benchmarks.report import latency_summary, print_report  # noqa: E402
+from gift_store import LIVE_CHECKPOINT, get_checkpoint, save_checkpoint  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+# ==============================
+# CONFIG
+# ==============================
+BENCH_BLOCKS = 2000            # blocks scanned per scenario
+CHECKPOINT_POLL_INTERVAL = 0.05
+SCENARIOS = ("main", "block_gifts")
+
+
+# ==============================
+# SETUP
+# ==============================
+class RecordingScheduler(swapfest.WindowScheduler):
+    """
+    Window scheduler that also keeps every window's (blocks, events, seconds).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.windows: list[tuple[int, int, float]] = []
+
+    def record(self, blocks: int, events: int, seconds: float) -> None:
+        self.windows.append((blocks, events, seconds))
+        super().record(blocks, events, seconds)
+
+
+def use_database(path: str) -> None:
+    """
+    Point the store at a fresh SQLite file and create the schema.
+    """
+    db.SQLITE_PATH = path
+    migrate()
+
+
+def use_upstream(upstream: MockUpstream) -> None:
+    """
+    Point swapfest at the mock server and drop state left by a previous scenario.
+    """
+    environment = upstream.environment()
+    swapfest.BASE_URL = environment["FIND_BASE_URL"]
+    swapfest.AUTH_URL = environment["FIND_AUTH_URL"]
+    swapfest.GRAPHQL_URL = environment["TOPSHOT_GRAPHQL_URL"]
+    swapfest.token_manager = swapfest.TokenManager()
+    swapfest.metadata_cache = swapfest.MomentMetadataCache()
+    upstream.stats.reset()
+
+
+def count_gifts() -> int:
+    with db.get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM gifts')
+        return int(cursor.fetchone()[0])
+
+
+def _result(upstream: MockUpstream, blocks: int, gifts: int, seconds: float, latencies: list[float]) -> dict:
+    return {
+        "blocks": blocks,
+        "gifts": gifts,
+        "seconds": round(seconds, 2),
+        "blocks_per_s": round(blocks / seconds, 1),
+        "gifts_per_s": round(gifts / seconds, 1),
+        "window_latency": latency_summary(latencies),
+        "upstream_requests": dict(upstream.stats.requests),
+        "upstream_faults": dict(upstream.stats.faults),
+    }
+
+
+# ==============================
+# SCENARIOS
+# ==============================
+async def bench_main(upstream: MockUpstream, blocks: int) -> dict:
+    """
+    Run the live pipeline (swapfest.main) over the last `blocks` ready blocks.
+    
+    Timing stops once the checkpoint reaches the last block; window latency
+    is the per-window busy time the pipeline reports to its scheduler.
+    
+    Args:
+        upstream: Running mock server.
+        blocks: Number of blocks to scan.
+    
+    Returns:
+        Scenario result.
+    """
+    use_upstream(upstream)
+    end = upstream.config.head - swapfest.TIP_DELAY
+    start = end - blocks + 1
+    scheduler = swapfest.window_scheduler = RecordingScheduler()
+    await asyncio.to_thread(save_checkpoint, LIVE_CHECKPOINT, start + swapfest.OFFSET)
+    gifts_before = await asyncio.to_thread(count_gifts)
+
+    started = time.monotonic()
+    task = asyncio.ensure_future(swapfest.main())
+    try:
+        while (await asyncio.to_thread(get_checkpoint, LIVE_CHECKPOINT)) < end:
+            if task.done():
+                task.result()
+                raise RuntimeError("swapfest.main() stopped before reaching the last block")
+            await asyncio.sleep(CHECKPOINT_POLL_INTERVAL)
+        seconds = time.monotonic() - started
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    gifts = await asyncio.to_thread(count_gifts) - gifts_before
+    return _result(upstream, blocks, gifts, seconds, [window[2] for window in scheduler.windows])
+
+
+async def bench_block_gifts(upstream: MockUpstream, blocks: int, window: int) -> dict:
+    """
+    Scan the last `blocks` ready blocks with get_block_gifts(), one fixed
+    window at a time, without storing the gifts.
+    
+    Args:
+        upstream: Running mock server.
+        blocks: Number of blocks to scan.
+        window: Blocks per get_block_gifts() call.
+    
+    Returns:
+        Scenario result.
+    """
+    use_upstream(upstream)
+    end = upstream.config.head - swapfest.TIP_DELAY
+    height = end - blocks + 1
+    gifts, latencies = 0, []
+
+    started = time.monotonic()
+    try:
+        while height <= end:
+            offset = min(window, end - height + 1) - 1
+            window_started = time.monotonic()
+            found = await swapfest.get_block_gifts(height, offset)
+            latencies.append(time.monotonic() - window_started)
+            gifts += len(found or [])
+            height += offset + 1
+    finally:
+        await swapfest.close_http_session()
+    return _result(upstream, blocks, gifts, time.monotonic() - started, latencies)
+
+
+async def run(args: argparse.Namespace) -> None:
+    upstream = MockUpstream(config_from_args(args))
+    await upstream.start()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        for scenario in args.scenario:
+            with output:
+                if scenario == "main":
+                    result = await bench_main(upstream, args.blocks)
+                else:
+                    result = await bench_block_gifts(upstream, args.blocks, args.window)
+            print_report(f"scanner.{scenario}", result, args.json)
+    finally:
+        await upstream.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the gift scanner against the mock upstream APIs.")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--blocks", type=int, default=BENCH_BLOCKS, help="blocks scanned per scenario")
+    parser.add_argument("--window", type=int, default=swapfest.OFFSET, help="blocks per get_block_gifts() call")
+    parser.add_argument("--json", action="store_true", help="print one JSON line per scenario")
+    parser.add_argument("--verbose", action="store_true", help="keep the scanner's own output")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with contextlib.redirect_stdout(sys.stderr):
+            use_database(os.path.join(directory, "bench.db"))
+        asyncio.run(run(args))
@@ -0,0 +1,350 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psycopg2
+
+
+# ==============================
+# CONFIG
+# ==============================
+# Detect if running on Heroku by checking if DATABASE_URL is set
+DATABASE_URL = os.getenv('DATABASE_URL')
+db_type = 'postgresql' if DATABASE_URL else 'sqlite'
+SQLITE_PATH = 'local.db'
+
+# Connection pool (connection counts / seconds)
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+POOL_CHECKOUT_TIMEOUT = 10   # wait this long for a free connection before failing
+POOL_MAX_IDLE = 300          # close connections left idle longer than this
+POOL_PING_AFTER = 30         # health-check connections idle longer than this on checkout
+
+# Query timeouts
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))  # PostgreSQL-side; 0 disables
+ASYNC_QUERY_TIMEOUT = 45     # seconds an awaiting coroutine waits for checkout + query
+
+
+# ==============================
+# CONNECTIONS
+# ==============================
+def connect(statement_timeout_ms: int = STATEMENT_TIMEOUT_MS):
+    """
+    Open a new connection to the gifts database.
+    
+    Args:
+        statement_timeout_ms: PostgreSQL statement_timeout for this session, 0 for none.
+    
+    Returns:
+        Database connection object (PostgreSQL or SQLite depending on environment).
+    """
+    if db_type == 'postgresql':
+        return psycopg2.connect(
+            DATABASE_URL,
+            sslmode='require',
+            options=f'-c statement_timeout={statement_timeout_ms}'
+        )
+    # Connections may move between threads (pool, asyncio.to_thread) but are
+    # never used by two threads at once.
+    return sqlite3.connect(SQLITE_PATH, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+
+
+def prepare_query(query: str) -> str:
+    """
+    Convert '?' placeholders to the active backend's parameter style.
+    
+    Args:
+        query: SQL query written with '?' placeholders.
+    
+    Returns:
+        The query with '%s' placeholders on PostgreSQL, unchanged on SQLite.
+    """
+    if db_type == 'postgresql':
+        return query.replace('?', '%s')
+    return query
+
+
+# ==============================
+# CONNECTION POOL
+# ==============================
+class PoolTimeout(Exception):
+    """
+    Raised when no connection becomes free within the checkout timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections.
+    
+    Connections are reused most-recently-used first. Connections idle longer
+    than max_idle are closed, and connections idle longer than ping_after are
+    checked with SELECT 1 before being handed out. Broken ones are replaced.
+    """
+
+    def __init__(
+        self,
+        factory=connect,
+        max_size: int = POOL_MAX_SIZE,
+        checkout_timeout: float = POOL_CHECKOUT_TIMEOUT,
+        max_idle: float = POOL_MAX_IDLE,
+        ping_after: float = POOL_PING_AFTER
+    ):
+        self.factory = factory
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self._idle: deque = deque()  # (connection, last_used) pairs, most recent last
+        self._in_use = 0
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._cond = threading.Condition()
+
+    def _close(self, conn) -> None:
+        self._recycled += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _reap_idle(self, now: float) -> None:
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+
+    def _healthy(self, conn) -> bool:
+        if getattr(conn, 'closed', 0):
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout: float | None = None):
+        """
+        Check out a connection, waiting for one to be returned if the pool is full.
+        
+        Args:
+            timeout: Seconds to wait; defaults to checkout_timeout.
+        
+        Returns:
+            Database connection. Return it with putconn().
+        
+        Raises:
+            PoolTimeout: If no connection became free in time.
+        """
+        deadline = time.monotonic() + (self.checkout_timeout if timeout is None else timeout)
+        while True:
+            with self._cond:
+                conn = last_used = None
+                while True:
+                    now = time.monotonic()
+                    self._reap_idle(time.time())
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._in_use < self.max_size:
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No database connection free after waiting; {self.stats()}")
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = self.factory()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._cond:
+                    self._created += 1
+                return conn
+            if time.time() - last_used < self.ping_after or self._healthy(conn):
+                return conn
+            with self._cond:
+                self._close(conn)
+            self._release_slot()
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """
+        Return a checked-out connection. Any open transaction is rolled back.
+        
+        Args:
+            conn: Connection from getconn().
+            discard: Close the connection instead of reusing it.
+        """
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or getattr(conn, 'closed', 0):
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.time()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """
+        Context manager that checks out a connection and always returns it.
+        
+        Args:
+            timeout: Seconds to wait for a free connection.
+        
+        Yields:
+            Database connection.
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of pool usage for operators.
+        
+        Returns:
+            Dictionary with in_use, idle, waiting, created, recycled and max_size.
+        """
+        return {
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "waiting": self._waiting,
+            "created": self._created,
+            "recycled": self._recycled,
+            "max_size": self.max_size,
+        }
+
+    def closeall(self) -> None:
+        """
+        Close every idle connection. Checked-out connections are closed when returned.
+        """
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close(conn)
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+    
+    Returns:
+        Shared ConnectionPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+# ==============================
+# ASYNC ACCESS
+# ==============================
+class AsyncDatabase:
+    """
+    Runs blocking database work for asyncio code on a dedicated thread pool.
+    
+    Every call checks out its own pooled connection, so concurrent coroutines
+    never share a cursor and the event loop keeps running while queries do.
+    Calls give up after timeout seconds; on PostgreSQL the server-side
+    statement_timeout cancels the query itself.
+    """
+
+    def __init__(self, pool: ConnectionPool | None = None, timeout: float = ASYNC_QUERY_TIMEOUT):
+        self.pool = pool or get_pool()
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.max_size, thread_name_prefix="db")
+
+    async def call(self, fn, *args, timeout: float | None = None):
+        """
+        Run a blocking function on the database thread pool.
+        
+        Args:
+            fn: Function to call, e.g. a gift_store helper that manages its own connection.
+            *args: Positional arguments for fn.
+            timeout: Seconds to wait; defaults to self.timeout.
+        
+        Returns:
+            Whatever fn returns.
+        
+        Raises:
+            asyncio.TimeoutError: If fn did not finish in time.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, *args)
+        return await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+
+    async def run(self, fn, *args, timeout: float | None = None):
+        """
+        Call fn(cursor, *args) in one transaction on a pooled connection.
+        
+        The transaction is committed if fn returns and rolled back if it raises.
+        
+        Args:
+            fn: Function taking a cursor and args.
+            *args: Positional arguments for fn.
+            timeout: Seconds to wait; defaults to self.timeout.
+        
+        Returns:
+            Whatever fn returns.
+        """
+        def transaction():
+            with self.pool.connection() as conn:
+                result = fn(conn.cursor(), *args)
+                conn.commit()
+                return result
+        return await self.call(transaction, timeout=timeout)
+
+    async def fetchall(self, query: str, params: tuple = (), timeout: float | None = None) -> list[tuple]:
+        """
+        Run a query written with '?' placeholders and return all rows.
+        
+        Args:
+            query: SQL query.
+            params: Query parameters.
+            timeout: Seconds to wait; defaults to self.timeout.
+        
+        Returns:
+            List of row tuples.
+        """
+        def execute(cursor):
+            cursor.execute(prepare_query(query), params)
+            return cursor.fetchall()
+        return await self.run(execute, timeout=timeout)
+
+    def close(self) -> None:
+        """
+        Stop the thread pool and close idle pooled connections.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.closeall()
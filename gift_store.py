@@ -0,0 +1,219 @@
+import csv
+import io
+
+from db import get_pool, prepare_query, db_type
+from queries import UPDATE_GIFT_POINTS
+from standings import normalize_timestamp, refresh_rollups, refresh_standings
+from utils.helpers import get_last_processed_block
+
+
+# ==============================
+# CONFIG
+# ==============================
+LIVE_CHECKPOINT = "live"  # checkpoint of swapfest.main(); backfill shards use their own
+GIFT_COLUMNS = ("txn_id", "moment_id", "from_address", "points", "timestamp")
+SQLITE_INSERT_ROWS = 150  # rows per multi-row INSERT (SQLite allows 999 parameters)
+
+
+# ==============================
+# SCANNER CHECKPOINTS
+# ==============================
+def _write_checkpoint(cursor, name: str, block_height: int) -> None:
+    cursor.execute(prepare_query('''
+        INSERT INTO scanner_checkpoints (name, block_height)
+        VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET block_height = excluded.block_height
+    '''), (name, block_height))
+
+
+def get_checkpoint(name: str) -> int | None:
+    """
+    Get the last block height processed by a named scanner.
+    
+    Args:
+        name: Checkpoint name (e.g. "backfill:118542742-118642741").
+    
+    Returns:
+        Last processed block height, or None if the scanner never saved one.
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(prepare_query('''
+            SELECT block_height FROM scanner_checkpoints WHERE name = ?
+        '''), (name,))
+        row = cursor.fetchone()
+        conn.commit()
+    return int(row[0]) if row else None
+
+
+def save_checkpoint(name: str, block_height: int) -> None:
+    """
+    Record the last block height processed by a named scanner.
+    
+    Args:
+        name: Checkpoint name.
+        block_height: Last fully processed block height.
+    """
+    with get_pool().connection() as conn:
+        _write_checkpoint(conn.cursor(), name, block_height)
+        conn.commit()
+
+
+def get_live_checkpoint() -> int | None:
+    """
+    Get the last block height stored by the live scanner.
+    
+    Falls back to the legacy helpers checkpoint until the live scanner has
+    saved its first window here.
+    
+    Returns:
+        Last processed block height, or None if none was ever saved.
+    """
+    height = get_checkpoint(LIVE_CHECKPOINT)
+    if height is None:
+        height = get_last_processed_block()
+    return height
+
+
+# ==============================
+# GIFTS
+# ==============================
+def _stage_gifts(cursor, rows: list[tuple]) -> None:
+    """
+    Load rows into a temporary gift_staging table: COPY on PostgreSQL,
+    multi-row INSERTs on SQLite.
+    """
+    if db_type == 'postgresql':
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS gift_staging
+            (LIKE gifts INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+        ''')
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY gift_staging ({', '.join(GIFT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    else:
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS gift_staging AS
+            SELECT txn_id, moment_id, from_address, points, timestamp FROM gifts WHERE 0
+        ''')
+        cursor.execute('DELETE FROM gift_staging')
+        for i in range(0, len(rows), SQLITE_INSERT_ROWS):
+            chunk = rows[i:i + SQLITE_INSERT_ROWS]
+            values = ", ".join("(?, ?, ?, ?, ?)" for _ in chunk)
+            cursor.execute(
+                f"INSERT INTO gift_staging ({', '.join(GIFT_COLUMNS)}) VALUES {values}",
+                [value for row in chunk for value in row]
+            )
+
+
+def save_gifts(
+    gifts: list[dict],
+    checkpoint_name: str | None = None,
+    block_height: int | None = None
+) -> tuple[int, int]:
+    """
+    Store a window of scored gifts and advance a checkpoint in one transaction.
+    
+    Gifts are upserted on txn_id: new transactions are inserted, and an
+    existing gift whose points are 0 takes the new score. Stored scores are
+    never lowered. Timestamps are stored as 'YYYY-MM-DD HH:MM:SS' UTC.
+    Leaderboard standings and hourly rollups of the senders are refreshed
+    in the same transaction. If the transaction fails, neither the gifts,
+    the aggregates nor the checkpoint are written.
+    
+    Args:
+        gifts: Dictionaries with txn_id, moment_id, from_address, points, timestamp.
+        checkpoint_name: Checkpoint to advance, or None to only store gifts.
+        block_height: Last block height covered by gifts, saved to checkpoint_name.
+    
+    Returns:
+        Tuple of (gifts inserted, gifts whose points were updated).
+    """
+    rows = list({
+        gift['txn_id']: tuple(
+            normalize_timestamp(gift[column]) if column == "timestamp" else gift[column]
+            for column in GIFT_COLUMNS
+        )
+        for gift in gifts
+    }.values())
+
+    # Returning the connection to the pool rolls back anything left uncommitted
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        inserted = updated = 0
+        if rows:
+            _stage_gifts(cursor, rows)
+            cursor.execute('''
+                UPDATE gifts
+                SET points = (SELECT s.points FROM gift_staging s WHERE s.txn_id = gifts.txn_id)
+                WHERE COALESCE(points, 0) = 0
+                  AND txn_id IN (SELECT txn_id FROM gift_staging WHERE COALESCE(points, 0) > 0)
+            ''')
+            updated = cursor.rowcount
+            # ON CONFLICT rather than NOT EXISTS: a concurrent writer (backfill next to the
+            # live scanner) may commit the same txn_id after this statement's snapshot
+            cursor.execute(f'''
+                INSERT INTO gifts ({', '.join(GIFT_COLUMNS)})
+                SELECT {', '.join('s.' + column for column in GIFT_COLUMNS)}
+                FROM gift_staging s
+                WHERE true
+                ON CONFLICT (txn_id) DO NOTHING
+            ''')
+            inserted = cursor.rowcount
+            senders = [(row[GIFT_COLUMNS.index("from_address")], row[GIFT_COLUMNS.index("timestamp")]) for row in rows]
+            refresh_standings(cursor, {from_address for from_address, _ in senders})
+            refresh_rollups(cursor, senders)
+        if checkpoint_name is not None:
+            _write_checkpoint(cursor, checkpoint_name, block_height)
+        conn.commit()
+    return inserted, updated
+
+
+def apply_gift_points(cursor, points_by_txn: dict[str, int]) -> int:
+    """
+    Set new point values for stored gifts and refresh the senders' standings
+    and hourly rollups inside the caller's transaction.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        points_by_txn: Mapping of txn_id to new point value.
+    
+    Returns:
+        Number of gifts updated.
+    """
+    if not points_by_txn:
+        return 0
+    cursor.executemany(prepare_query(UPDATE_GIFT_POINTS), [(points, txn_id) for txn_id, points in points_by_txn.items()])
+    updated = cursor.rowcount
+
+    txn_ids = list(points_by_txn)
+    placeholders = ", ".join("?" for _ in txn_ids)
+    cursor.execute(prepare_query(f'''
+        SELECT from_address, "timestamp" FROM gifts WHERE txn_id IN ({placeholders})
+    '''), txn_ids)
+    senders = cursor.fetchall()
+    refresh_standings(cursor, [from_address for from_address, _ in senders])
+    refresh_rollups(cursor, senders)
+    return updated
+
+
+def update_gift_points(points_by_txn: dict[str, int]) -> int:
+    """
+    Set new point values for stored gifts and refresh the senders' standings.
+    
+    Args:
+        points_by_txn: Mapping of txn_id to new point value.
+    
+    Returns:
+        Number of gifts updated.
+    """
+    if not points_by_txn:
+        return 0
+    with get_pool().connection() as conn:
+        updated = apply_gift_points(conn.cursor(), points_by_txn)
+        conn.commit()
+    return updated
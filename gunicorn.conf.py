@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+
+# ==============================
+# CONFIG
+# ==============================
+# Start with: gunicorn -c gunicorn.conf.py "api:create_app()"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# Every worker has its own database pool (DB_POOL_MAX_SIZE): keep
+# workers x pool size under the database's connection limit
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+
+# Threaded workers: each open /api/leaderboard/stream holds a thread, not a process.
+# Streams are capped per worker (STREAM_MAX_SUBSCRIBERS, default WEB_THREADS - 8)
+# so viewers cannot take every thread; raise WEB_THREADS for more live viewers
+worker_class = "gthread"
+threads = int(os.getenv('WEB_THREADS', '32'))
+
+timeout = 30
+graceful_timeout = 20
+keepalive = 5
+max_requests = 5000            # recycle workers now and then to bound memory growth
+max_requests_jitter = 500
+accesslog = "-"
+
+
+# ==============================
+# HOOKS
+# ==============================
+def on_starting(server) -> None:
+    """
+    Apply database migrations once in the master, before workers start.
+    """
+    from migrations import migrate
+    migrate()
@@ -0,0 +1,287 @@
+import json
+import os
+import queue
+import select
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+
+import db
+from standings import DATA_VERSION_CHANNEL
+
+
+# ==============================
+# CONFIG
+# ==============================
+STREAM_POLL_INTERVAL = 1.0       # seconds between version checks without LISTEN (SQLite)
+STREAM_LISTEN_TIMEOUT = 30.0     # seconds between safety re-checks while LISTENing (PostgreSQL)
+STREAM_HEARTBEAT = 15.0          # seconds between SSE keep-alive comments
+STREAM_SUBSCRIBER_BUFFER = 16    # events queued per client before it is resynced with a snapshot
+# Each stream client holds one gthread worker thread for as long as it is
+# connected; keep STREAM_RESERVED_THREADS of WEB_THREADS for plain requests
+STREAM_RESERVED_THREADS = 8
+STREAM_MAX_SUBSCRIBERS = int(os.getenv(
+    'STREAM_MAX_SUBSCRIBERS', str(max(int(os.getenv('WEB_THREADS', '32')) - STREAM_RESERVED_THREADS, 1))))
+STREAM_RETRY_AFTER = 10          # seconds a rejected client is told to wait before reconnecting
+
+
+# ==============================
+# DIFFS
+# ==============================
+def diff_leaderboard(old: dict, new: dict) -> list[dict]:
+    """
+    Rank positions whose entry changed between two leaderboard payloads.
+    
+    Args:
+        old: Previous payload (prize_pool, leaderboard).
+        new: Current payload.
+    
+    Returns:
+        List of {"rank": 1-based rank, "entry": new entry} for changed positions.
+    """
+    old_entries = old.get("leaderboard", [])
+    return [
+        {"rank": rank, "entry": entry}
+        for rank, entry in enumerate(new.get("leaderboard", []), start=1)
+        if rank > len(old_entries) or old_entries[rank - 1] != entry
+    ]
+
+
+def sse_event(event: str, data: dict, event_id: int | None = None) -> bytes:
+    """
+    Serialize one Server-Sent Event.
+    
+    Args:
+        event: Event type.
+        data: JSON payload.
+        event_id: Optional event id.
+    
+    Returns:
+        Encoded event, ready to write to every client.
+    """
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+# ==============================
+# CHANGE SIGNAL
+# ==============================
+class VersionSignal:
+    """
+    Waits until data versions may have changed.
+    
+    On PostgreSQL it LISTENs on the channel writers notify when they bump a
+    version (the scanner does so with every committed window). On SQLite,
+    or while the listening connection is down, it falls back to polling.
+    """
+
+    def __init__(self, channel: str = DATA_VERSION_CHANNEL):
+        self.channel = channel
+        self._conn = None
+
+    def _listen(self):
+        if self._conn is None:
+            conn = db.connect(statement_timeout_ms=0)
+            conn.autocommit = True
+            conn.cursor().execute(f'LISTEN {self.channel}')
+            self._conn = conn
+        return self._conn
+
+    def wait(self) -> None:
+        """
+        Block until a notification arrives or the fallback interval passes.
+        """
+        if db.db_type != 'postgresql':
+            time.sleep(STREAM_POLL_INTERVAL)
+            return
+        try:
+            conn = self._listen()
+            if not conn.notifies:
+                select.select([conn], [], [], STREAM_LISTEN_TIMEOUT)
+                conn.poll()
+            conn.notifies.clear()
+        except Exception as e:
+            print(f"Leaderboard stream LISTEN failed, polling: {e}", file=sys.stderr, flush=True)
+            self.close()
+            time.sleep(STREAM_POLL_INTERVAL)
+
+    def close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+# ==============================
+# BROADCASTER
+# ==============================
+class StreamFullError(Exception):
+    """
+    Raised when a worker already serves its maximum number of stream clients.
+    """
+
+
+class Subscriber:
+    """
+    One connected stream client's bounded event queue.
+    """
+
+    def __init__(self, snapshot: bytes, buffer: int = STREAM_SUBSCRIBER_BUFFER):
+        self._queue: queue.Queue[bytes] = queue.Queue(maxsize=buffer)
+        self._queue.put(snapshot)
+
+    def push(self, event: bytes, snapshot: bytes) -> None:
+        """
+        Queue an event; a client that fell behind is resynced with a snapshot instead.
+        """
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put_nowait(snapshot)
+
+    def get(self, timeout: float) -> bytes | None:
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LeaderboardBroadcaster:
+    """
+    Single in-process fan-out of leaderboard changes to stream clients.
+    
+    One background thread waits for a version change, builds the leaderboard
+    once, diffs it against the previous build and queues the same serialized
+    event for every subscriber, so the cost of a change does not grow with
+    the number of viewers. Every client occupies a server thread, so at
+    most max_subscribers are served at once; further clients are rejected.
+    """
+
+    def __init__(
+        self,
+        read_version: Callable[[], int],
+        build_snapshot: Callable[[int], dict],
+        signal: VersionSignal | None = None,
+        max_subscribers: int = STREAM_MAX_SUBSCRIBERS
+    ):
+        self.read_version = read_version
+        self.build_snapshot = build_snapshot
+        self.signal = signal or VersionSignal()
+        self.max_subscribers = max_subscribers
+        self.rejected = 0
+        self._subscribers: set[Subscriber] = set()
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._payload: dict | None = None
+        self._snapshot_event: bytes | None = None
+        self._thread: threading.Thread | None = None
+        self._refresh_lock = threading.Lock()
+
+    def _publish(self) -> None:
+        with self._refresh_lock:
+            version = self.read_version()
+            if version == self._version:
+                return
+            payload = self.build_snapshot(version)
+            snapshot_event = sse_event("snapshot", {"version": version, **payload}, version)
+            delta_event = None
+            if self._payload is not None:
+                delta_event = sse_event("delta", {
+                    "version": version,
+                    "from_version": self._version,
+                    "prize_pool": payload["prize_pool"],
+                    "length": len(payload["leaderboard"]),
+                    "changes": diff_leaderboard(self._payload, payload),
+                }, version)
+            # Swap state and queue the delta atomically, so a client subscribing
+            # now gets either the old snapshot plus this delta or the new snapshot
+            with self._lock:
+                self._version, self._payload, self._snapshot_event = version, payload, snapshot_event
+                if delta_event is not None:
+                    for subscriber in self._subscribers:
+                        subscriber.push(delta_event, snapshot_event)
+
+    def _run(self) -> None:
+        while True:
+            self.signal.wait()
+            try:
+                self._publish()
+            except Exception as e:
+                print(f"Leaderboard stream refresh failed: {e}", file=sys.stderr, flush=True)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="leaderboard-stream", daemon=True)
+            self._thread.start()
+
+    def subscribe(self) -> Subscriber:
+        """
+        Register a client; its first event is a full snapshot.
+        
+        Returns:
+            Subscriber to read events from; pass it to unsubscribe() when done.
+        
+        Raises:
+            StreamFullError: If max_subscribers clients are already connected.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                raise StreamFullError(f"{len(self._subscribers)} stream clients connected")
+        if self._snapshot_event is None:
+            self._publish()
+        self._start()
+        with self._lock:
+            subscriber = Subscriber(self._snapshot_event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, subscriber: Subscriber) -> Iterator[bytes]:
+        """
+        SSE body for one client: a snapshot, then deltas and keep-alives.
+        
+        Args:
+            subscriber: Client registered with subscribe(); unsubscribed when the body closes.
+        
+        Yields:
+            Encoded SSE events.
+        """
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                event = subscriber.get(timeout=STREAM_HEARTBEAT)
+                yield event if event is not None else b": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        """
+        Snapshot of the broadcaster for operators.
+        
+        Returns:
+            Dictionary with subscribers, max_subscribers, rejected and version.
+        """
+        with self._lock:
+            return {
+                "subscribers": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "rejected": self.rejected,
+                "version": self._version,
+            }
@@ -0,0 +1,340 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections.abc import Iterable
+
+from db import get_pool, prepare_query
+
+
+# ==============================
+# CONFIG
+# ==============================
+METRICS_SNAPSHOT_INTERVAL = 15.0   # seconds between writes of a process's metrics to the database
+METRICS_SNAPSHOT_MAX_AGE = 120.0   # snapshots older than this (exited processes) are not exported
+METRICS_SNAPSHOT_RETENTION = 86400.0  # snapshots older than this are deleted
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+WINDOW_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+# ==============================
+# METRIC TYPES
+# ==============================
+class _CounterValue:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: dict) -> list:
+        return [[name, labels, self.value]]
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("_lock", "bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: dict) -> list:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples, cumulative = [], 0
+        for bound, count in zip((*self.bounds, "+Inf"), counts):
+            cumulative += count
+            samples.append([f"{name}_bucket", {**labels, "le": str(bound)}, cumulative])
+        samples.append([f"{name}_sum", labels, total])
+        samples.append([f"{name}_count", labels, cumulative])
+        return samples
+
+
+class Metric(ABC):
+    """
+    A named metric family with optional labels.
+    
+    Recording is a dictionary lookup plus a short lock, so it is safe to
+    call on hot paths. With labels, call labels(*values) for the child to
+    record on; without, record on the metric itself.
+    """
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._default = self.labels()
+
+    @abstractmethod
+    def _new_child(self):
+        """
+        Create the value object of one label combination.
+        """
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def collect(self) -> dict:
+        family = {"name": self.name, "type": self.kind, "help": self.documentation, "samples": []}
+        for values, child in list(self._children.items()):
+            family["samples"] += child.samples(self.name, dict(zip(self.labelnames, values)))
+        return family
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+
+# ==============================
+# REGISTRY
+# ==============================
+_metrics: dict[str, Metric] = {}
+_metrics_lock = threading.Lock()
+
+
+def _register(metric_class, name: str, *args, **kwargs):
+    with _metrics_lock:
+        if name not in _metrics:
+            _metrics[name] = metric_class(name, *args, **kwargs)
+        return _metrics[name]
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    """
+    Get or create a process-wide counter.
+    """
+    return _register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    """
+    Get or create a process-wide gauge.
+    """
+    return _register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (),
+              buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+    """
+    Get or create a process-wide histogram.
+    """
+    return _register(Histogram, name, documentation, labelnames, buckets)
+
+
+def collect() -> list[dict]:
+    """
+    Read every metric of this process.
+    
+    Returns:
+        List of families: {"name", "type", "help", "samples": [[name, labels, value]]}.
+    """
+    return [metric.collect() for metric in list(_metrics.values())]
+
+
+# ==============================
+# EXPOSITION
+# ==============================
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(sources: Iterable[tuple[dict, list[dict]]]) -> str:
+    """
+    Render metric families of several processes in Prometheus text format.
+    
+    Families with the same name are merged so HELP and TYPE appear once;
+    each sample carries its process's labels.
+    
+    Args:
+        sources: (process labels, families) pairs.
+    
+    Returns:
+        Exposition text.
+    """
+    merged: dict[str, dict] = {}
+    for process_labels, families in sources:
+        for family in families:
+            entry = merged.setdefault(family["name"], {**family, "samples": []})
+            entry["samples"] += [
+                (name, {**process_labels, **labels}, value) for name, labels, value in family["samples"]
+            ]
+
+    lines = []
+    for name in sorted(merged):
+        family = merged[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for sample_name, labels, value in family["samples"]:
+            label_text = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ==============================
+# CROSS-PROCESS SNAPSHOTS
+# ==============================
+def instance_name() -> str:
+    """
+    Identify this process (host and pid, read at call time so forked workers differ).
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def save_snapshot(role: str) -> None:
+    """
+    Write this process's metrics to the metrics_snapshots table.
+    
+    Args:
+        role: Process role, e.g. "scanner", "bot" or "web".
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(prepare_query('''
+            INSERT INTO metrics_snapshots (instance, role, payload, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (instance) DO UPDATE SET
+                role = excluded.role,
+                payload = excluded.payload,
+                updated_at = excluded.updated_at
+        '''), (instance_name(), role, json.dumps(collect()), time.time()))
+        cursor.execute(prepare_query('''
+            DELETE FROM metrics_snapshots WHERE updated_at < ?
+        '''), (time.time() - METRICS_SNAPSHOT_RETENTION,))
+        conn.commit()
+
+
+def load_snapshots(max_age: float = METRICS_SNAPSHOT_MAX_AGE) -> list[tuple[str, str, list[dict]]]:
+    """
+    Read the recent metric snapshots of all processes.
+    
+    Args:
+        max_age: Ignore snapshots older than this many seconds.
+    
+    Returns:
+        List of (role, instance, families).
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(prepare_query('''
+            SELECT role, instance, payload FROM metrics_snapshots WHERE updated_at >= ?
+        '''), (time.time() - max_age,))
+        rows = cursor.fetchall()
+    return [(role, instance, json.loads(payload)) for role, instance, payload in rows]
+
+
+_snapshot_thread: threading.Thread | None = None
+
+
+def start_snapshots(role: str, interval: float = METRICS_SNAPSHOT_INTERVAL) -> None:
+    """
+    Snapshot this process's metrics to the database every interval seconds,
+    so /metrics on the web app can export them. Idempotent per process.
+    
+    Args:
+        role: Process role, e.g. "scanner", "bot" or "web".
+        interval: Seconds between snapshots.
+    """
+    global _snapshot_thread
+    with _metrics_lock:
+        if _snapshot_thread is not None and _snapshot_thread.is_alive():
+            return
+
+        def run() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    save_snapshot(role)
+                except Exception as e:
+                    print(f"Metrics snapshot failed: {e}", file=sys.stderr, flush=True)
+
+        _snapshot_thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+        _snapshot_thread.start()
+
+
+def render_all(role: str) -> str:
+    """
+    Prometheus text for this process (live) and every other process (latest snapshot).
+    
+    Args:
+        role: Role of this process.
+    
+    Returns:
+        Exposition text; samples are labelled with role and instance.
+    """
+    me = instance_name()
+    sources = [({"role": role, "instance": me}, collect())]
+    try:
+        sources += [
+            ({"role": other_role, "instance": instance}, families)
+            for other_role, instance, families in load_snapshots()
+            if instance != me
+        ]
+    except Exception as e:
+        print(f"Metrics snapshot read failed: {e}", file=sys.stderr, flush=True)
+    return render(sources)
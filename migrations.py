@@ -0,0 +1,325 @@
+import argparse
+import sys
+from collections.abc import Callable
+from dataclasses import dataclass
+
+import db
+from db import connect, prepare_query
+from queries import (
+    LATEST_GIFTS, LATEST_GIFTS_OF_ADDRESS, REBUILD_CONTEST_STANDINGS, REFRESH_ROLLUPS, REFRESH_STANDINGS,
+    RESCORE_PAGE, UPDATE_GIFT_POINTS, WINDOW_STANDINGS
+)
+from standings import CONTESTS, bucket_expression, bump_leaderboard_version, rebuild_contest_standings, rebuild_rollups
+
+
+# ==============================
+# CONFIG
+# ==============================
+MIGRATION_LOCK_ID = 73_110_018  # PostgreSQL advisory lock serializing concurrent runners
+
+
+# ==============================
+# MIGRATIONS
+# ==============================
+@dataclass(frozen=True)
+class Migration:
+    """
+    One schema change: applied once, in version order, in its own transaction.
+    """
+    version: int
+    description: str
+    apply: Callable[[object], None]
+
+
+def _execute_all(*statements: str) -> Callable[[object], None]:
+    def apply(cursor) -> None:
+        for statement in statements:
+            cursor.execute(statement)
+    return apply
+
+
+def _dedupe_gifts(cursor) -> None:
+    # Keep the best-scored row of every txn_id before txn_id becomes unique
+    row_id = "ctid" if db.db_type == 'postgresql' else "rowid"
+    cursor.execute(f'''
+        DELETE FROM gifts WHERE {row_id} IN (
+            SELECT row_id FROM (
+                SELECT {row_id} AS row_id,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY txn_id ORDER BY COALESCE(points, 0) DESC, {row_id}
+                       ) AS copy
+                FROM gifts
+            ) ranked
+            WHERE copy > 1
+        )
+    ''')
+    if cursor.rowcount:
+        print(f"Removed {cursor.rowcount} duplicate gifts", file=sys.stderr, flush=True)
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS gifts_txn_id_key ON gifts (txn_id)')
+
+
+def _rebuild_standings(cursor) -> None:
+    for contest in CONTESTS.values():
+        rebuild_contest_standings(cursor, contest)
+    bump_leaderboard_version(cursor)
+
+
+def _contests_and_rollups(cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS contests (
+            id TEXT PRIMARY KEY,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP NOT NULL
+        )
+    ''')
+    cursor.executemany(prepare_query('''
+        INSERT INTO contests (id, start_time, end_time) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO NOTHING
+    '''), [(contest.id, contest.start_time, contest.end_time) for contest in CONTESTS.values()])
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS gift_rollups (
+            bucket TIMESTAMP NOT NULL,
+            from_address TEXT NOT NULL,
+            total_points BIGINT NOT NULL DEFAULT 0,
+            gift_count BIGINT NOT NULL DEFAULT 0,
+            last_scored_at TIMESTAMP
+        )
+    ''')
+    # Upsert target of refresh_rollups() and the range scan of window standings
+    cursor.execute(
+        'CREATE UNIQUE INDEX IF NOT EXISTS gift_rollups_bucket_address ON gift_rollups (bucket, from_address)'
+    )
+    if db.db_type == 'sqlite':
+        # Find's '...T...Z' text sorts apart from the window bounds; store it as save_gifts() now does
+        cursor.execute('''
+            UPDATE gifts SET "timestamp" = strftime('%Y-%m-%d %H:%M:%S', "timestamp")
+            WHERE "timestamp" LIKE '%T%' AND strftime('%Y-%m-%d %H:%M:%S', "timestamp") IS NOT NULL
+        ''')
+    count = rebuild_rollups(cursor)
+    print(f"Built {count} hourly gift rollups", file=sys.stderr, flush=True)
+
+
+MIGRATIONS = [
+    Migration(1, "gifts table", _execute_all('''
+        CREATE TABLE IF NOT EXISTS gifts (
+            txn_id TEXT NOT NULL,
+            moment_id BIGINT NOT NULL,
+            from_address TEXT NOT NULL,
+            points BIGINT,
+            "timestamp" TIMESTAMP
+        )
+    ''')),
+    Migration(2, "scanner, standings, cache and job tables", _execute_all('''
+        CREATE TABLE IF NOT EXISTS scanner_checkpoints (
+            name TEXT PRIMARY KEY,
+            block_height BIGINT NOT NULL
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS leaderboard_standings (
+            contest_id TEXT NOT NULL,
+            from_address TEXT NOT NULL,
+            total_points BIGINT NOT NULL DEFAULT 0,
+            gift_count BIGINT NOT NULL DEFAULT 0,
+            last_scored_at TIMESTAMP,
+            PRIMARY KEY (contest_id, from_address)
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS moment_metadata (
+            moment_id BIGINT PRIMARY KEY,
+            metadata TEXT,
+            fetched_at DOUBLE PRECISION NOT NULL
+        )
+    ''', '''
+        CREATE TABLE IF NOT EXISTS rescore_jobs (
+            name TEXT PRIMARY KEY,
+            last_txn_id TEXT NOT NULL,
+            scanned BIGINT NOT NULL DEFAULT 0,
+            updated BIGINT NOT NULL DEFAULT 0
+        )
+    ''')),
+    Migration(3, "deduplicate gifts and make txn_id unique", _dedupe_gifts),
+    Migration(4, "gift indexes for standings, recent gifts and rescoring", _execute_all(
+        # Contest window aggregate (rebuild) and latest gifts: range/order on timestamp,
+        # sender and points read from the index
+        'CREATE INDEX IF NOT EXISTS gifts_timestamp_covering ON gifts ("timestamp", from_address, points)',
+        # Per-sender standings refresh and per-address recent gifts
+        'CREATE INDEX IF NOT EXISTS gifts_from_address_timestamp ON gifts (from_address, "timestamp" DESC, points)',
+        # Zero-point rescoring scan, paged in txn_id order
+        'CREATE INDEX IF NOT EXISTS gifts_zero_points ON gifts (txn_id) WHERE COALESCE(points, 0) = 0',
+    )),
+    Migration(5, "rebuild standings after deduplication", _rebuild_standings),
+    Migration(6, "metrics snapshots", _execute_all('''
+        CREATE TABLE IF NOT EXISTS metrics_snapshots (
+            instance TEXT PRIMARY KEY,
+            role TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            updated_at DOUBLE PRECISION NOT NULL
+        )
+    ''')),
+    Migration(7, "contest registry and hourly gift rollups", _contests_and_rollups),
+    Migration(8, "backfill jobs", _execute_all('''
+        CREATE TABLE IF NOT EXISTS backfill_jobs (
+            start_height BIGINT PRIMARY KEY,
+            end_height BIGINT NOT NULL,
+            shards INTEGER NOT NULL
+        )
+    ''')),
+]
+
+
+# ==============================
+# RUNNER
+# ==============================
+def _begin(conn, cursor) -> None:
+    if db.db_type == 'postgresql':
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+    else:
+        # Autocommit mode plus an explicit BEGIN keeps SQLite DDL inside the transaction
+        conn.isolation_level = None
+        cursor.execute('BEGIN IMMEDIATE')
+
+
+def _applied_versions(cursor) -> set[int]:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {int(row[0]) for row in cursor.fetchall()}
+
+
+def migrate(target: int | None = None) -> list[int]:
+    """
+    Apply pending migrations in version order.
+    
+    Each migration commits together with its schema_migrations row, so an
+    interrupted run resumes at the first missing version. Concurrent runners
+    (e.g. scanner and web app starting together) are serialized on
+    PostgreSQL with an advisory lock and on SQLite with BEGIN IMMEDIATE.
+    
+    Args:
+        target: Highest version to apply, or None for all.
+    
+    Returns:
+        Versions applied by this call.
+    """
+    applied_now = []
+    conn = connect(statement_timeout_ms=0)  # index builds may outlast the query timeout
+    try:
+        for migration in MIGRATIONS:
+            if target is not None and migration.version > target:
+                break
+            cursor = conn.cursor()
+            _begin(conn, cursor)
+            try:
+                if migration.version in _applied_versions(cursor):
+                    conn.rollback()
+                    continue
+                migration.apply(cursor)
+                cursor.execute(prepare_query('''
+                    INSERT INTO schema_migrations (version, description) VALUES (?, ?)
+                '''), (migration.version, migration.description))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied_now.append(migration.version)
+            print(f"Applied migration {migration.version}: {migration.description}", file=sys.stderr, flush=True)
+    finally:
+        conn.close()
+    return applied_now
+
+
+# ==============================
+# QUERY PLAN CHECKS
+# ==============================
+# Hot queries, with the SQL the application runs (queries.py) and the
+# indexes their plans must use; template fields filled in as at runtime
+_WINDOW = ('2025-09-25 21:00:00', '2025-10-22 00:00:00')
+HOT_QUERIES = {
+    "contest standings rebuild": (
+        REBUILD_CONTEST_STANDINGS, ('swapfest', *_WINDOW), ("gifts_timestamp_covering",)),
+    "standings refresh for senders": (
+        REFRESH_STANDINGS.format(placeholders="?, ?"), ('swapfest', '0x1', '0x2', *_WINDOW),
+        ("gifts_from_address_timestamp",)),
+    "rollup refresh for senders": (
+        REFRESH_ROLLUPS.format(bucket=bucket_expression(), placeholders="?, ?"), ('0x1', '0x2', *_WINDOW),
+        ("gifts_from_address_timestamp",)),
+    # Rollups for whole hours, raw gifts for the partial hours at both ends
+    "window standings": (
+        WINDOW_STANDINGS,
+        ('2025-10-01 01:00:00', '2025-10-02 00:00:00', '2025-10-01 00:30:00', '2025-10-01 01:00:00',
+         '2025-10-02 00:00:00', '2025-10-02 00:15:00'),
+        ("gift_rollups_bucket_address", "gifts_timestamp_covering")),
+    "latest gifts": (LATEST_GIFTS, (), ("gifts_timestamp_covering",)),
+    "latest gifts of an address": (LATEST_GIFTS_OF_ADDRESS, ('0x1',), ("gifts_from_address_timestamp",)),
+    "zero-point rescoring page": (
+        RESCORE_PAGE.format(where="COALESCE(points, 0) = 0"), ('', 500), ("gifts_zero_points",)),
+    "gift points update": (UPDATE_GIFT_POINTS, (7, 'abc'), ("gifts_txn_id_key",)),
+}
+
+
+def explain(cursor, query: str, params: tuple) -> str:
+    """
+    Get the planner's plan for a query as text.
+    
+    Args:
+        cursor: Database cursor.
+        query: SQL query with '?' placeholders.
+        params: Query parameters.
+    
+    Returns:
+        Plan text (EXPLAIN on PostgreSQL, EXPLAIN QUERY PLAN on SQLite).
+    """
+    if db.db_type == 'postgresql':
+        cursor.execute('EXPLAIN ' + prepare_query(query), params)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    cursor.execute('EXPLAIN QUERY PLAN ' + query, params)
+    return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+
+def check_plans() -> list[str]:
+    """
+    Check that every hot query is planned with its index.
+    
+    On PostgreSQL sequential scans are disabled for the check, since on a
+    small table the planner would rightly prefer them.
+    
+    Returns:
+        Names of hot queries whose plan does not use every expected index.
+    """
+    failures = []
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        if db.db_type == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, (query, params, indexes) in HOT_QUERIES.items():
+            plan = explain(cursor, query, params)
+            ok = all(index in plan for index in indexes)
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: expects {', '.join(indexes)}")
+            if not ok:
+                print("     " + plan.replace("\n", "\n     "))
+                failures.append(name)
+    finally:
+        conn.rollback()
+        conn.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database migrations.")
+    parser.add_argument("--target", type=int, default=None, help="highest version to apply")
+    parser.add_argument("--check-plans", action="store_true", help="verify hot queries use their indexes")
+    args = parser.parse_args()
+    migrate(args.target)
+    if args.check_plans and check_plans():
+        sys.exit(1)
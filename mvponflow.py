@@ -3,138 +3,21 @@ from discord.ext import commands
 import time
 import discord
 from utils.helpers import *
-from flask import Flask, g, jsonify
-import threading
-import swapfest
-import math
+from gift_store import get_live_checkpoint, save_gifts
+from db import AsyncDatabase, get_pool
+from metrics import start_snapshots
+from migrations import migrate
+from queries import LATEST_GIFTS, LATEST_GIFTS_OF_ADDRESS
+from standings import read_standings, resolve_window
+from wallet_names import resolve_usernames
+from rescore import RescoreFilter, RescoreProgress, start_rescore, throttled
 import os
-from flask_cors import CORS
-from flask import send_from_directory
 
+# Bring the schema up to date before the bot uses it
+migrate()
 
-# Discord bot and Flask app setup
-app = Flask(__name__)
-CORS(app)
-
-def get_db():
-    """
-    Get database connection from Flask application context.
-    
-    Returns:
-        Database connection object (PostgreSQL or SQLite depending on environment).
-    """
-    if 'db' not in g:
-        if db_type == 'postgresql':
-            g.db = psycopg2.connect(DATABASE_URL, sslmode='require')
-        else:
-            g.db = sqlite3.connect('local.db', detect_types=sqlite3.PARSE_DECLTYPES)
-            g.db.row_factory = sqlite3.Row
-    return g.db
-
-@app.teardown_appcontext
-def close_db(error) -> None:
-    """
-    Close database connection when application context tears down.
-    
-    Args:
-        error: Error object if teardown is due to an exception, None otherwise.
-    """
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve_react(path: str):
-    """
-    Serve React application files with fallback to index.html for client-side routing.
-    
-    Args:
-        path: Requested file path within the React build directory.
-    
-    Returns:
-        File response from the react-build directory.
-    """
-    if path != "" and os.path.exists(f"react-build/{path}"):
-        return send_from_directory('react-build', path)
-    else:
-        return send_from_directory('react-build', 'index.html')
-
-@app.route("/api/leaderboard")
-def api_leaderboard():
-    """
-    Get Swapfest leaderboard with points, prizes, and timing multipliers.
-    
-    Returns:
-        JSON response containing prize pool and leaderboard data with entries.
-    """
-    # Define event period in UTC
-    start_time = '2025-09-25 21:00:00'
-    end_time = '2025-10-22 00:00:00'
-
-    db = get_db()
-    cursor = db.cursor()
-
-    query = prepare_query('''
-        SELECT
-            from_address,
-            SUM(points) AS total_points,
-            MAX("timestamp") AS last_scored_at
-        FROM gifts
-        WHERE "timestamp" BETWEEN ? AND ?
-        GROUP BY from_address
-        ORDER BY total_points DESC, last_scored_at ASC
-    ''')
-
-    cursor.execute(query, (start_time, end_time))
-    rows = cursor.fetchall()
-
-    def _to_iso(ts):
-        # Works if ts is already a string (SQLite) or a datetime (Postgres)
-        try:
-            return ts.isoformat(sep=' ')
-        except AttributeError:
-            return str(ts) if ts is not None else None
-
-    # Map wallets to usernames + attach last_scored_at
-    leaderboard_data = [
-        {
-            "username": map_wallet_to_username(from_address),
-            "points": total_points,
-            "last_scored_at": _to_iso(last_scored_at),
-        }
-        for (from_address, total_points, last_scored_at) in rows
-    ]
-
-    # 1️⃣ Total prize pool
-    prize_pool = sum(float(entry["points"]) for entry in leaderboard_data)
-
-    # 2️⃣ Prize percentage mapping by rank
-    prize_percentages = {1: 25, 2: 20, 3: 15, 4: 11, 5: 8, 6: 6, 7: 5, 8: 4, 9: 3, 10: 2}
-
-    # 3️⃣ Add prize info
-    for index, entry in enumerate(leaderboard_data, start=1):
-        if index in prize_percentages:
-            percent = prize_percentages[index]
-            pet_count = math.ceil(prize_pool * (percent / 100))
-            entry["prize"] = f"{entry["points"]} sweepstake entries + Pet your horse {pet_count} times"
-        else:
-            entry["prize"] = "-"
-
-    return jsonify({
-        "prize_pool": prize_pool,
-        "leaderboard": leaderboard_data
-    })
-
-def run_flask() -> None:
-    """
-    Run Flask web server on all interfaces at port 8000.
-    """
-    app.run(host="0.0.0.0", port=8000)
-threading.Thread(target=run_flask).start()
-
-# Detect if running on Heroku by checking if DATABASE_URL is set
-DATABASE_URL = os.getenv('DATABASE_URL')  # Heroku PostgreSQL URL
+# Rescoring jobs call the upstream APIs; publish their metrics to /metrics
+start_snapshots("bot")
 
 # Define the intents required
 intents = discord.Intents.default()
@@ -144,10 +27,9 @@ intents.message_content = True  # Ensure you can read message content
 # Define the bot
 bot = commands.Bot(command_prefix='/', intents=intents)
 
-# On Heroku/Azure, use PostgreSQL
-conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-cursor = conn.cursor()
-db_type = 'postgresql'
+# Each command checks out its own pooled connection on the bot's database
+# threads, so slow queries never block the gateway loop
+bot_db = AsyncDatabase(get_pool())
 
 
 
@@ -155,29 +37,32 @@ db_type = 'postgresql'
     name="gift_leaderboard",
     description="Show Swapfest leaderboard by total gifted points in event period"
 )
-async def gift_leaderboard(interaction: discord.Interaction) -> None:
+async def gift_leaderboard(
+    interaction: discord.Interaction,
+    contest: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    hours: float | None = None
+) -> None:
     """
     Discord command to display Swapfest gift leaderboard with time-based multipliers.
     
+    Shows the current contest unless a contest id, a UTC start/end range or
+    the last `hours` is given.
+    
     Args:
         interaction: Discord interaction object for command invocation.
+        contest: Optional registered contest id.
+        start: Optional range start (UTC, e.g. 2025-10-01 00:00:00).
+        end: Optional range end (UTC), inclusive; defaults to now.
+        hours: Optional length of a range ending now, e.g. 24.
     """
-    # Define the event window in UTC
-    start_time = '2025-09-25 21:00:00'
-    end_time   = '2025-10-22 00:00:00'
-
-
-    cursor.execute(prepare_query('''
-        SELECT
-            from_address,
-            SUM(points) AS total_points
-        FROM gifts
-        WHERE timestamp BETWEEN ? AND ?
-        GROUP BY from_address
-        ORDER BY total_points DESC
-        LIMIT 20
-    '''), (start_time, end_time))
-    rows = cursor.fetchall()
+    try:
+        window = resolve_window(contest, start, end, hours)
+        rows = await bot_db.run(read_standings, window, 20)
+    except (ValueError, LookupError) as e:
+        await interaction.response.send_message(f"❌ {e}", ephemeral=True)
+        return
 
     if not rows:
         await interaction.response.send_message(
@@ -187,9 +72,10 @@ async def gift_leaderboard(interaction: discord.Interaction) -> None:
         return
 
     # Format leaderboard with wallet-to-username mapping
+    usernames = await bot_db.call(resolve_usernames, [from_address for from_address, _, _ in rows])
     leaderboard_lines = ["🎁 **Swapfest Gift Leaderboard** 🎁"]
-    for i, (from_address, total_points) in enumerate(rows, start=1):
-        username = map_wallet_to_username(from_address)
+    for i, (from_address, total_points, _) in enumerate(rows, start=1):
+        username = usernames[from_address]
         # If you prefer whole numbers, swap to: int(round(total_points))
         leaderboard_lines.append(f"{i}. `{username}` : **{total_points:.2f} points**")
 
@@ -214,8 +100,8 @@ async def latest_block(interaction: discord.Interaction) -> None:
         )
         return
 
-    # Call your helper function
-    last_block = get_last_processed_block()
+    # Live scanner checkpoint (falls back to the helpers checkpoint)
+    last_block = await bot_db.call(get_live_checkpoint)
 
     if last_block is None:
         await interaction.response.send_message(
@@ -263,14 +149,26 @@ async def add_gift(
         return
 
     try:
-        # ✅ Call your helpers.py function
-        save_gift(txn_id, moment_id, from_address, points, timestamp)
-
-        # ✅ Respond with success
-        await interaction.response.send_message(
-            f"✅ Gift added:\n- txn_id: {txn_id}\n- moment_id: {moment_id}\n- from: {from_address}\n- points: {points}\n- timestamp: {timestamp}",
-            ephemeral=True
-        )
+        # ✅ Store the gift and refresh the sender's standings
+        inserted, updated = await bot_db.call(save_gifts, [{
+            "txn_id": txn_id,
+            "moment_id": moment_id,
+            "from_address": from_address,
+            "points": points,
+            "timestamp": timestamp,
+        }])
+
+        # ✅ Respond with what was written (save_gifts skips stored txn_ids)
+        if inserted:
+            message = (
+                f"✅ Gift added:\n- txn_id: {txn_id}\n- moment_id: {moment_id}\n- from: {from_address}"
+                f"\n- points: {points}\n- timestamp: {timestamp}"
+            )
+        elif updated:
+            message = f"✅ Gift {txn_id} was already stored without points; its points are now {points}."
+        else:
+            message = f"⚠️ Gift {txn_id} already exists; nothing was changed."
+        await interaction.response.send_message(message, ephemeral=True)
 
     except Exception as e:
         # ✅ Error handling
@@ -305,24 +203,9 @@ async def latest_gifts_csv(
         return
 
     if from_address:
-        query = prepare_query('''
-            SELECT txn_id, moment_id, from_address, points, timestamp
-            FROM gifts
-            WHERE from_address = ?
-            ORDER BY timestamp DESC
-            LIMIT 10
-        ''')
-        cursor.execute(query, (from_address,))
+        rows = await bot_db.fetchall(LATEST_GIFTS_OF_ADDRESS, (from_address,))
     else:
-        query = prepare_query('''
-            SELECT txn_id, moment_id, from_address, points, timestamp
-            FROM gifts
-            ORDER BY timestamp DESC
-            LIMIT 10
-        ''')
-        cursor.execute(query)
-
-    rows = cursor.fetchall()
+        rows = await bot_db.fetchall(LATEST_GIFTS)
 
     if not rows:
         await interaction.response.send_message(
@@ -332,9 +215,10 @@ async def latest_gifts_csv(
         return
 
     csv_lines = ["txn_id,moment_id,from_address,points,timestamp"]
+    usernames = await bot_db.call(resolve_usernames, [row[2] for row in rows])
 
     for txn_id, moment_id, from_address, points, timestamp in rows:
-        display_name = map_wallet_to_username(from_address)
+        display_name = usernames[from_address]
         csv_line = f"{txn_id},{moment_id},{display_name},{points},{timestamp}"
         csv_lines.append(csv_line)
 
@@ -345,15 +229,27 @@ async def latest_gifts_csv(
 
 @bot.tree.command(
     name="swapfest_refresh_points",
-    description="(Admin only) Re-scan gifts with 0 points and refresh their scoring"
+    description="(Admin only) Re-score stored gifts (default: gifts with 0 points) in the background"
 )
 @commands.has_permissions(administrator=True)
-async def swapfest_refresh_points(interaction: discord.Interaction) -> None:
+async def swapfest_refresh_points(
+    interaction: discord.Interaction,
+    scope: str = "zero",
+    from_address: str | None = None,
+    since: str | None = None
+) -> None:
     """
-    Discord command to re-scan and refresh point values for gifts with 0 points (Admin only).
+    Discord command to re-score stored gifts in a background job (Admin only).
+    
+    The job resolves metadata in concurrent batches, updates gifts a page at
+    a time and resumes from its saved cursor if it was interrupted. Progress
+    is shown in one message, edited every few seconds.
     
     Args:
         interaction: Discord interaction object for command invocation.
+        scope: "zero" for gifts with 0 points, "all" for every gift.
+        from_address: Optional Flow address to only re-score that sender's gifts.
+        since: Optional UTC timestamp to only re-score gifts at or after it.
     """
     # Admin check
     if not is_admin(interaction):
@@ -363,65 +259,49 @@ async def swapfest_refresh_points(interaction: discord.Interaction) -> None:
         )
         return
 
-    await interaction.response.send_message(
-        "🔄 Refreshing points for gifts with 0 points. This may take a while...", 
-        ephemeral=True
-    )
-    FLOW_ACCOUNT = "0xf853bd09d46e7db6"
-
-    # 1️⃣ Find all gifts with 0 points
-    cursor.execute(prepare_query('''
-        SELECT txn_id, moment_id, from_address
-        FROM gifts
-    WHERE COALESCE(points, 0) = 0
-    '''))
-    rows = cursor.fetchall()
+    if scope not in ("zero", "all"):
+        await interaction.response.send_message(
+            "❌ scope must be `zero` or `all`.",
+            ephemeral=True
+        )
+        return
 
-    if not rows:
-        await interaction.followup.send(
-            "✅ No gifts with 0 points found.",
+    try:
+        gift_filter = RescoreFilter(scope, from_address, since)
+    except ValueError:
+        await interaction.response.send_message(
+            "❌ since must be a UTC timestamp, e.g. `2025-10-01 12:00:00`.",
             ephemeral=True
         )
         return
+    reporting = True
 
-    updated_count = 0
+    async def report(progress: RescoreProgress) -> None:
+        nonlocal reporting
+        if not reporting:
+            return
+        icon = "❌" if progress.error else "✅" if progress.done else "🔄"
+        try:
+            await interaction.edit_original_response(content=f"{icon} {progress.summary()}")
+        except discord.HTTPException:
+            # Interaction tokens expire after 15 minutes; the job keeps running
+            reporting = False
 
-    # 2️⃣ Process each gift
-    for txn_id, moment_id, from_address in rows:
-        await interaction.followup.send(
-            f"✅ Refreshing points for {moment_id}.",
-        ephemeral=True
-    )
-        new_points = await swapfest.get_moment_points(FLOW_ACCOUNT, int(moment_id))
-        if new_points > 0:
-            await interaction.followup.send(
-                f"✅ Refreshing points for {moment_id}: {new_points}.",
-                ephemeral=True
-            )
-            # Update the points in DB
-            cursor.execute(prepare_query('''
-                UPDATE gifts
-                SET points = ?
-                WHERE txn_id = ?
-            '''), (new_points, txn_id))
-            updated_count += 1
-            conn.commit()
-
-    # 3️⃣ Report result
-    await interaction.followup.send(
-        f"✅ Refreshed points for {updated_count} gifts.",
+    await interaction.response.send_message(
+        f"🔄 Re-scoring `{gift_filter.name}` in the background...",
         ephemeral=True
     )
-
+    if start_rescore(gift_filter, throttled(report), bot_db) is None:
+        await interaction.edit_original_response(content=f"⏳ `{gift_filter.name}` is already running.")
 
 
 # Close the database connection when the bot stops
 @bot.event
 async def on_close() -> None:
     """
-    Event handler to close database connection when bot stops.
+    Event handler to close pooled database connections when bot stops.
     """
-    conn.close()
+    bot_db.close()
 
 # Read the token from secret.txt or environment variable
 token = os.getenv('DISCORD_TOKEN')
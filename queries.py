@@ -0,0 +1,103 @@
+# SQL of the hot gift reads and writes, shared by the code that runs them and
+# by migrations.check_plans(), so the plan check always sees the real
+# statements. Placeholders are '?' (see db.prepare_query); names in braces are
+# filled in with str.format() by the caller.
+
+
+# ==============================
+# STANDINGS
+# ==============================
+# Per-sender refresh after gift writes; {placeholders}: one '?' per sender
+REFRESH_STANDINGS = '''
+    INSERT INTO leaderboard_standings
+        (contest_id, from_address, total_points, gift_count, last_scored_at)
+    SELECT ?, from_address, COALESCE(SUM(points), 0), COUNT(*), MAX("timestamp")
+    FROM gifts
+    WHERE from_address IN ({placeholders})
+      AND "timestamp" BETWEEN ? AND ?
+    GROUP BY from_address
+    ON CONFLICT (contest_id, from_address) DO UPDATE SET
+        total_points = excluded.total_points,
+        gift_count = excluded.gift_count,
+        last_scored_at = excluded.last_scored_at
+'''
+
+# Whole-contest rebuild
+REBUILD_CONTEST_STANDINGS = '''
+    INSERT INTO leaderboard_standings
+        (contest_id, from_address, total_points, gift_count, last_scored_at)
+    SELECT ?, from_address, COALESCE(SUM(points), 0), COUNT(*), MAX("timestamp")
+    FROM gifts
+    WHERE "timestamp" BETWEEN ? AND ?
+    GROUP BY from_address
+'''
+
+# Any-window leaderboard: whole hours from rollups, partial hours from raw gifts
+WINDOW_STANDINGS = '''
+    SELECT from_address, SUM(total_points), MAX(last_scored_at)
+    FROM (
+        SELECT from_address, total_points, last_scored_at
+        FROM gift_rollups
+        WHERE bucket >= ? AND bucket < ?
+        UNION ALL
+        SELECT from_address, COALESCE(points, 0), "timestamp"
+        FROM gifts
+        WHERE "timestamp" >= ? AND "timestamp" < ?
+        UNION ALL
+        SELECT from_address, COALESCE(points, 0), "timestamp"
+        FROM gifts
+        WHERE "timestamp" >= ? AND "timestamp" <= ?
+    ) window_points
+    GROUP BY from_address
+    ORDER BY SUM(total_points) DESC, MAX(last_scored_at) ASC
+'''
+
+
+# ==============================
+# HOURLY ROLLUPS
+# ==============================
+# Per-sender refresh after gift writes; {bucket}: the database's hour
+# truncation of "timestamp", {placeholders}: one '?' per sender
+REFRESH_ROLLUPS = '''
+    INSERT INTO gift_rollups (bucket, from_address, total_points, gift_count, last_scored_at)
+    SELECT {bucket}, from_address, COALESCE(SUM(points), 0), COUNT(*), MAX("timestamp")
+    FROM gifts
+    WHERE from_address IN ({placeholders})
+      AND "timestamp" >= ? AND "timestamp" < ?
+    GROUP BY {bucket}, from_address
+    ON CONFLICT (bucket, from_address) DO UPDATE SET
+        total_points = excluded.total_points,
+        gift_count = excluded.gift_count,
+        last_scored_at = excluded.last_scored_at
+'''
+
+
+# ==============================
+# GIFTS
+# ==============================
+LATEST_GIFTS = '''
+    SELECT txn_id, moment_id, from_address, points, timestamp
+    FROM gifts
+    ORDER BY timestamp DESC
+    LIMIT 10
+'''
+
+LATEST_GIFTS_OF_ADDRESS = '''
+    SELECT txn_id, moment_id, from_address, points, timestamp
+    FROM gifts
+    WHERE from_address = ?
+    ORDER BY timestamp DESC
+    LIMIT 10
+'''
+
+UPDATE_GIFT_POINTS = '''
+    UPDATE gifts SET points = ? WHERE txn_id = ?
+'''
+
+# Next page of a rescoring job; {where}: the job filter's conditions
+RESCORE_PAGE = '''
+    SELECT txn_id, moment_id, points FROM gifts
+    WHERE txn_id > ? AND {where}
+    ORDER BY txn_id
+    LIMIT ?
+'''
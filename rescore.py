@@ -0,0 +1,355 @@
+import argparse
+import asyncio
+import sys
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import swapfest
+from db import AsyncDatabase, get_pool, prepare_query
+from gift_store import apply_gift_points
+from migrations import migrate
+from queries import RESCORE_PAGE
+from standings import normalize_timestamp, parse_timestamp
+
+
+# ==============================
+# CONFIG
+# ==============================
+RESCORE_PAGE_SIZE = 500          # gifts read, scored and updated per transaction
+RESCORE_PROGRESS_INTERVAL = 5.0  # seconds between progress reports
+
+
+# ==============================
+# JOB STATE
+# ==============================
+@dataclass(frozen=True)
+class RescoreFilter:
+    """
+    Which stored gifts a rescoring job visits.
+    
+    Attributes:
+        scope: "zero" for gifts without points, "all" for every gift.
+        from_address: Only gifts from this sender.
+        since: Only gifts with timestamp >= since; stored as 'YYYY-MM-DD HH:MM:SS' UTC.
+    
+    Raises:
+        ValueError: If scope is unknown or since is not a timestamp.
+    """
+    scope: str = "zero"
+    from_address: str | None = None
+    since: str | None = None
+
+    def __post_init__(self):
+        if self.scope not in ("zero", "all"):
+            raise ValueError(f"Unknown rescore scope {self.scope!r}")
+        if self.since:
+            try:
+                parse_timestamp(self.since)
+            except ValueError:
+                raise ValueError(f"since is not a timestamp: {self.since!r}") from None
+            # Compared with stored timestamps, which use the same format
+            object.__setattr__(self, "since", normalize_timestamp(self.since))
+
+    @property
+    def name(self) -> str:
+        """
+        Job name, also the key of the job's saved cursor.
+        """
+        parts = ["rescore", self.scope]
+        if self.from_address:
+            parts.append(f"from={self.from_address}")
+        if self.since:
+            parts.append(f"since={self.since}")
+        return ":".join(parts)
+
+    def where(self) -> tuple[str, tuple]:
+        """
+        SQL conditions (with '?' placeholders) and parameters for this filter.
+        """
+        conditions, params = [], []
+        if self.scope == "zero":
+            conditions.append("COALESCE(points, 0) = 0")
+        if self.from_address:
+            conditions.append("from_address = ?")
+            params.append(self.from_address)
+        if self.since:
+            conditions.append('"timestamp" >= ?')
+            params.append(self.since)
+        return " AND ".join(conditions) or "1 = 1", tuple(params)
+
+
+@dataclass
+class RescoreProgress:
+    """
+    Running totals of a rescoring job, including pages done before a restart.
+    """
+    name: str
+    scanned: int = 0
+    updated: int = 0
+    unresolved: int = 0
+    resumed: bool = False
+    done: bool = False
+    error: str | None = None
+    started_at: float = field(default_factory=time.monotonic)
+
+    def summary(self) -> str:
+        state = f"failed ({self.error})" if self.error else "done" if self.done else "running"
+        resumed = ", resumed" if self.resumed else ""
+        return (
+            f"{self.name} {state}{resumed}: {self.scanned} gifts scanned, {self.updated} updated, "
+            f"{self.unresolved} without metadata ({time.monotonic() - self.started_at:.0f}s)"
+        )
+
+
+def load_job(cursor, name: str) -> tuple[str, int, int] | None:
+    """
+    Read the saved cursor of an unfinished job.
+    
+    Args:
+        cursor: Database cursor.
+        name: Job name.
+    
+    Returns:
+        Tuple of (last txn_id done, gifts scanned, gifts updated), or None.
+    """
+    cursor.execute(prepare_query('''
+        SELECT last_txn_id, scanned, updated FROM rescore_jobs WHERE name = ?
+    '''), (name,))
+    row = cursor.fetchone()
+    return (row[0], int(row[1]), int(row[2])) if row else None
+
+
+def fetch_page(cursor, gift_filter: RescoreFilter, after_txn_id: str, limit: int) -> list[tuple]:
+    """
+    Read the next page of matching gifts in txn_id order.
+    
+    Args:
+        cursor: Database cursor.
+        gift_filter: Gifts to visit.
+        after_txn_id: Only gifts with a greater txn_id ("" for the first page).
+        limit: Page size.
+    
+    Returns:
+        List of (txn_id, moment_id, points) tuples.
+    """
+    where, params = gift_filter.where()
+    cursor.execute(prepare_query(RESCORE_PAGE.format(where=where)), (after_txn_id, *params, limit))
+    return cursor.fetchall()
+
+
+def commit_page(cursor, progress: RescoreProgress, points_by_txn: dict[str, int], last_txn_id: str) -> None:
+    """
+    Apply a page of new scores and advance the job cursor in one transaction.
+    
+    Args:
+        cursor: Database cursor.
+        progress: Job totals, already including this page.
+        points_by_txn: New scores of the page's changed gifts.
+        last_txn_id: Last txn_id of the page.
+    """
+    apply_gift_points(cursor, points_by_txn)
+    cursor.execute(prepare_query('''
+        INSERT INTO rescore_jobs (name, last_txn_id, scanned, updated)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            last_txn_id = excluded.last_txn_id,
+            scanned = excluded.scanned,
+            updated = excluded.updated
+    '''), (progress.name, last_txn_id, progress.scanned, progress.updated))
+
+
+def finish_job(cursor, name: str) -> None:
+    """
+    Drop a job's cursor once every matching gift was visited.
+    """
+    cursor.execute(prepare_query('DELETE FROM rescore_jobs WHERE name = ?'), (name,))
+
+
+# ==============================
+# RESCORING
+# ==============================
+async def score_page(gift_filter: RescoreFilter, rows: list[tuple], progress: RescoreProgress) -> dict[str, int]:
+    """
+    Score a page of gifts with batched, concurrent metadata lookups.
+    
+    Gifts whose metadata cannot be resolved keep their points.
+    
+    Args:
+        gift_filter: Job filter; scope "zero" only ever raises points.
+        rows: (txn_id, moment_id, points) tuples.
+        progress: Job totals to update.
+    
+    Returns:
+        Mapping of txn_id to new points for gifts whose score changed.
+    """
+    metadata_by_id = await swapfest.query_moments_metadata([int(moment_id) for _, moment_id, _ in rows])
+    changes = {}
+    for txn_id, moment_id, points in rows:
+        metadata = metadata_by_id.get(int(moment_id))
+        if metadata is None:
+            progress.unresolved += 1
+            continue
+        new_points = swapfest.score_moment(metadata)
+        if new_points != (points or 0) and (gift_filter.scope != "zero" or new_points > 0):
+            changes[txn_id] = new_points
+    return changes
+
+
+async def run_rescore(
+    gift_filter: RescoreFilter,
+    on_progress: Callable[[RescoreProgress], Awaitable[None]] | None = None,
+    database: AsyncDatabase | None = None,
+    page_size: int = RESCORE_PAGE_SIZE
+) -> RescoreProgress:
+    """
+    Rescore every gift matching a filter, resuming a previously interrupted job.
+    
+    Pages are read in txn_id order; the next page is read while the current
+    one is scored. Each page's updates, standings refresh and job cursor
+    commit together, so a restart continues after the last committed page.
+    
+    Args:
+        gift_filter: Gifts to rescore.
+        on_progress: Awaited after every page and once at the end, also
+            when the job fails (progress.error is then set).
+        database: Async database access; defaults to one over the shared pool.
+        page_size: Gifts per page.
+    
+    Returns:
+        Final job totals.
+    
+    Raises:
+        Exception: Whatever stopped the job, after it was reported; pages
+            committed so far are kept and a re-run resumes after them.
+    """
+    database = database or AsyncDatabase(get_pool())
+    progress = RescoreProgress(gift_filter.name)
+    try:
+        saved = await database.run(load_job, progress.name)
+        last_txn_id = ""
+        if saved is not None:
+            last_txn_id, progress.scanned, progress.updated = saved
+            progress.resumed = True
+
+        next_page = asyncio.create_task(database.run(fetch_page, gift_filter, last_txn_id, page_size))
+        try:
+            while True:
+                rows = await next_page
+                if not rows:
+                    break
+                last_txn_id = rows[-1][0]
+                next_page = asyncio.create_task(database.run(fetch_page, gift_filter, last_txn_id, page_size))
+
+                changes = await score_page(gift_filter, rows, progress)
+                progress.scanned += len(rows)
+                progress.updated += len(changes)
+                await database.run(commit_page, progress, changes, last_txn_id)
+                if on_progress is not None:
+                    await on_progress(progress)
+        finally:
+            if not next_page.done():
+                next_page.cancel()
+
+        await database.run(finish_job, progress.name)
+    except Exception as e:
+        progress.error = str(e) or type(e).__name__
+        print(f"Rescore {progress.name} failed: {progress.error}", file=sys.stderr, flush=True)
+        if on_progress is not None:
+            await on_progress(progress)
+        raise
+    progress.done = True
+    if on_progress is not None:
+        await on_progress(progress)
+    return progress
+
+
+_running: dict[str, asyncio.Task] = {}
+
+
+def start_rescore(
+    gift_filter: RescoreFilter,
+    on_progress: Callable[[RescoreProgress], Awaitable[None]] | None = None,
+    database: AsyncDatabase | None = None
+) -> asyncio.Task | None:
+    """
+    Run a rescoring job in the background of the current event loop.
+    
+    Args:
+        gift_filter: Gifts to rescore.
+        on_progress: Progress callback, see run_rescore().
+        database: Async database access.
+    
+    Returns:
+        The job's task, or None if the same job is already running.
+    """
+    name = gift_filter.name
+    if name in _running and not _running[name].done():
+        return None
+    task = asyncio.create_task(run_rescore(gift_filter, on_progress, database))
+    _running[name] = task
+
+    def finished(task: asyncio.Task) -> None:
+        _running.pop(name, None)
+        # run_rescore() already logged and reported the failure; retrieve
+        # the exception so the task does not also warn when collected
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Rescore {name} stopped; run it again to resume.", file=sys.stderr, flush=True)
+
+    task.add_done_callback(finished)
+    return task
+
+
+def throttled(
+    report: Callable[[RescoreProgress], Awaitable[None]],
+    interval: float = RESCORE_PROGRESS_INTERVAL
+) -> Callable[[RescoreProgress], Awaitable[None]]:
+    """
+    Wrap a progress callback so it runs at most once per interval, plus once when done or failed.
+    
+    Args:
+        report: Progress callback, e.g. one that edits a Discord message.
+        interval: Minimum seconds between reports.
+    
+    Returns:
+        Throttled callback for run_rescore().
+    """
+    last_report = -interval
+
+    async def on_progress(progress: RescoreProgress) -> None:
+        nonlocal last_report
+        now = time.monotonic()
+        if progress.done or progress.error or now - last_report >= interval:
+            last_report = now
+            await report(progress)
+
+    return on_progress
+
+
+async def _print_progress(progress: RescoreProgress) -> None:
+    print(progress.summary(), flush=True)
+
+
+async def _main(gift_filter: RescoreFilter, page_size: int) -> None:
+    await asyncio.to_thread(migrate)
+    try:
+        await run_rescore(gift_filter, throttled(_print_progress), page_size=page_size)
+    finally:
+        await swapfest.close_http_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescore stored Swapfest gifts; resumes an interrupted run.")
+    parser.add_argument("--all", action="store_true", help="rescore every gift, not only gifts with 0 points")
+    parser.add_argument("--address", default=None, help="only gifts from this sender address")
+    parser.add_argument("--since", default=None, help="only gifts at or after this timestamp (UTC)")
+    parser.add_argument("--page-size", type=int, default=RESCORE_PAGE_SIZE)
+    args = parser.parse_args()
+    try:
+        gift_filter = RescoreFilter("all" if args.all else "zero", args.address, args.since)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        asyncio.run(_main(gift_filter, args.page_size))
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume.", file=sys.stderr)
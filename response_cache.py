@@ -0,0 +1,145 @@
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional: responses are still gzip-compressed
+    brotli = None
+
+
+# ==============================
+# CACHED RESPONSES
+# ==============================
+@dataclass
+class CachedResponse:
+    """
+    A serialized response body with a strong ETag and pre-compressed variants.
+    """
+    version: int
+    body: bytes
+    etag: str
+    gzip_body: bytes
+    br_body: bytes | None = None
+
+    @classmethod
+    def build(cls, version: int, body: bytes) -> "CachedResponse":
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        br_body = brotli.compress(body) if brotli is not None else None
+        return cls(version, body, etag, gzip.compress(body, compresslevel=6), br_body)
+
+    def _variant(self, accept_encoding: str) -> tuple[bytes, str | None, str]:
+        encodings = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        if self.br_body is not None and "br" in encodings:
+            return self.br_body, "br", f'"{self.etag}-br"'
+        if "gzip" in encodings:
+            return self.gzip_body, "gzip", f'"{self.etag}-gz"'
+        return self.body, None, f'"{self.etag}"'
+
+    def to_response(self, request: Request, mimetype: str = "application/json") -> Response:
+        """
+        Answer a request from the cache: 304 if the client's ETag matches,
+        otherwise the best pre-compressed variant the client accepts.
+        
+        Args:
+            request: The incoming Flask request.
+            mimetype: Content type of the body.
+        
+        Returns:
+            Flask response.
+        """
+        body, encoding, etag = self._variant(request.headers.get("Accept-Encoding", ""))
+        if_none_match = request.headers.get("If-None-Match", "")
+        client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in client_etags or "*" in client_etags:
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        response.headers["ETag"] = etag
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+class VersionedResponseCache:
+    """
+    In-process cache of serialized responses, valid for one data version.
+    """
+
+    def __init__(self, maxsize: int = 32):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> CachedResponse | None:
+        """
+        Get the cached response for key if it was built from this version.
+        
+        Args:
+            key: Cache key (e.g. contest id).
+            version: Current data version.
+        
+        Returns:
+            The cached response, or None on a miss or stale entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, version: int, body: bytes) -> CachedResponse:
+        """
+        Cache a serialized body for key at the given data version.
+        
+        Args:
+            key: Cache key.
+            version: Data version the body was built from.
+            body: Serialized response body.
+        
+        Returns:
+            The new cache entry.
+        """
+        entry = CachedResponse.build(version, body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+
+class VersionProbe:
+    """
+    Reads a data version at most once per ttl seconds.
+    """
+
+    def __init__(self, read_version: Callable[[], int], ttl: float = 1.0):
+        self.read_version = read_version
+        self.ttl = ttl
+        self._version: int | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        """
+        Get the current data version, re-reading it when the last read is older than ttl.
+        
+        Returns:
+            Data version.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._version is None or now - self._checked_at >= self.ttl:
+                self._version = self.read_version()
+                self._checked_at = now
+            return self._version
@@ -0,0 +1,586 @@
+import argparse
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from db import connect, db_type, prepare_query
+from queries import REBUILD_CONTEST_STANDINGS, REFRESH_ROLLUPS, REFRESH_STANDINGS, WINDOW_STANDINGS
+
+
+# ==============================
+# CONTESTS
+# ==============================
+@dataclass(frozen=True)
+class Contest:
+    """
+    A Swapfest season: gifts with start_time <= timestamp <= end_time (UTC) count.
+    """
+    id: str
+    start_time: str
+    end_time: str
+
+
+# Built-in seasons, seeded into the contests table; register new ones with
+# `python standings.py --add-contest ID START END` instead of editing code
+CONTESTS = {
+    "swapfest-2025-fall": Contest("swapfest-2025-fall", '2025-09-25 21:00:00', '2025-10-22 00:00:00'),
+}
+CURRENT_CONTEST_ID = os.getenv("SWAPFEST_CONTEST", "swapfest-2025-fall")
+ROLLUP_BUCKET = timedelta(hours=1)  # gift_rollups granularity; buckets start on the hour (UTC)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+LEADERBOARD_VERSION = "leaderboard"  # data_versions row bumped on every standings change
+DATA_VERSION_CHANNEL = "data_versions"  # PostgreSQL NOTIFY channel; payload is the bumped name
+SENDER_LOCK_NAMESPACE = 73_110_019  # first key of per-sender advisory locks (second: hashtext(address))
+
+
+# ==============================
+# TIMESTAMPS
+# ==============================
+def parse_timestamp(value) -> datetime:
+    """
+    Parse a gift or window timestamp as naive UTC.
+    
+    Args:
+        value: datetime, or ISO 8601 text such as '2025-10-01 12:00:00' or
+            '2025-10-01T12:00:00.12345Z'. Aware values are converted to UTC.
+    
+    Returns:
+        Naive UTC datetime.
+    
+    Raises:
+        ValueError: If the text is not a timestamp.
+    """
+    if not isinstance(value, datetime):
+        text = str(value).strip().replace('Z', '+00:00')
+        # Python < 3.11 only takes 3 or 6 fraction digits and '+HH:MM' offsets
+        text = re.sub(r'\.(\d+)', lambda match: '.' + match.group(1)[:6].ljust(6, '0'), text, count=1)
+        text = re.sub(r'([+-]\d{2})(\d{2})$', r'\1:\2', text)
+        value = datetime.fromisoformat(text)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def normalize_timestamp(value):
+    """
+    Format a timestamp the way gifts store it: 'YYYY-MM-DD HH:MM:SS' UTC.
+    
+    Find returns '...T...Z' text, which on SQLite would not compare
+    correctly with contest and rollup bounds. Values that do not parse are
+    returned unchanged.
+    """
+    try:
+        return parse_timestamp(value).strftime(TIMESTAMP_FORMAT)
+    except (TypeError, ValueError):
+        return value
+
+
+def bucket_start(value: datetime) -> datetime:
+    """
+    Start of the rollup bucket holding a timestamp.
+    """
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def bucket_expression(value: str = '"timestamp"') -> str:
+    """
+    SQL for the start of the hour of a gift's timestamp, as stored in gift_rollups.bucket.
+    
+    Args:
+        value: SQL timestamp expression; the gifts "timestamp" column by default.
+    
+    Returns:
+        Expression for the current database.
+    """
+    if db_type == 'postgresql':
+        return f"date_trunc('hour', {value})"
+    return f"strftime('%Y-%m-%d %H:00:00', {value})"
+
+
+# ==============================
+# CONTEST REGISTRY
+# ==============================
+def _contest(row) -> Contest:
+    contest_id, start_time, end_time = row
+    return Contest(contest_id, normalize_timestamp(start_time), normalize_timestamp(end_time))
+
+
+def get_contests(cursor) -> dict[str, Contest]:
+    """
+    Read the contest registry.
+    
+    Args:
+        cursor: Database cursor.
+    
+    Returns:
+        Mapping of contest id to Contest, oldest season first.
+    """
+    cursor.execute('SELECT id, start_time, end_time FROM contests ORDER BY start_time')
+    return {row[0]: _contest(row) for row in cursor.fetchall()}
+
+
+def get_contest(cursor, contest_id: str) -> Contest | None:
+    """
+    Read one registered contest.
+    
+    Args:
+        cursor: Database cursor.
+        contest_id: Contest id.
+    
+    Returns:
+        The Contest, or None if it is not registered.
+    """
+    cursor.execute(prepare_query('''
+        SELECT id, start_time, end_time FROM contests WHERE id = ?
+    '''), (contest_id,))
+    row = cursor.fetchone()
+    return _contest(row) if row else None
+
+
+def register_contest(cursor, contest: Contest) -> int:
+    """
+    Add or move a contest in the registry and build its standings inside
+    the caller's transaction.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        contest: Contest to register; an existing id takes the new window.
+    
+    Returns:
+        Number of addresses in the contest's standings.
+    """
+    contest = Contest(contest.id, normalize_timestamp(contest.start_time), normalize_timestamp(contest.end_time))
+    cursor.execute(prepare_query('''
+        INSERT INTO contests (id, start_time, end_time) VALUES (?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            start_time = excluded.start_time,
+            end_time = excluded.end_time
+    '''), (contest.id, contest.start_time, contest.end_time))
+    count = rebuild_contest_standings(cursor, contest)
+    bump_leaderboard_version(cursor)
+    return count
+
+
+# ==============================
+# DATA VERSIONS
+# ==============================
+def bump_data_version(cursor, name: str) -> None:
+    """
+    Increment a named data version inside the writing transaction.
+    
+    On PostgreSQL this also notifies DATA_VERSION_CHANNEL, which listeners
+    receive when (and only if) the transaction commits.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        name: data_versions row, e.g. LEADERBOARD_VERSION.
+    """
+    cursor.execute(prepare_query('''
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1
+    '''), (name,))
+    if db_type == 'postgresql':
+        cursor.execute('SELECT pg_notify(%s, %s)', (DATA_VERSION_CHANNEL, name))
+
+
+def get_data_version(cursor, name: str) -> int:
+    """
+    Read a named data version.
+    
+    Args:
+        cursor: Database cursor.
+        name: data_versions row.
+    
+    Returns:
+        Version number, 0 if it was never bumped.
+    """
+    cursor.execute(prepare_query('''
+        SELECT version FROM data_versions WHERE name = ?
+    '''), (name,))
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def bump_leaderboard_version(cursor) -> None:
+    """
+    Increment the leaderboard data version inside the writing transaction.
+    
+    Web workers compare this version with the one their cached response was
+    built from, so every committed standings change invalidates the cache.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+    """
+    bump_data_version(cursor, LEADERBOARD_VERSION)
+
+
+def get_leaderboard_version(cursor) -> int:
+    """
+    Read the current leaderboard data version.
+    
+    Args:
+        cursor: Database cursor.
+    
+    Returns:
+        Version number, 0 if standings were never written.
+    """
+    return get_data_version(cursor, LEADERBOARD_VERSION)
+
+
+def lock_senders(cursor, addresses) -> None:
+    """
+    Serialize aggregate refreshes of the same senders across transactions.
+    
+    Standings and rollups are recomputed with INSERT ... SELECT SUM(...),
+    whose snapshot (READ COMMITTED) cannot see another writer's uncommitted
+    gifts; the writer committing last would overwrite the other's total.
+    On PostgreSQL this takes a transaction-level advisory lock per sender,
+    in sorted order so writers cannot deadlock, making the recompute wait
+    for the other writer and see its gifts. Taking a lock again in the same
+    transaction is a no-op. SQLite already serializes writers.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        addresses: Sender addresses about to be recomputed.
+    """
+    if db_type != 'postgresql':
+        return
+    for address in sorted(set(addresses)):
+        cursor.execute('SELECT pg_advisory_xact_lock(%s, hashtext(%s))', (SENDER_LOCK_NAMESPACE, address))
+
+
+def refresh_standings(cursor, addresses) -> None:
+    """
+    Recompute the standings rows of the given addresses for every registered contest.
+    
+    Call this in the same transaction as the gift writes that touched these
+    addresses, so standings and gifts always commit together. Concurrent
+    writers of the same sender are serialized by lock_senders().
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        addresses: Sender addresses whose gifts were inserted or re-scored.
+    """
+    addresses = sorted(set(addresses))
+    if not addresses:
+        return
+    lock_senders(cursor, addresses)
+    placeholders = ", ".join("?" for _ in addresses)
+    for contest in get_contests(cursor).values():
+        cursor.execute(prepare_query(REFRESH_STANDINGS.format(placeholders=placeholders)), (contest.id, *addresses, contest.start_time, contest.end_time))
+    bump_leaderboard_version(cursor)
+
+
+def rebuild_contest_standings(cursor, contest: Contest) -> int:
+    """
+    Recompute one contest's standings from the gifts table inside the caller's transaction.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        contest: Contest to rebuild.
+    
+    Returns:
+        Number of addresses in the rebuilt standings.
+    """
+    cursor.execute(prepare_query('''
+        DELETE FROM leaderboard_standings WHERE contest_id = ?
+    '''), (contest.id,))
+    cursor.execute(prepare_query(REBUILD_CONTEST_STANDINGS), (contest.id, contest.start_time, contest.end_time))
+    return cursor.rowcount
+
+
+def rebuild_standings(contest_id: str | None = None) -> None:
+    """
+    Recompute standings from the gifts table; a full rebuild also recomputes
+    the hourly rollups.
+    
+    Args:
+        contest_id: Registered contest to rebuild, or None for every contest.
+    
+    Raises:
+        ValueError: If contest_id is not registered.
+    """
+    conn = connect(statement_timeout_ms=0)  # full-table rebuild may outlast the query timeout
+    try:
+        cursor = conn.cursor()
+        contests = get_contests(cursor)
+        if contest_id is not None:
+            if contest_id not in contests:
+                raise ValueError(f"Unknown contest {contest_id!r}")
+            contests = {contest_id: contests[contest_id]}
+        else:
+            print(f"Rebuilt hourly rollups: {rebuild_rollups(cursor)} buckets")
+        for contest in contests.values():
+            count = rebuild_contest_standings(cursor, contest)
+            print(f"Rebuilt standings for {contest.id}: {count} addresses")
+        bump_leaderboard_version(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# ==============================
+# HOURLY ROLLUPS
+# ==============================
+def refresh_rollups(cursor, gifts) -> None:
+    """
+    Recompute the hourly rollups touched by written gifts.
+    
+    Call this in the same transaction as the gift writes, like
+    refresh_standings(). The senders' buckets from the earliest to the
+    latest written hour are recomputed from the gifts table.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+        gifts: (from_address, timestamp) pairs of inserted or re-scored gifts.
+    """
+    addresses, hours, unparsed = set(), set(), []
+    for from_address, timestamp in gifts:
+        if timestamp is None:
+            continue  # no timestamp: in no bucket, as in no contest window
+        addresses.add(from_address)
+        try:
+            hours.add(bucket_start(parse_timestamp(timestamp)))
+        except (TypeError, ValueError):
+            unparsed.append(timestamp)
+    # Text Python cannot read may still be a timestamp to the database,
+    # which buckets it in rebuild_rollups(): ask it for the hour too
+    value = 'CAST(? AS TIMESTAMP)' if db_type == 'postgresql' else '?'
+    for timestamp in unparsed:
+        cursor.execute(prepare_query(f'SELECT {bucket_expression(value)}'), (timestamp,))
+        hour = cursor.fetchone()[0]
+        if hour is not None:
+            hours.add(parse_timestamp(hour))
+    if not hours:
+        return
+    addresses = sorted(addresses)
+    lock_senders(cursor, addresses)
+    placeholders = ", ".join("?" for _ in addresses)
+    bucket = bucket_expression()
+    cursor.execute(prepare_query(REFRESH_ROLLUPS.format(bucket=bucket, placeholders=placeholders)), (
+        *addresses,
+        min(hours).strftime(TIMESTAMP_FORMAT),
+        (max(hours) + ROLLUP_BUCKET).strftime(TIMESTAMP_FORMAT),
+    ))
+
+
+def rebuild_rollups(cursor) -> int:
+    """
+    Recompute every hourly rollup from the gifts table inside the caller's transaction.
+    
+    Args:
+        cursor: Database cursor inside the writing transaction.
+    
+    Returns:
+        Number of (hour, sender) buckets written.
+    """
+    bucket = bucket_expression()
+    cursor.execute('DELETE FROM gift_rollups')
+    cursor.execute(f'''
+        INSERT INTO gift_rollups (bucket, from_address, total_points, gift_count, last_scored_at)
+        SELECT {bucket}, from_address, COALESCE(SUM(points), 0), COUNT(*), MAX("timestamp")
+        FROM gifts
+        WHERE "timestamp" IS NOT NULL
+        GROUP BY {bucket}, from_address
+    ''')
+    return cursor.rowcount
+
+
+def get_window_standings(cursor, start_time, end_time, limit: int | None = None) -> list[tuple]:
+    """
+    Read the leaderboard of any time window, best first; ties go to the
+    earlier last gift.
+    
+    Whole hours inside the window are summed from gift_rollups; only the
+    partial hours at either end are read from raw gifts. As for contests,
+    gifts with start_time <= timestamp <= end_time count.
+    
+    Args:
+        cursor: Database cursor.
+        start_time: Window start (UTC).
+        end_time: Window end (UTC), inclusive.
+        limit: Maximum number of entries, or None for all.
+    
+    Returns:
+        List of (from_address, total_points, last_scored_at) tuples.
+    """
+    start, end = parse_timestamp(start_time), parse_timestamp(end_time)
+    first_bucket = bucket_start(start)
+    if first_bucket < start:
+        first_bucket += ROLLUP_BUCKET
+    last_bucket = bucket_start(end)  # the partial hour the window ends in
+    if first_bucket >= last_bucket:
+        first_bucket = last_bucket = start  # no whole hour inside: raw gifts only
+
+    start, end, first_bucket, last_bucket = (
+        value.strftime(TIMESTAMP_FORMAT) for value in (start, end, first_bucket, last_bucket)
+    )
+    query = WINDOW_STANDINGS
+    params = (first_bucket, last_bucket, start, first_bucket, last_bucket, end)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    cursor.execute(prepare_query(query), params)
+    return cursor.fetchall()
+
+
+# ==============================
+# LEADERBOARD WINDOWS
+# ==============================
+@dataclass(frozen=True)
+class StandingsWindow:
+    """
+    What a leaderboard covers: a registered contest, or a time range when
+    contest_id is None.
+    """
+    contest_id: str | None
+    start_time: str | None = None
+    end_time: str | None = None
+
+    @property
+    def key(self) -> str:
+        """
+        Identifies the window, e.g. in response cache keys.
+        """
+        return self.contest_id or f"{self.start_time}/{self.end_time}"
+
+
+def _parse_bound(name: str, value: str) -> datetime:
+    """
+    Parse a window bound, with an error message that names the parameter.
+    """
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a UTC timestamp such as 2025-10-01 12:00:00") from None
+
+
+def resolve_window(
+    contest_id: str | None = None,
+    start_time: str | None = None,
+    end_time: str | None = None,
+    hours: float | None = None
+) -> StandingsWindow:
+    """
+    Turn leaderboard request parameters into a window, without a database read.
+    
+    A window is either a contest or a time range (start and optional end,
+    or the last `hours`), never both; with neither, the current contest is
+    used. A range without an end runs to now, truncated to the minute so
+    repeated requests share a window.
+    
+    Args:
+        contest_id: Contest id; checked against the registry by read_standings().
+        start_time: Range start (UTC, ISO 8601).
+        end_time: Range end (UTC, ISO 8601), inclusive.
+        hours: Length of a range ending at end_time or now.
+    
+    Returns:
+        The requested StandingsWindow.
+    
+    Raises:
+        ValueError: On an invalid range, or a contest combined with a range.
+    """
+    if start_time is None and end_time is None and hours is None:
+        return StandingsWindow(contest_id or CURRENT_CONTEST_ID)
+    if contest_id is not None:
+        raise ValueError("Pass either contest or a time range, not both")
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None, second=0, microsecond=0)
+    end = _parse_bound("end", end_time) if end_time is not None else now
+    if hours is not None:
+        if start_time is not None:
+            raise ValueError("Pass either start or hours, not both")
+        if not 0 < hours <= 24 * 366:
+            raise ValueError("hours must be more than 0 and at most 8784")
+        start = end - timedelta(hours=hours)
+    elif start_time is not None:
+        start = _parse_bound("start", start_time)
+    else:
+        raise ValueError("A range needs a start or hours")
+    if start > end:
+        raise ValueError("Range start is after its end")
+    return StandingsWindow(None, start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT))
+
+
+def read_standings(cursor, window: StandingsWindow, limit: int | None = None) -> list[tuple]:
+    """
+    Read the leaderboard of a window: materialized standings for a contest,
+    hourly rollups for a range.
+    
+    Args:
+        cursor: Database cursor.
+        window: Window from resolve_window().
+        limit: Maximum number of entries, or None for all.
+    
+    Returns:
+        List of (from_address, total_points, last_scored_at) tuples.
+    
+    Raises:
+        LookupError: If the window's contest is not registered.
+    """
+    if window.contest_id is None:
+        return get_window_standings(cursor, window.start_time, window.end_time, limit)
+    rows = get_standings(cursor, window.contest_id, limit)
+    if not rows and get_contest(cursor, window.contest_id) is None:
+        raise LookupError(f"Unknown contest {window.contest_id!r}")
+    return rows
+
+
+def get_standings(cursor, contest_id: str = CURRENT_CONTEST_ID, limit: int | None = None) -> list[tuple]:
+    """
+    Read a contest's leaderboard, best first; ties go to the earlier last gift.
+    
+    Args:
+        cursor: Database cursor.
+        contest_id: Contest to read.
+        limit: Maximum number of entries, or None for all.
+    
+    Returns:
+        List of (from_address, total_points, last_scored_at) tuples.
+    """
+    query = '''
+        SELECT from_address, total_points, last_scored_at
+        FROM leaderboard_standings
+        WHERE contest_id = ?
+        ORDER BY total_points DESC, last_scored_at ASC
+    '''
+    params = (contest_id,)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    cursor.execute(prepare_query(query), params)
+    return cursor.fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild Swapfest leaderboard standings from the gifts table.")
+    parser.add_argument("--contest", default=None, help="contest id (default: all contests)")
+    parser.add_argument("--add-contest", nargs=3, metavar=("ID", "START", "END"),
+                        help="register (or move) a contest window in UTC and build its standings")
+    parser.add_argument("--list", action="store_true", help="list registered contests")
+    args = parser.parse_args()
+    from migrations import migrate  # migrations imports this module
+    migrate()
+    if args.add_contest:
+        conn = connect(statement_timeout_ms=0)
+        try:
+            count = register_contest(conn.cursor(), Contest(*args.add_contest))
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Registered {args.add_contest[0]}: {count} addresses")
+    elif args.list:
+        conn = connect()
+        try:
+            for contest in get_contests(conn.cursor()).values():
+                current = " (current)" if contest.id == CURRENT_CONTEST_ID else ""
+                print(f"{contest.id}: {contest.start_time} .. {contest.end_time}{current}")
+        finally:
+            conn.close()
+    else:
+        rebuild_standings(args.contest)
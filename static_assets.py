@@ -0,0 +1,119 @@
+import argparse
+import gzip
+import mimetypes
+import os
+
+from flask import Request, Response, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: only .gz variants are written and served
+    brotli = None
+
+
+# ==============================
+# CONFIG
+# ==============================
+STATIC_ROOT = os.getenv('STATIC_ROOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'react-build'))
+IMMUTABLE_PREFIX = "assets/"     # Vite writes content-hashed file names here
+IMMUTABLE_MAX_AGE = 31536000     # one year, for hashed assets
+STATIC_MAX_AGE = 3600            # un-hashed public files (images, favicon)
+COMPRESSIBLE_EXTENSIONS = {".js", ".css", ".html", ".svg", ".json", ".map", ".txt", ".ico", ".webmanifest"}
+COMPRESS_MIN_SIZE = 1024         # smaller files are not worth an encoded variant
+
+
+# ==============================
+# PRECOMPRESSION
+# ==============================
+def _write_if_stale(source: str, target: str, compress) -> bool:
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+        return False
+    with open(source, 'rb') as file:
+        data = compress(file.read())
+    with open(target, 'wb') as file:
+        file.write(data)
+    return True
+
+
+def precompress(root: str = STATIC_ROOT) -> int:
+    """
+    Write .gz (and .br, if brotli is installed) next to every compressible file.
+    
+    Run after each frontend build; files whose variants are newer than the
+    source are skipped.
+    
+    Args:
+        root: Static build directory.
+    
+    Returns:
+        Number of variant files written.
+    """
+    written = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < COMPRESS_MIN_SIZE:
+                continue
+            written += _write_if_stale(path, path + ".gz", lambda data: gzip.compress(data, compresslevel=9))
+            if brotli is not None:
+                written += _write_if_stale(path, path + ".br", lambda data: brotli.compress(data, quality=11))
+    return written
+
+
+# ==============================
+# SERVING
+# ==============================
+def _cache_control(path: str) -> str:
+    if path.startswith(IMMUTABLE_PREFIX):
+        return f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    if path == "index.html":
+        return "no-cache"
+    return f"public, max-age={STATIC_MAX_AGE}"
+
+
+def send_static(request: Request, path: str, root: str = STATIC_ROOT) -> Response:
+    """
+    Serve a file from the frontend build, falling back to index.html for
+    client-side routes.
+    
+    A precompressed .br or .gz variant is sent when the client accepts it.
+    Hashed assets are cacheable for a year; index.html is revalidated on
+    every load so new builds are picked up.
+    
+    Args:
+        request: The incoming Flask request.
+        path: Requested path within the build directory.
+        root: Static build directory.
+    
+    Returns:
+        File response.
+    """
+    full_path = safe_join(root, path) if path else None
+    if full_path is None or not os.path.isfile(full_path):
+        path = "index.html"
+
+    accepted = {part.split(";")[0].strip() for part in request.headers.get("Accept-Encoding", "").lower().split(",")}
+    served, encoding = path, None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if candidate in accepted and os.path.isfile(os.path.join(root, path + suffix)):
+            served, encoding = path + suffix, candidate
+            break
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    response = send_from_directory(root, served, mimetype=mimetype, conditional=True)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = _cache_control(path)
+    return response
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress the frontend build for the API server.")
+    parser.add_argument("root", nargs="?", default=STATIC_ROOT, help="static build directory")
+    args = parser.parse_args()
+    if os.path.isdir(args.root):
+        print(f"Wrote {precompress(args.root)} precompressed files in {args.root}")
+    else:
+        print(f"No build directory at {args.root}; nothing to precompress")
@@ -1,16 +1,26 @@
 # ==============================
 # IMPORTS
 # ==============================
-import requests
+import aiohttp
+import argparse
 import random
 import asyncio
+import json
+import os
 import sys
+import time
+from abc import ABC, abstractmethod
 
-from json import JSONDecodeError
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import timezone
 from flow_py_sdk import flow_client
-from flow_py_sdk.cadence import Address, UInt64
-from utils.helpers import get_last_processed_block, save_last_processed_block, save_gift
-from requests.auth import HTTPBasicAuth
+from flow_py_sdk.proto.flow.entities import TransactionStatus
+from db import get_pool, prepare_query
+from gift_store import LIVE_CHECKPOINT, get_live_checkpoint, save_gifts
+from metrics import WINDOW_BUCKETS, counter, gauge, histogram, start_snapshots
+from migrations import migrate
 
 # TEMP CREDENTIALS FOR FORTE HACKS
 USERNAME = "bobo"
@@ -19,67 +29,494 @@ PASSWORD = ""
 # ==============================
 # CONFIG
 # ==============================
-BASE_URL = "https://api.find.xyz/simple/v1"
-FLOW_ACCOUNT = "0xf853bd09d46e7db6"
+BASE_URL = os.getenv("FIND_BASE_URL", "https://api.find.xyz/simple/v1")
+FLOW_ACCOUNT = os.getenv("SWAPFEST_TREASURY", "0xf853bd09d46e7db6")
 STARTING_HEIGHT = 118542742
 OFFSET = 100
+TXN_CONCURRENCY = 8  # max /transaction lookups in flight per window
+RESOLVE_RETRY_INTERVAL = 10  # seconds before a held window retries its failed transaction lookups
+TOPSHOT_CONTRACT = os.getenv("TOPSHOT_CONTRACT", "A.0b2a3299cc857e29.TopShot")
+DEPOSIT_EVENT = f"{TOPSHOT_CONTRACT}.Deposit"
+WITHDRAW_EVENT = f"{TOPSHOT_CONTRACT}.Withdraw"
+EVENTS_PAGE_SIZE = 100
+EVENTS_PAGE_WINDOW = 4   # /events pages fetched concurrently
+EVENTS_MAX_PAGES = 50    # pages read per range before it is split in half
+
+# Adaptive scan window (block counts / seconds)
+TIP_DELAY = 30               # blocks left behind the head for Find to finish indexing
+TIP_WINDOW = 20              # smallest window worth scanning near the head
+MIN_WINDOW = 20
+MAX_WINDOW = 2000
+TARGET_WINDOW_EVENTS = 2000  # deposit events per window before it is shrunk
+TARGET_WINDOW_SECONDS = 20   # window processing time before it is shrunk
+TIP_POLL_INTERVAL = 5        # seconds between head probes when caught up
+HEAD_BEHIND_LIMIT = 12       # consecutive head reads below the checkpoint before the scanner fails
+PIPELINE_QUEUE_SIZE = 2      # windows buffered between ingestion stages
+
+# Event source: "find" (REST, indexed TIP_DELAY behind) or "flow" (access node gRPC)
+SCANNER_EVENT_SOURCE = os.getenv("SCANNER_EVENT_SOURCE", "find")
+FLOW_ACCESS_HOST = os.getenv("FLOW_ACCESS_HOST", "access.mainnet.nodes.onflow.org")  # emulator: 127.0.0.1
+FLOW_ACCESS_PORT = int(os.getenv("FLOW_ACCESS_PORT", "9000"))  # emulator: 3569
+FLOW_EVENTS_CHUNK = 250      # blocks per get_events_for_height_range call (access node limit)
+FLOW_EVENTS_CONCURRENCY = 4  # height-range calls in flight
+FLOW_TIP_DELAY = 0           # sealed blocks are final; nothing to wait for
+FLOW_RETRIES = 3
+CORRELATE_EVENTS = os.getenv("SCANNER_CORRELATE_EVENTS", "1") != "0"  # join Withdraw/Deposit events instead of per-gift lookups
+GRAPHQL_URL = os.getenv("TOPSHOT_GRAPHQL_URL", "https://public-api.nbatopshot.com/graphql")
+AUTH_URL = os.getenv("FIND_AUTH_URL", "https://api.find.xyz/auth/v1/generate")
+TOKEN_EXPIRY = "1h"
+TOKEN_REFRESH_MARGIN = 300  # refresh the JWT this many seconds before it expires
+
+# Shared HTTP client (seconds / connection counts)
+HTTP_TIMEOUT = 15
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_POOL_SIZE = 100
+HTTP_POOL_PER_HOST = 20
+HTTP_KEEPALIVE = 60
+
+# Per-host adaptive rate limiter shared by every outbound request (requests/s, requests)
+LIMITER_INITIAL_RATE = 50.0
+LIMITER_MIN_RATE = 0.5
+LIMITER_MAX_RATE = 500.0
+LIMITER_RATE_STEP = 5.0           # added per round of successful requests
+LIMITER_INITIAL_CONCURRENCY = 8
+LIMITER_MIN_CONCURRENCY = 1
+LIMITER_MAX_CONCURRENCY = HTTP_POOL_PER_HOST
+LIMITER_BACKOFF = 0.5             # rate and concurrency multiplier on 429/5xx/errors
+LIMITER_DECREASE_INTERVAL = 1.0   # seconds; failures of one burst back off only once
+LIMITER_DEFAULT_PAUSE = 1.0       # seconds paused on a 429 without Retry-After
+
+# Moment metadata cache
+METADATA_CACHE_SIZE = 20000      # entries kept in the in-process LRU
+METADATA_NEGATIVE_TTL = 600      # seconds before a failed lookup is retried
+GRAPHQL_BATCH_SIZE = 25          # moments per aliased getMintedMoment request
+GRAPHQL_CONCURRENCY = 4          # batched GraphQL requests in flight
 
 
 # ==============================
-# RETRYING GET REQUEST
+# METRICS
 # ==============================
-async def get_with_retries(
+UPSTREAM_SECONDS = histogram(
+    "swapfest_upstream_request_seconds", "Upstream HTTP request latency.", ("upstream", "endpoint"))
+UPSTREAM_RESPONSES = counter(
+    "swapfest_upstream_responses_total", "Upstream HTTP responses by status (\"error\" for transport failures).",
+    ("upstream", "endpoint", "status"))
+UPSTREAM_RETRIES = counter(
+    "swapfest_upstream_retries_total", "Upstream requests retried, by reason.", ("upstream", "reason"))
+UPSTREAM_THROTTLE_SECONDS = counter(
+    "swapfest_upstream_throttle_wait_seconds_total", "Seconds requests waited for the upstream rate limiter.", ("upstream",))
+METADATA_LOOKUPS = counter(
+    "swapfest_metadata_cache_lookups_total", "Moment metadata lookups by where they were answered.", ("source",))
+UPSTREAM_RATE_LIMIT = gauge(
+    "swapfest_upstream_rate_limit", "Request rate currently allowed per upstream host (requests/s).",
+    ("upstream", "host"))
+UPSTREAM_CONCURRENCY_LIMIT = gauge(
+    "swapfest_upstream_concurrency_limit", "Requests currently allowed in flight per upstream host.",
+    ("upstream", "host"))
+SCANNER_HEAD = gauge("swapfest_scanner_chain_head", "Latest block height indexed by Find.")
+SCANNER_BEHIND = gauge("swapfest_scanner_blocks_behind_head", "Blocks between the next unscanned block and the head.")
+SCANNER_CHECKPOINT = gauge("swapfest_scanner_checkpoint_height", "Last block height stored by the live scanner.")
+SCANNER_WINDOW_SECONDS = histogram(
+    "swapfest_scanner_window_seconds", "Processing time of a scan window, excluding queue waits.",
+    buckets=WINDOW_BUCKETS)
+SCANNER_EVENTS = counter("swapfest_scanner_deposit_events_total", "Deposit events read from Find.")
+SCANNER_GIFTS = counter("swapfest_scanner_gifts_total", "Gifts written by the scanner.", ("result",))
+
+
+def upstream_labels(url: str) -> tuple[str, str]:
+    """
+    Name the upstream and endpoint of a request URL for metrics.
+    
+    Args:
+        url: Request URL.
+    
+    Returns:
+        Tuple of (upstream, endpoint), e.g. ("find", "events").
+    """
+    path = url.split("?", 1)[0]
+    if path == GRAPHQL_URL:
+        return "topshot", "graphql"
+    if path.startswith(BASE_URL) or path == AUTH_URL:
+        return "find", path.rsplit("/", 1)[-1]
+    return path.split("/")[2] if "://" in path else "other", path.rsplit("/", 1)[-1]
+
+
+# ==============================
+# HTTP CLIENT
+# ==============================
+class HttpError(Exception):
+    """
+    Raised for a non-retryable HTTP status (4xx other than 429).
+    """
+
+    def __init__(self, status: int, url: str, body: str = ""):
+        super().__init__(f"HTTP {status} for {url}: {body[:200]}")
+        self.status = status
+        self.url = url
+        self.body = body
+
+
+@dataclass
+class HttpResponse:
+    """
+    Fully-read HTTP response, safe to use after the connection is released.
+    """
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+    url: str
+
+    def json(self):
+        return json.loads(self.body)
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            raise HttpError(self.status, self.url, self.body.decode(errors="replace"))
+
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Return the module-wide aiohttp session, creating it on first use.
+    
+    The session keeps a keep-alive connection pool per host, so requests to
+    api.find.xyz and public-api.nbatopshot.com reuse TLS connections.
+    A new session is created if the previous one was closed or belongs to a
+    different event loop.
+    
+    Returns:
+        Shared aiohttp.ClientSession.
+    """
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE,
+            ttl_dns_cache=300,
+        )
+        timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        _session_loop = loop
+    return _session
+
+
+async def close_http_session() -> None:
+    """
+    Close the shared HTTP session and its connection pool.
+    """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+# ==============================
+# RATE LIMITING
+# ==============================
+class HostLimiter:
+    """
+    Adaptive rate and concurrency limit for one upstream host.
+    
+    Requests take a token from a bucket refilled at `rate` per second and a
+    slot among `concurrency` in flight. Every round of successes (one per
+    allowed slot) raises the rate by LIMITER_RATE_STEP and the concurrency
+    by one; a 429, 5xx or transport error halves both, at most once per
+    LIMITER_DECREASE_INTERVAL. A 429's Retry-After pauses every request to
+    the host, not only the one that received it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        upstream: str,
+        rate: float = LIMITER_INITIAL_RATE,
+        concurrency: int = LIMITER_INITIAL_CONCURRENCY
+    ):
+        self.host = host
+        self.upstream = upstream
+        self.rate = rate
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decreased_at = 0.0
+        self._successes = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._publish()
+
+    def _publish(self) -> None:
+        UPSTREAM_RATE_LIMIT.labels(self.upstream, self.host).set(self.rate)
+        UPSTREAM_CONCURRENCY_LIMIT.labels(self.upstream, self.host).set(self.concurrency)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.concurrency:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def acquire(self) -> None:
+        """
+        Wait for a pause to end, a free slot and a token.
+        """
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            UPSTREAM_THROTTLE_SECONDS.labels(self.upstream).inc(paused)
+            await asyncio.sleep(paused)
+
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+
+        try:
+            while True:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._refilled_at) * self.rate)
+                    self._refilled_at = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                UPSTREAM_THROTTLE_SECONDS.labels(self.upstream).inc(wait)
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        """
+        Free the slot taken by acquire().
+        """
+        self.in_flight -= 1
+        self._wake()
+
+    def record(self, status: int | None, retry_after: str | None = None) -> None:
+        """
+        Adapt the limits to a response.
+        
+        Args:
+            status: HTTP status, or None for a transport error.
+            retry_after: The response's Retry-After header, if any.
+        """
+        if status is not None and status < 500 and status != 429:
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                self.rate = min(LIMITER_MAX_RATE, self.rate + LIMITER_RATE_STEP)
+                self.concurrency = min(LIMITER_MAX_CONCURRENCY, self.concurrency + 1)
+                self._publish()
+                self._wake()
+            return
+
+        now = time.monotonic()
+        if status == 429:
+            try:
+                pause = float(retry_after) if retry_after else LIMITER_DEFAULT_PAUSE
+            except ValueError:
+                pause = LIMITER_DEFAULT_PAUSE
+            self._paused_until = max(self._paused_until, now + pause)
+        if now - self._decreased_at >= LIMITER_DECREASE_INTERVAL:
+            self._decreased_at = now
+            self._successes = 0
+            self.rate = max(LIMITER_MIN_RATE, self.rate * LIMITER_BACKOFF)
+            self.concurrency = max(LIMITER_MIN_CONCURRENCY, int(self.concurrency * LIMITER_BACKOFF))
+            self._tokens = min(self._tokens, 1.0)
+            self._publish()
+
+    def stats(self) -> dict:
+        """
+        Current limits of the host, for operators.
+        
+        Returns:
+            Dictionary with rate, concurrency, in_flight, waiting and paused_for.
+        """
+        return {
+            "rate": round(self.rate, 2),
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+        }
+
+
+_limiters: dict[str, HostLimiter] = {}
+_limiters_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_limiter(host: str, upstream: str) -> HostLimiter:
+    """
+    Return the limiter shared by every request to a host in this event loop.
+    
+    Args:
+        host: Host (and port) of the upstream.
+        upstream: Upstream name for metrics, e.g. "find" or "topshot".
+    
+    Returns:
+        The host's HostLimiter.
+    """
+    global _limiters_loop
+    loop = asyncio.get_running_loop()
+    if _limiters_loop is not loop:
+        _limiters.clear()
+        _limiters_loop = loop
+    limiter = _limiters.get(host)
+    if limiter is None:
+        limiter = _limiters[host] = HostLimiter(host, upstream)
+    return limiter
+
+
+def limiter_stats() -> dict[str, dict]:
+    """
+    Current limits of every upstream host, e.g. for a log line.
+    """
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
+
+
+async def http_request(method: str, url: str, **kwargs) -> HttpResponse:
+    """
+    Send a single HTTP request on the shared session and read the body.
+    
+    The request waits for its host's limiter, and its outcome adapts it.
+    
+    Args:
+        method: HTTP method ("GET", "POST", ...).
+        url: Request URL.
+        **kwargs: Additional arguments for aiohttp (headers, json, params, auth, timeout).
+    
+    Returns:
+        HttpResponse with status, headers and body.
+    """
+    session = get_http_session()
+    upstream, endpoint = upstream_labels(url)
+    limiter = get_limiter(url.split("/", 3)[2], upstream)
+    await limiter.acquire()
+    started = time.monotonic()
+    status = None
+    retry_after = None
+    cancelled = False
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            body = await response.read()
+            status = response.status
+            retry_after = response.headers.get('Retry-After')
+            return HttpResponse(response.status, response.headers, body, str(response.url))
+    except asyncio.CancelledError:
+        cancelled = True  # not the upstream's fault; leave the limits alone
+        raise
+    finally:
+        limiter.release()
+        if not cancelled:
+            limiter.record(status, retry_after)
+        UPSTREAM_SECONDS.labels(upstream, endpoint).observe(time.monotonic() - started)
+        UPSTREAM_RESPONSES.labels(upstream, endpoint, str(status) if status is not None else "error").inc()
+
+
+# ==============================
+# RETRYING REQUESTS
+# ==============================
+async def request_with_retries(
+    method: str,
     url: str,
-    headers: dict = {},
+    headers: dict | None = None,
     max_retries: int = 3,
     backoff_factor: float = 1.5,
     **kwargs
-) -> requests.Response:
+) -> HttpResponse:
     """
-    Perform GET request with exponential backoff retry logic.
+    Perform an HTTP request with exponential backoff retry logic.
+    
+    Retries on 429, 5xx, timeouts and connection errors. Other 4xx
+    responses are not retried. A 429 is retried without a local sleep: the
+    host's limiter has already paused every caller for its Retry-After.
     
     Args:
-        url: The URL to make the GET request to.
+        method: HTTP method.
+        url: The URL to request.
         headers: Optional HTTP headers for the request.
         max_retries: Maximum number of retry attempts.
         backoff_factor: Multiplier for wait time between retries.
-        **kwargs: Additional arguments to pass to requests.get().
+        **kwargs: Additional arguments to pass to http_request().
     
     Returns:
         The successful response object.
     
     Raises:
+        HttpError: On a non-retryable 4xx response.
         Exception: If all retry attempts fail.
     """
     attempt = 0
     wait_time = 1
+    upstream = upstream_labels(url)[0]
 
     while attempt < max_retries:
         try:
-            response = requests.get(url, headers=headers, **kwargs)
-            if response.status_code == 200:
+            response = await http_request(method, url, headers=headers, **kwargs)
+            if 200 <= response.status < 300:
                 return response
 
-            if response.status_code == 429:
-                retry_after = response.headers.get('Retry-After')
-                if retry_after:
-                    wait_time = float(retry_after)
-                else:
-                    wait_time *= backoff_factor
-            elif response.status_code >= 500:
-                print(f"Server error {response.status_code}. Retrying...")
+            if response.status == 429:
+                UPSTREAM_RETRIES.labels(upstream, "429").inc()
+                attempt += 1
+                continue
+            elif response.status >= 500:
+                reason = "5xx"
+                print(f"Server error {response.status}. Retrying...")
                 wait_time *= backoff_factor
             else:
-                await response.raise_for_status()
+                response.raise_for_status()
 
-        except requests.exceptions.RequestException as e:
-            print(f"Request error: {e}. Retrying...")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            reason = "error"
+            print(f"Request error: {e!r}. Retrying...")
             wait_time *= backoff_factor
 
+        UPSTREAM_RETRIES.labels(upstream, reason).inc()
         await asyncio.sleep(wait_time + random.uniform(0, 0.5))
         attempt += 1
 
-    raise Exception(f"Failed to get {url} after {max_retries} retries")
+    raise Exception(f"Failed to {method} {url} after {max_retries} retries")
+
+
+async def get_with_retries(
+    url: str,
+    headers: dict | None = None,
+    max_retries: int = 3,
+    backoff_factor: float = 1.5,
+    **kwargs
+) -> HttpResponse:
+    """
+    Perform GET request with exponential backoff retry logic.
+    
+    Args:
+        url: The URL to make the GET request to.
+        headers: Optional HTTP headers for the request.
+        max_retries: Maximum number of retry attempts.
+        backoff_factor: Multiplier for wait time between retries.
+        **kwargs: Additional arguments to pass to http_request().
+    
+    Returns:
+        The successful response object.
+    
+    Raises:
+        Exception: If all retry attempts fail.
+    """
+    return await request_with_retries("GET", url, headers, max_retries, backoff_factor, **kwargs)
 
 
 # ==============================
@@ -107,22 +544,127 @@ def get_points_for_tier(tier: str) -> int:
 
 
 # ==============================
-# GRAPHQL CALL
+# MOMENT METADATA CACHE
 # ==============================
-async def query_moment_metadata(moment_id: int) -> dict:
+class MomentMetadataCache:
     """
-    Query NBA Top Shot GraphQL API for moment metadata.
-    
-    Args:
-        moment_id: The unique identifier of the moment.
+    Two-level cache of moment metadata keyed by moment_id.
     
-    Returns:
-        Dictionary containing moment data (id, tier, set, play) or None if query fails.
+    Level 1 is an in-process LRU; level 2 is the moment_metadata table in the
+    gifts database. Metadata never changes once minted, so positive entries
+    never expire. Failed lookups are stored as negative entries (metadata
+    NULL) and expire after negative_ttl seconds.
     """
-    url = "https://public-api.nbatopshot.com/graphql"
-    query = """
-    query getMintedMoment($momentId: ID!) {
-      getMintedMoment(momentId: $momentId) {
+
+    def __init__(self, maxsize: int = METADATA_CACHE_SIZE, negative_ttl: float = METADATA_NEGATIVE_TTL):
+        self.maxsize = maxsize
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[int, tuple[dict | None, float]] = OrderedDict()
+
+    def _fresh(self, entry: tuple[dict | None, float]) -> bool:
+        metadata, fetched_at = entry
+        return metadata is not None or time.time() - fetched_at < self.negative_ttl
+
+    def _remember(self, moment_id: int, entry: tuple[dict | None, float]) -> None:
+        self._entries[moment_id] = entry
+        self._entries.move_to_end(moment_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self, moment_ids: list[int]) -> dict[int, tuple[dict | None, float]]:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" for _ in moment_ids)
+            cursor.execute(prepare_query(f'''
+                SELECT moment_id, metadata, fetched_at FROM moment_metadata
+                WHERE moment_id IN ({placeholders})
+            '''), tuple(moment_ids))
+            rows = cursor.fetchall()
+            conn.commit()
+        return {
+            int(moment_id): (json.loads(metadata) if metadata is not None else None, float(fetched_at))
+            for moment_id, metadata, fetched_at in rows
+        }
+
+    def _store(self, entries: dict[int, tuple[dict | None, float]]) -> None:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(prepare_query('''
+                INSERT INTO moment_metadata (moment_id, metadata, fetched_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (moment_id) DO UPDATE
+                SET metadata = excluded.metadata, fetched_at = excluded.fetched_at
+            '''), [
+                (moment_id, json.dumps(metadata) if metadata is not None else None, fetched_at)
+                for moment_id, (metadata, fetched_at) in entries.items()
+            ])
+            conn.commit()
+
+    async def get_many(self, moment_ids: list[int]) -> dict[int, dict | None]:
+        """
+        Look up moments in the LRU, then the rest in one database query.
+        
+        Args:
+            moment_ids: Moment identifiers to look up.
+        
+        Returns:
+            Mapping of moment_id to metadata for every cache hit. A value of None
+            is a cached negative result; ids missing from the mapping are misses.
+        """
+        found = {}
+        missing = []
+        for moment_id in dict.fromkeys(moment_ids):
+            entry = self._entries.get(moment_id)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(moment_id)
+                found[moment_id] = entry[0]
+            else:
+                missing.append(moment_id)
+        METADATA_LOOKUPS.labels("memory").inc(len(found))
+        if not missing:
+            return found
+
+        try:
+            loaded = await asyncio.to_thread(self._load, missing)
+        except Exception as e:
+            print(f"Metadata cache read failed: {e}", file=sys.stderr, flush=True)
+            loaded = {}
+        hits = 0
+        for moment_id, entry in loaded.items():
+            if self._fresh(entry):
+                self._remember(moment_id, entry)
+                found[moment_id] = entry[0]
+                hits += 1
+        METADATA_LOOKUPS.labels("database").inc(hits)
+        METADATA_LOOKUPS.labels("miss").inc(len(missing) - hits)
+        return found
+
+    async def put_many(self, results: dict[int, dict | None]) -> None:
+        """
+        Store lookup results (None for a failed lookup) in both levels.
+        
+        Args:
+            results: Mapping of moment_id to metadata, or None to record a negative result.
+        """
+        if not results:
+            return
+        now = time.time()
+        entries = {moment_id: (metadata, now) for moment_id, metadata in results.items()}
+        for moment_id, entry in entries.items():
+            self._remember(moment_id, entry)
+        try:
+            await asyncio.to_thread(self._store, entries)
+        except Exception as e:
+            print(f"Metadata cache write failed: {e}", file=sys.stderr, flush=True)
+
+
+metadata_cache = MomentMetadataCache()
+
+
+# ==============================
+# GRAPHQL CALL
+# ==============================
+MOMENT_FIELDS = """
         data {
           id
           tier
@@ -133,48 +675,161 @@ async def query_moment_metadata(moment_id: int) -> dict:
             headline
           }
         }
-      }
-    }
+"""
+
+
+def build_moments_query(moment_ids: list[int]) -> dict:
+    """
+    Build one GraphQL payload that fetches several moments via aliases.
+    
+    Args:
+        moment_ids: Moment identifiers; alias m<i> resolves moment_ids[i].
+    
+    Returns:
+        JSON payload with query and variables.
+    """
+    params = ", ".join(f"$m{i}: ID!" for i in range(len(moment_ids)))
+    fields = "".join(
+        f"      m{i}: getMintedMoment(momentId: $m{i}) {{{MOMENT_FIELDS}      }}\n"
+        for i in range(len(moment_ids))
+    )
+    query = f"query getMintedMoments({params}) {{\n{fields}}}"
+    variables = {f"m{i}": str(moment_id) for i, moment_id in enumerate(moment_ids)}
+    return {"query": query, "variables": variables}
+
+
+async def fetch_moment_batch(moment_ids: list[int]) -> dict[int, dict | None]:
+    """
+    Resolve a batch of moments with one aliased GraphQL request.
+    
+    Transport and HTTP errors are retried by request_with_retries(), paced
+    by the Top Shot host's limiter. If the API answers with GraphQL
+    errors, the batch is split in half and each half is retried, until the
+    bad id is isolated and recorded as None.
+    
+    Args:
+        moment_ids: Moment identifiers in this batch.
+    
+    Returns:
+        Mapping of moment_id to metadata (None if it could not be resolved).
     """
-    variables = {"momentId": str(moment_id)}
-    payload = {"query": query, "variables": variables}
+    payload = build_moments_query(moment_ids)
     headers = {
         "User-Agent": "PetJokicsHorses",
         "Content-Type": "application/json"
     }
 
-    for attempt in range(5):
+    try:
+        response = await request_with_retries(
+            "POST", GRAPHQL_URL, headers=headers, max_retries=5,
+            json=payload, timeout=aiohttp.ClientTimeout(total=10)
+        )
+        body = response.json()
+    except Exception as e:
+        print(f"Failed to get metadata for moment IDs {moment_ids}: {e}")
+        return {moment_id: None for moment_id in moment_ids}
+
+    if body.get("errors"):
+        if len(moment_ids) == 1:
+            print(f"GraphQL error for moment ID {moment_ids[0]}: {body['errors']}")
+            return {moment_ids[0]: None}
+        middle = len(moment_ids) // 2
+        left, right = await asyncio.gather(
+            fetch_moment_batch(moment_ids[:middle]),
+            fetch_moment_batch(moment_ids[middle:])
+        )
+        return {**left, **right}
+
+    results = {}
+    data = body.get("data") or {}
+    for i, moment_id in enumerate(moment_ids):
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data["data"]["getMintedMoment"]["data"]
-        except (requests.RequestException, KeyError, TypeError) as e:
-            print(f"Error querying GraphQL (attempt {attempt + 1}): {e}")
-            await asyncio.sleep(1.5 * (attempt + 1))
-
-    print(f"Failed to get metadata for moment ID {moment_id} after retries.")
-    return None
+            results[moment_id] = data[f"m{i}"]["data"]
+        except (KeyError, TypeError):
+            results[moment_id] = None
+    return results
+
+
+async def fetch_moments_metadata(
+    moment_ids: list[int],
+    batch_size: int = GRAPHQL_BATCH_SIZE
+) -> dict[int, dict | None]:
+    """
+    Query NBA Top Shot GraphQL API for many moments in batched requests.
+    
+    Args:
+        moment_ids: Moment identifiers to resolve.
+        batch_size: Maximum number of moments per GraphQL request.
+    
+    Returns:
+        Mapping of moment_id to metadata (None if it could not be resolved).
+    """
+    moment_ids = list(dict.fromkeys(moment_ids))
+    batch_size = max(1, batch_size)
+    batches = [moment_ids[i:i + batch_size] for i in range(0, len(moment_ids), batch_size)]
+    semaphore = asyncio.Semaphore(GRAPHQL_CONCURRENCY)
+
+    async def fetch(batch: list[int]) -> dict[int, dict | None]:
+        async with semaphore:
+            return await fetch_moment_batch(batch)
+
+    results = {}
+    for batch_result in await asyncio.gather(*(fetch(batch) for batch in batches)):
+        results.update(batch_result)
+    return results
+
+
+async def query_moments_metadata(
+    moment_ids: list[int],
+    batch_size: int = GRAPHQL_BATCH_SIZE
+) -> dict[int, dict | None]:
+    """
+    Get metadata for many moments, from the cache when possible.
+    
+    Args:
+        moment_ids: Moment identifiers to resolve.
+        batch_size: Maximum number of moments per GraphQL request for cache misses.
+    
+    Returns:
+        Mapping of moment_id to metadata (None if it could not be resolved).
+    """
+    moment_ids = [int(moment_id) for moment_id in moment_ids]
+    results = await metadata_cache.get_many(moment_ids)
+    missing = [moment_id for moment_id in dict.fromkeys(moment_ids) if moment_id not in results]
+    if missing:
+        fetched = await fetch_moments_metadata(missing, batch_size)
+        await metadata_cache.put_many(fetched)
+        results.update(fetched)
+    return results
+
+
+async def query_moment_metadata(moment_id: int) -> dict:
+    """
+    Get metadata for a single moment, from the cache when possible.
+    
+    Args:
+        moment_id: The unique identifier of the moment.
+    
+    Returns:
+        Dictionary containing moment data (id, tier, set, play) or None if query fails.
+    """
+    results = await query_moments_metadata([moment_id])
+    return results.get(int(moment_id))
 
 
 # ==============================
 # FINAL GET MOMENT POINTS
 # ==============================
-async def get_moment_points(moment_id: int) -> int:
+def score_moment(metadata: dict) -> int:
     """
-    Calculate point value for a given moment based on tier and special rules.
+    Calculate point value for moment metadata based on tier and special rules.
     
     Args:
-        moment_id: The unique identifier of the moment.
+        metadata: Moment data (id, tier, set, play).
     
     Returns:
         Point value for the moment (250 for set.flowId==2, tier-based for Jokic moments, 0 otherwise).
     """
-    metadata = await query_moment_metadata(moment_id)
-    if metadata is None:
-        print(f"Failed to get metadata for moment {moment_id}", file=sys.stderr, flush=True)
-        return 0
-
     # Special rule: if set.flowId == 2, award 250 points
     flow_id = metadata.get("set", {}).get("flowId")
     if flow_id == 2:
@@ -189,7 +844,76 @@ async def get_moment_points(moment_id: int) -> int:
     # print(f"Moment ID {moment_id} is tier {tier}, awarded {points} points.")
     return points
 
-def generate_jwt_token(expiry: str = "168h") -> tuple[str, dict]:
+
+async def get_moments_points(
+    moment_ids: list[int],
+    batch_size: int = GRAPHQL_BATCH_SIZE
+) -> dict[int, int]:
+    """
+    Calculate point values for many moments with batched metadata lookups.
+    
+    Args:
+        moment_ids: Moment identifiers to score.
+        batch_size: Maximum number of moments per GraphQL request.
+    
+    Returns:
+        Mapping of moment_id to point value (0 if metadata could not be resolved).
+    """
+    metadata_by_id = await query_moments_metadata(moment_ids, batch_size)
+    points = {}
+    for moment_id, metadata in metadata_by_id.items():
+        if metadata is None:
+            print(f"Failed to get metadata for moment {moment_id}", file=sys.stderr, flush=True)
+            points[moment_id] = 0
+        else:
+            points[moment_id] = score_moment(metadata)
+    return points
+
+
+async def get_moment_points(moment_id: int) -> int:
+    """
+    Calculate point value for a given moment based on tier and special rules.
+    
+    Args:
+        moment_id: The unique identifier of the moment.
+    
+    Returns:
+        Point value for the moment (250 for set.flowId==2, tier-based for Jokic moments, 0 otherwise).
+    """
+    points = await get_moments_points([moment_id])
+    return points.get(int(moment_id), 0)
+
+
+# ==============================
+# SCORE GIFTS
+# ==============================
+async def score_gifts(gifts: list[dict]) -> list[dict]:
+    """
+    Score a window of gifts with one batched metadata lookup.
+    
+    Args:
+        gifts: Gift dictionaries as returned by get_range_gifts().
+    
+    Returns:
+        Rows ready to store: txn_id, moment_id, from_address, points, timestamp.
+    """
+    points_by_moment = await get_moments_points([int(gift['moment_id']) for gift in gifts])
+    return [
+        {
+            "txn_id": gift['txn_id'],
+            "moment_id": int(gift['moment_id']),
+            "from_address": gift.get('from', 'unknown'),
+            "points": points_by_moment.get(int(gift['moment_id']), 0),
+            "timestamp": gift.get('timestamp', ''),
+        }
+        for gift in gifts
+    ]
+
+
+# ==============================
+# FIND API AUTH
+# ==============================
+async def generate_jwt_token(expiry: str = "168h") -> tuple[str, dict]:
     """
     Generate JWT token using Find.xyz API with Basic Auth.
     
@@ -200,135 +924,1219 @@ def generate_jwt_token(expiry: str = "168h") -> tuple[str, dict]:
         Tuple of (access_token, full_token_data).
     
     Raises:
-        HTTPError: If the API request fails.
+        HttpError: If the API rejects the request.
+        Exception: If all retry attempts fail.
     """
-    url = f"https://api.find.xyz/auth/v1/generate"
     params = {"expiry": expiry}
-    resp = requests.post(url, auth=HTTPBasicAuth(USERNAME, PASSWORD), params=params)
-    resp.raise_for_status()
+    resp = await request_with_retries(
+        "POST", AUTH_URL, auth=aiohttp.BasicAuth(USERNAME, PASSWORD), params=params
+    )
     data = resp.json()
     # expected keys: access_token, token_type, expires_in, etc.
     return data["access_token"], data
 
 
-# ==============================
-# FETCH FLOW EVENTS
-# ==============================
-async def get_block_gifts(block_height: int, offset: int) -> list[dict] | bool:
+def parse_duration(value: str) -> int:
     """
-    Fetch gift transactions from Flow blockchain within a block range.
+    Convert a Find expiry string ("90s", "10m", "2h") to seconds.
     
     Args:
-        block_height: Starting block height to query.
-        offset: Number of blocks to query from starting height.
+        value: Duration with an s/m/h suffix.
     
     Returns:
-        List of gift dictionaries containing moment_id, txn_id, timestamp, etc.
-        Returns False if blocks are not yet available.
+        Number of seconds.
     """
-    gifts = []
-    gift_txns = []
+    units = {"s": 1, "m": 60, "h": 3600}
+    return int(float(value[:-1]) * units[value[-1]])
 
-    delay = 30  # add few min delay for block info to get populated
-    token, token_info = generate_jwt_token(expiry="1h")
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
-    response = await get_with_retries(f"{BASE_URL}/blocks?height={block_height + offset + delay}", headers=headers)
-    blocks = response.json()
+
+class TokenManager:
+    """
+    Caches the Find API JWT and refreshes it shortly before it expires.
     
-    page = 0
-    eventsjson = list()
-    while True:
+    Concurrent callers share a single in-flight refresh.
+    """
 
-        if blocks['blocks'][0]['height'] != block_height + offset + delay:
-            # print('Waiting for more blocks')
-            await asyncio.sleep(10)
-            return False
-        response = await get_with_retries(
-            f"{BASE_URL}/events?from_height={block_height}&to_height={block_height + offset}&limit=100&offset={page * 100}&name=A.0b2a3299cc857e29.TopShot.Deposit",
-            headers=headers
-        )
-        #print(response.json())
-        new_events = list(response.json()['events'])
-        print(len(new_events))
-        eventsjson.extend(new_events)
-        if len(new_events) < 100:
-            break
-        page += 1
-        if page > 50:
-            break
+    def __init__(self, expiry: str = TOKEN_EXPIRY, refresh_margin: float = TOKEN_REFRESH_MARGIN):
+        self.expiry = expiry
+        self.refresh_margin = refresh_margin
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._refresh: asyncio.Task | None = None
 
-    for event in eventsjson:
-        if event['fields']['to'] == FLOW_ACCOUNT:
-            gift_txns.append(event['transaction_hash'])
+    def _valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at - self.refresh_margin
 
-    # print(f"Block {block_height}: Found gift transactions {gift_txns}")
+    async def _fetch(self) -> str:
+        token, token_info = await generate_jwt_token(expiry=self.expiry)
+        lifetime = token_info.get("expires_in") or parse_duration(self.expiry)
+        self._token = token
+        self._expires_at = time.time() + float(lifetime)
+        return token
 
-    for txn in gift_txns:
-        response = await get_with_retries(f"{BASE_URL}/transaction?id={txn}", headers=headers)
-        try:
-            txn_content = response.json()
-            if txn_content['transactions'][0]['status'] != 'SEALED':
-                continue
-            events = txn_content['transactions'][0]['events']
-            if len(events) < 4:
-                continue
-            if events[0]['name'] == 'A.0b2a3299cc857e29.TopShot.Withdraw' and \
-                    events[3]['name'] == 'A.0b2a3299cc857e29.TopShot.Deposit' and \
-                    events[3]['fields']['to'] == FLOW_ACCOUNT:
-                gift = events[0]['fields']
-                gift['moment_id'] = gift['id']
-                del gift['id']
-                gift['txn_id'] = txn_content['transactions'][0]['id']
-                gift['timestamp'] = txn_content['transactions'][0]['timestamp']
-                gifts.append(gift)
-        except (KeyError, JSONDecodeError):
-            pass
+    async def get_token(self) -> str:
+        """
+        Return a valid token, refreshing it if it is missing or about to expire.
+        
+        Returns:
+            Bearer token for the Find API.
+        """
+        if self._valid():
+            return self._token
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self._fetch())
+        return await asyncio.shield(self._refresh)
 
+    def invalidate(self, token: str) -> None:
+        """
+        Drop a token the API rejected, unless it was already replaced.
+        
+        Args:
+            token: The token that received a 401.
+        """
+        if self._token == token:
+            self._token = None
+            self._expires_at = 0.0
+
+
+token_manager = TokenManager()
+
+
+async def find_get(url: str, **kwargs) -> HttpResponse:
+    """
+    GET a Find API URL with the managed bearer token.
+    
+    On a 401 the token is refreshed once and the request retried.
+    
+    Args:
+        url: The Find API URL.
+        **kwargs: Additional arguments to pass to get_with_retries().
+    
+    Returns:
+        The successful response object.
+    """
+    token = await token_manager.get_token()
+    try:
+        return await get_with_retries(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+    except HttpError as e:
+        if e.status != 401:
+            raise
+        token_manager.invalidate(token)
+        token = await token_manager.get_token()
+        return await get_with_retries(url, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+
+
+# ==============================
+# FETCH GIFT TRANSACTIONS
+# ==============================
+def parse_gift_transaction(txn_content: dict) -> dict | None:
+    """
+    Extract a gift record from a /transaction response.
+    
+    Args:
+        txn_content: Parsed JSON body of a /transaction?id= response.
+    
+    Returns:
+        Gift dictionary (from, moment_id, txn_id, timestamp), or None if the
+        transaction is not a sealed Withdraw → treasury Deposit.
+    """
+    try:
+        transaction = txn_content['transactions'][0]
+        if transaction['status'] != 'SEALED':
+            return None
+        events = transaction['events']
+        if len(events) < 4:
+            return None
+        if events[0]['name'] == WITHDRAW_EVENT and \
+                events[3]['name'] == DEPOSIT_EVENT and \
+                events[3]['fields']['to'] == FLOW_ACCOUNT:
+            gift = events[0]['fields']
+            gift['moment_id'] = gift['id']
+            del gift['id']
+            gift['txn_id'] = transaction['id']
+            gift['timestamp'] = transaction['timestamp']
+            return gift
+    except (KeyError, IndexError, TypeError):
+        pass
+    return None
+
+
+async def fetch_gift_transactions(
+    txn_ids: list[str],
+    concurrency: int = TXN_CONCURRENCY
+) -> tuple[list[dict], dict[str, Exception]]:
+    """
+    Fetch and parse transactions concurrently, keeping results in input order.
+    
+    Args:
+        txn_ids: Transaction hashes in event order.
+        concurrency: Maximum number of requests in flight at once.
+    
+    Returns:
+        Tuple of (gifts in event order, {txn_id: exception} for failed lookups).
+        A failed lookup never cancels the others.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(txn: str) -> dict | None:
+        async with semaphore:
+            response = await find_get(f"{BASE_URL}/transaction?id={txn}")
+        return parse_gift_transaction(response.json())  # a non-JSON body is a failed lookup, not "no gift"
+
+    results = await asyncio.gather(*(fetch(txn) for txn in txn_ids), return_exceptions=True)
+
+    gifts = []
+    failures = {}
+    for txn, result in zip(txn_ids, results):
+        if isinstance(result, Exception):
+            failures[txn] = result
+        elif result is not None:
+            gifts.append(result)
+    return gifts, failures
+
+
+# ==============================
+# FETCH FLOW EVENTS
+# ==============================
+@dataclass
+class RangeStats:
+    """
+    Page and event counts for one /events block range.
+    """
+    event_name: str
+    from_height: int
+    to_height: int
+    pages: int = 0
+    events: int = 0
+    split: bool = False      # range hit EVENTS_MAX_PAGES and was queried as two halves
+    truncated: bool = False  # single-block range still hit the cap; events may be missing
+
+    def __str__(self) -> str:
+        status = " (split)" if self.split else " (TRUNCATED)" if self.truncated else ""
+        return f"{self.event_name} {self.from_height}-{self.to_height}: {self.pages} pages, {self.events} events{status}"
+
+
+async def fetch_range_events(
+    event_name: str,
+    from_height: int,
+    to_height: int,
+    stats: list[RangeStats] | None = None
+) -> list[dict]:
+    """
+    Fetch every event of one type in a block range from the Find API.
+    
+    Pages are fetched EVENTS_PAGE_WINDOW at a time until a short page is
+    returned. If a range still has more events after EVENTS_MAX_PAGES pages,
+    it is split in half and each half is queried on its own, so events are
+    never dropped silently.
+    
+    Args:
+        event_name: Fully qualified event type (e.g. DEPOSIT_EVENT).
+        from_height: First block height (inclusive).
+        to_height: Last block height (inclusive).
+        stats: Optional list that receives a RangeStats entry per queried range.
+    
+    Returns:
+        Events in block order.
+    """
+    range_stats = RangeStats(event_name, from_height, to_height)
+    events = []
+    page = 0
+    exhausted = False
+
+    while not exhausted and page < EVENTS_MAX_PAGES:
+        window = range(page, min(page + EVENTS_PAGE_WINDOW, EVENTS_MAX_PAGES))
+        responses = await asyncio.gather(*(
+            find_get(
+                f"{BASE_URL}/events?from_height={from_height}&to_height={to_height}"
+                f"&limit={EVENTS_PAGE_SIZE}&offset={p * EVENTS_PAGE_SIZE}&name={event_name}"
+            )
+            for p in window
+        ))
+        for response in responses:
+            new_events = list(response.json()['events'])
+            range_stats.pages += 1
+            events.extend(new_events)
+            if len(new_events) < EVENTS_PAGE_SIZE:
+                exhausted = True
+                break
+        page += len(window)
+
+    if not exhausted:
+        if to_height > from_height:
+            range_stats.split = True
+            if stats is not None:
+                stats.append(range_stats)
+            middle = (from_height + to_height) // 2
+            left, right = await asyncio.gather(
+                fetch_range_events(event_name, from_height, middle, stats),
+                fetch_range_events(event_name, middle + 1, to_height, stats)
+            )
+            return left + right
+        range_stats.truncated = True
+        print(f"Event range truncated: {range_stats}", file=sys.stderr, flush=True)
+
+    range_stats.events = len(events)
+    if stats is not None:
+        stats.append(range_stats)
+    return events
+
+
+async def find_gift_txn_ids(
+    from_height: int,
+    to_height: int,
+    stats: list[RangeStats] | None = None
+) -> list[str]:
+    """
+    Find transactions in a block range that deposited a moment into the treasury.
+    
+    Args:
+        from_height: First block height (inclusive).
+        to_height: Last block height (inclusive).
+        stats: Optional list that receives RangeStats for the /events queries.
+    
+    Returns:
+        Transaction hashes in event order.
+    """
+    eventsjson = await fetch_range_events(DEPOSIT_EVENT, from_height, to_height, stats)
+
+    gift_txns = []
+    for event in eventsjson:
+        if event['fields']['to'] == FLOW_ACCOUNT:
+            gift_txns.append(event['transaction_hash'])
+
+    # print(f"Block {from_height}: Found gift transactions {gift_txns}")
+    return gift_txns
+
+
+class TransactionLookupError(Exception):
+    """
+    Raised when some transactions of a window could not be looked up after
+    retries; the window must not be stored (or checkpointed) without them.
+    
+    Attributes:
+        gifts: Gifts of the transactions that were resolved.
+        failures: {txn_id: exception} for the lookups that failed.
+    """
+
+    def __init__(self, gifts: list[dict], failures: dict[str, Exception]):
+        super().__init__(f"{len(failures)} transaction lookups failed, e.g. {next(iter(failures))}")
+        self.gifts = gifts
+        self.failures = failures
+
+
+async def resolve_gifts(txn_ids: list[str], txn_concurrency: int = TXN_CONCURRENCY) -> list[dict]:
+    """
+    Turn treasury deposit transactions into gift records.
+    
+    Every failed lookup is logged; one failure does not cancel the others,
+    but any failure is raised, since the gift would otherwise be lost.
+    
+    Args:
+        txn_ids: Transaction hashes in event order.
+        txn_concurrency: Maximum number of /transaction lookups in flight.
+    
+    Returns:
+        List of gift dictionaries containing moment_id, txn_id, timestamp, etc.
+    
+    Raises:
+        TransactionLookupError: If any lookup failed after retries.
+    """
+    gifts, failures = await fetch_gift_transactions(txn_ids, txn_concurrency)
+    for txn, error in failures.items():
+        print(f"Failed to fetch transaction {txn}: {error}", file=sys.stderr, flush=True)
+    if failures:
+        raise TransactionLookupError(gifts, failures)
     return gifts
 
 
+async def get_range_gifts(
+    from_height: int,
+    to_height: int,
+    txn_concurrency: int = TXN_CONCURRENCY,
+    stats: list[RangeStats] | None = None,
+    correlate: bool = CORRELATE_EVENTS
+) -> list[dict]:
+    """
+    Fetch gift transactions in a block range that is already indexed by Find.
+    
+    Args:
+        from_height: First block height (inclusive).
+        to_height: Last block height (inclusive).
+        txn_concurrency: Maximum number of /transaction lookups in flight.
+        stats: Optional list that receives RangeStats for the /events queries.
+        correlate: Build gifts from Withdraw/Deposit range events and look up
+            only ambiguous transactions, instead of looking up every gift.
+    
+    Returns:
+        List of gift dictionaries containing moment_id, txn_id, timestamp, etc.
+    
+    Raises:
+        TransactionLookupError: If a transaction lookup failed after retries.
+    """
+    gifts, pending = await FindEventSource(correlate).find_gifts(from_height, to_height, stats)
+    return gifts + await resolve_gifts(pending, txn_concurrency)
+
+
+async def get_block_gifts(
+    block_height: int,
+    offset: int,
+    txn_concurrency: int = TXN_CONCURRENCY
+) -> list[dict] | bool:
+    """
+    Fetch gift transactions from Flow blockchain within a block range.
+    
+    Args:
+        block_height: Starting block height to query.
+        offset: Number of blocks to query from starting height.
+        txn_concurrency: Maximum number of /transaction lookups in flight.
+    
+    Returns:
+        List of gift dictionaries containing moment_id, txn_id, timestamp, etc.
+        Returns False if blocks are not yet available.
+    """
+    response = await find_get(f"{BASE_URL}/blocks?height={block_height + offset + TIP_DELAY}")
+    blocks = response.json()
+
+    if blocks['blocks'][0]['height'] != block_height + offset + TIP_DELAY:
+        # print('Waiting for more blocks')
+        await asyncio.sleep(10)
+        return False
+
+    stats = []
+    gifts = await get_range_gifts(block_height, block_height + offset, txn_concurrency, stats)
+    for range_stats in stats:
+        print(range_stats)
+    SCANNER_EVENTS.inc(sum(range_stats.events for range_stats in stats if range_stats.event_name == DEPOSIT_EVENT))
+    return gifts
+
+
+# ==============================
+# EVENT CORRELATION
+# ==============================
+def _optional_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class TransferEvent:
+    """
+    A TopShot Withdraw or Deposit event, reduced to what gift detection needs.
+    
+    address is the Deposit's "to" or the Withdraw's "from". event_index is
+    the event's position in its transaction, block_height its block; either
+    is None if the source omits it or sends something that is not a number,
+    and such a deposit is settled by a transaction lookup.
+    """
+    txn_id: str
+    event_index: int | None
+    moment_id: str
+    address: str | None
+    timestamp: str | None
+    block_height: int | None
+
+    @classmethod
+    def from_find(cls, event: dict) -> "TransferEvent":
+        fields = event.get('fields', {})
+        return cls(
+            txn_id=event['transaction_hash'],
+            event_index=_optional_int(event.get('event_index')),
+            moment_id=str(fields.get('id')),
+            address=fields.get('to', fields.get('from')),
+            timestamp=event.get('timestamp'),
+            block_height=_optional_int(event.get('block_height')),
+        )
+
+    @classmethod
+    def from_flow(cls, event, block_height: int, timestamp: str) -> "TransferEvent":
+        fields = event_fields(event)
+        return cls(
+            txn_id=event.transaction_id.hex(),
+            event_index=event.event_index,
+            moment_id=str(fields.get('id')),
+            address=fields.get('to', fields.get('from')),
+            timestamp=timestamp,
+            block_height=block_height,
+        )
+
+
+def correlate_gifts(deposits: list[TransferEvent], withdraws: list[TransferEvent]) -> tuple[list[dict], list[str]]:
+    """
+    Join Deposit and Withdraw events of a block range into gift records.
+    
+    A treasury deposit is a gift when its transaction has exactly one
+    TopShot Withdraw and one Deposit, at event indexes 0 and 3, for the same
+    moment: the shape parse_gift_transaction() checks on the full
+    transaction. Any other treasury deposit (batched transfers, purchases,
+    events without index, block height or timestamp) is left for a
+    transaction lookup.
+    
+    Args:
+        deposits: Deposit events of the range.
+        withdraws: Withdraw events of (at least) the blocks holding treasury deposits.
+    
+    Returns:
+        Tuple of (gift dictionaries in event order, ambiguous transaction hashes).
+    """
+    deposits_by_txn: dict[str, list[TransferEvent]] = {}
+    for deposit in deposits:
+        deposits_by_txn.setdefault(deposit.txn_id, []).append(deposit)
+    withdraws_by_txn: dict[str, list[TransferEvent]] = {}
+    for withdraw in withdraws:
+        withdraws_by_txn.setdefault(withdraw.txn_id, []).append(withdraw)
+
+    gifts, ambiguous = [], []
+    for txn_id, txn_deposits in deposits_by_txn.items():
+        if not any(deposit.address == FLOW_ACCOUNT for deposit in txn_deposits):
+            continue
+        txn_withdraws = withdraws_by_txn.get(txn_id, [])
+        if len(txn_deposits) == 1 and len(txn_withdraws) == 1:
+            deposit, withdraw = txn_deposits[0], txn_withdraws[0]
+            if (withdraw.event_index == 0 and deposit.event_index == 3
+                    and withdraw.moment_id == deposit.moment_id and deposit.timestamp
+                    and deposit.block_height is not None):
+                gifts.append({
+                    "from": withdraw.address,
+                    "moment_id": withdraw.moment_id,
+                    "txn_id": txn_id,
+                    "timestamp": deposit.timestamp,
+                })
+                continue
+        ambiguous.append(txn_id)
+    return gifts, ambiguous
+
+
+# ==============================
+# EVENT SOURCES
+# ==============================
+class EventSource(ABC):
+    """
+    Where the scanner reads treasury deposits and gift transactions from.
+    
+    tip_delay is how many blocks behind the reported head the source is
+    complete; the scheduler never scans closer to the head than that.
+    With correlate set, find_gifts() builds gifts from range events and
+    leaves only ambiguous transactions for resolve_gifts().
+    """
+    name = ""
+    tip_delay = TIP_DELAY
+
+    def __init__(self, correlate: bool = CORRELATE_EVENTS):
+        self.correlate = correlate
+
+    @abstractmethod
+    async def get_head(self) -> int:
+        """
+        Get the latest block height the source can serve.
+        """
+
+    @abstractmethod
+    async def range_events(
+        self,
+        event_name: str,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> list[TransferEvent]:
+        """
+        Read every Withdraw or Deposit event of a block range.
+        
+        Args:
+            event_name: WITHDRAW_EVENT or DEPOSIT_EVENT.
+            from_height: First block height (inclusive).
+            to_height: Last block height (inclusive).
+            stats: Optional list that receives RangeStats for the event queries.
+        
+        Returns:
+            Events in block order.
+        """
+
+    async def find_gift_txn_ids(
+        self,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> list[str]:
+        """
+        Find transactions in a block range that deposited a moment into the treasury.
+        
+        Args:
+            from_height: First block height (inclusive).
+            to_height: Last block height (inclusive).
+            stats: Optional list that receives RangeStats for the event queries.
+        
+        Returns:
+            Transaction hashes (hex) in event order.
+        """
+        deposits = await self.range_events(DEPOSIT_EVENT, from_height, to_height, stats)
+        return [deposit.txn_id for deposit in deposits if deposit.address == FLOW_ACCOUNT]
+
+    async def find_gifts(
+        self,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> tuple[list[dict], list[str]]:
+        """
+        Find the gifts of a block range, as far as range events allow.
+        
+        Withdraw events are only read for the blocks that hold treasury
+        deposits, so the number of calls follows event density, not the
+        number of gifts.
+        
+        Args:
+            from_height: First block height (inclusive).
+            to_height: Last block height (inclusive).
+            stats: Optional list that receives RangeStats for the event queries.
+        
+        Returns:
+            Tuple of (gift dictionaries, transaction hashes still to pass to
+            resolve_gifts()). Without correlate, every gift is left to resolve.
+        """
+        if not self.correlate:
+            return [], await self.find_gift_txn_ids(from_height, to_height, stats)
+        deposits = await self.range_events(DEPOSIT_EVENT, from_height, to_height, stats)
+        treasury = [deposit for deposit in deposits if deposit.address == FLOW_ACCOUNT]
+        if not treasury:
+            return [], []
+        heights = [deposit.block_height for deposit in treasury if deposit.block_height is not None]
+        withdraws = []
+        if heights:
+            withdraws = await self.range_events(WITHDRAW_EVENT, min(heights), max(heights), stats)
+        return correlate_gifts(deposits, withdraws)
+
+    @abstractmethod
+    async def resolve_gifts(self, txn_ids: list[str], txn_concurrency: int = TXN_CONCURRENCY) -> list[dict]:
+        """
+        Turn treasury deposit transactions into gift records.
+        
+        Args:
+            txn_ids: Transaction hashes returned by find_gift_txn_ids().
+            txn_concurrency: Maximum number of transaction lookups in flight.
+        
+        Returns:
+            Gift dictionaries (from, moment_id, txn_id, timestamp) in event order.
+        
+        Raises:
+            TransactionLookupError: If any lookup failed; its failed txn_ids
+                can be passed to resolve_gifts() again.
+        """
+
+    async def close(self) -> None:
+        pass
+
+
+class FindEventSource(EventSource):
+    """
+    The Find REST API: paged /events, and /transaction for gifts that range
+    events do not settle.
+    """
+    name = "find"
+    tip_delay = TIP_DELAY
+
+    def __init__(self, correlate: bool = CORRELATE_EVENTS):
+        super().__init__(correlate)
+        self._head = STARTING_HEIGHT  # last head found; the next search starts there
+
+    async def get_head(self) -> int:
+        self._head = await get_chain_head(self._head)
+        return self._head
+
+    async def range_events(
+        self,
+        event_name: str,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> list[TransferEvent]:
+        events = await fetch_range_events(event_name, from_height, to_height, stats)
+        return [TransferEvent.from_find(event) for event in events]
+
+    async def resolve_gifts(self, txn_ids: list[str], txn_concurrency: int = TXN_CONCURRENCY) -> list[dict]:
+        return await resolve_gifts(txn_ids, txn_concurrency)
+
+
+def cadence_value(value: dict | None):
+    """
+    Convert a JSON-Cadence value to a plain value (Optional unwrapped,
+    integers as int, Address as its "0x…" string).
+    """
+    while value is not None and value.get("type") == "Optional":
+        value = value.get("value")
+    if value is None:
+        return None
+    if value["type"].startswith(("UInt", "Int")):
+        return int(value["value"])
+    return value["value"]
+
+
+def event_fields(event) -> dict:
+    """
+    Read the fields of a flow_py_sdk event as plain values.
+    
+    Decoded from the raw JSON-Cadence payload: flow_py_sdk's decoded event
+    overwrites a field named "id" (TopShot's moment id) with the event type.
+    """
+    payload = json.loads(event.payload)
+    return {field["name"]: cadence_value(field["value"]) for field in payload["value"]["fields"]}
+
+
+def parse_flow_gift(txn_id: str, result, timestamp: str) -> dict | None:
+    """
+    Extract a gift record from an access node transaction result.
+    
+    Applies the same shape check as parse_gift_transaction(): a sealed
+    transaction whose first event is a Withdraw and fourth a Deposit to the
+    treasury.
+    
+    Args:
+        txn_id: Transaction hash (hex).
+        result: flow_py_sdk TransactionResultResponse.
+        timestamp: Timestamp of the transaction's block.
+    
+    Returns:
+        Gift dictionary (from, moment_id, txn_id, timestamp), or None.
+    """
+    if result.status != TransactionStatus.SEALED or result.error_message:
+        return None
+    events = result.events
+    if len(events) < 4 or events[0].type != WITHDRAW_EVENT or events[3].type != DEPOSIT_EVENT:
+        return None
+    if event_fields(events[3]).get("to") != FLOW_ACCOUNT:
+        return None
+    withdraw = event_fields(events[0])
+    return {
+        "from": withdraw.get("from"),
+        "moment_id": str(withdraw.get("id")),
+        "txn_id": txn_id,
+        "timestamp": timestamp,
+    }
+
+
+class FlowAccessNodeSource(EventSource):
+    """
+    A Flow access node over gRPC.
+    
+    Events are read with get_events_for_height_range in FLOW_EVENTS_CHUNK
+    block chunks, several chunks in parallel, up to the latest sealed block.
+    Gifts are resolved with get_transaction_result. Point FLOW_ACCESS_HOST /
+    FLOW_ACCESS_PORT at the Flow emulator (127.0.0.1:3569) with
+    TOPSHOT_CONTRACT and SWAPFEST_TREASURY set to its accounts to test locally.
+    """
+    name = "flow"
+    tip_delay = FLOW_TIP_DELAY
+
+    def __init__(
+        self,
+        host: str = FLOW_ACCESS_HOST,
+        port: int = FLOW_ACCESS_PORT,
+        chunk_size: int = FLOW_EVENTS_CHUNK,
+        concurrency: int = FLOW_EVENTS_CONCURRENCY,
+        correlate: bool = CORRELATE_EVENTS
+    ):
+        super().__init__(correlate)
+        self.host = host
+        self.port = port
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self._client = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+        self._block_times: dict[str, str] = {}  # txn_id -> block timestamp, until resolved
+
+    def client(self):
+        """
+        Return the access node client, creating it for the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = flow_client(host=self.host, port=self.port)
+            self._client_loop = loop
+        return self._client
+
+    async def _call(self, endpoint: str, method: str, **kwargs):
+        wait_time = 1.0
+        limiter = get_limiter(f"{self.host}:{self.port}", "flow")
+        for attempt in range(FLOW_RETRIES):
+            await limiter.acquire()
+            started = time.monotonic()
+            status = "ok"
+            try:
+                return await getattr(self.client(), method)(**kwargs)
+            except asyncio.CancelledError:
+                status = "cancelled"  # not the access node's fault; leave the limits alone
+                raise
+            except Exception as e:
+                status = "error"
+                if attempt == FLOW_RETRIES - 1:
+                    raise
+                print(f"Access node {method} failed: {e!r}. Retrying...", file=sys.stderr, flush=True)
+            finally:
+                limiter.release()
+                if status != "cancelled":
+                    limiter.record(200 if status == "ok" else None)
+                UPSTREAM_SECONDS.labels("flow", endpoint).observe(time.monotonic() - started)
+                UPSTREAM_RESPONSES.labels("flow", endpoint, status).inc()
+            UPSTREAM_RETRIES.labels("flow", "error").inc()
+            await asyncio.sleep(wait_time + random.uniform(0, 0.5))
+            wait_time *= 1.5
+
+    async def get_head(self) -> int:
+        header = await self._call("head", "get_latest_block_header", is_sealed=True)
+        return int(header.height)
+
+    async def range_events(
+        self,
+        event_name: str,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> list[TransferEvent]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(start: int) -> list:
+            async with semaphore:
+                return await self._call(
+                    "events", "get_events_for_height_range",
+                    type=event_name, start_height=start, end_height=min(start + self.chunk_size - 1, to_height)
+                )
+
+        chunks = await asyncio.gather(*(
+            fetch(start) for start in range(from_height, to_height + 1, self.chunk_size)
+        ))
+        range_stats = RangeStats(event_name, from_height, to_height, pages=len(chunks))
+        events = []
+        for block in sorted((block for chunk in chunks for block in chunk), key=lambda block: block.block_height):
+            timestamp = block.block_timestamp.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            for event in block.events:
+                transfer = TransferEvent.from_flow(event, block.block_height, timestamp)
+                if event_name == DEPOSIT_EVENT and transfer.address == FLOW_ACCOUNT:
+                    self._block_times[transfer.txn_id] = timestamp
+                events.append(transfer)
+        range_stats.events = len(events)
+        if stats is not None:
+            stats.append(range_stats)
+        return events
+
+    async def find_gifts(
+        self,
+        from_height: int,
+        to_height: int,
+        stats: list[RangeStats] | None = None
+    ) -> tuple[list[dict], list[str]]:
+        gifts, pending = await super().find_gifts(from_height, to_height, stats)
+        for gift in gifts:
+            self._block_times.pop(gift["txn_id"], None)
+        return gifts, pending
+
+    async def resolve_gifts(self, txn_ids: list[str], txn_concurrency: int = TXN_CONCURRENCY) -> list[dict]:
+        semaphore = asyncio.Semaphore(max(1, txn_concurrency))
+
+        async def fetch(txn_id: str) -> dict | None:
+            async with semaphore:
+                result = await self._call("transaction_result", "get_transaction_result", id=bytes.fromhex(txn_id))
+            return parse_flow_gift(txn_id, result, self._block_times.get(txn_id))
+
+        results = await asyncio.gather(*(fetch(txn_id) for txn_id in txn_ids), return_exceptions=True)
+        gifts, failures = [], {}
+        for txn_id, result in zip(txn_ids, results):
+            if isinstance(result, Exception):
+                print(f"Failed to fetch transaction {txn_id}: {result}", file=sys.stderr, flush=True)
+                failures[txn_id] = result  # keeps its block time for the retry
+                continue
+            self._block_times.pop(txn_id, None)
+            if result is not None:
+                gifts.append(result)
+        if failures:
+            raise TransactionLookupError(gifts, failures)
+        return gifts
+
+    async def close(self) -> None:
+        if self._client is not None:
+            self._client.channel.close()
+            self._client = None
+
+
+EVENT_SOURCES = {"find": FindEventSource, "flow": FlowAccessNodeSource}
+
+
+def get_event_source(name: str = SCANNER_EVENT_SOURCE) -> EventSource:
+    """
+    Create the scanner's event source by name ("find" or "flow").
+    
+    Raises:
+        ValueError: For an unknown name.
+    """
+    if name not in EVENT_SOURCES:
+        raise ValueError(f"Unknown event source {name!r}; expected one of {', '.join(EVENT_SOURCES)}")
+    return EVENT_SOURCES[name]()
+
+
+# ==============================
+# WINDOW SCHEDULING
+# ==============================
+async def block_indexed(height: int) -> bool:
+    """
+    Check whether the Find API has indexed a block.
+    
+    Args:
+        height: Block height to probe.
+    
+    Returns:
+        True if /blocks?height= returns that very block.
+    """
+    response = await find_get(f"{BASE_URL}/blocks?height={height}")
+    blocks = response.json().get('blocks') or []
+    return bool(blocks) and int(blocks[0]['height']) == height
+
+
+async def get_chain_head(known_height: int = STARTING_HEIGHT) -> int:
+    """
+    Get the height of the latest block indexed by the Find API.
+    
+    Gallops from a known height with /blocks?height= probes (known + 1, + 2,
+    + 4, ... until a block is missing), then bisects the last step, so a
+    call costs about 2 * log2(blocks added since known_height) requests.
+    If known_height itself is not indexed, the search gallops downwards.
+    
+    Args:
+        known_height: A recent head, e.g. the previous result.
+    
+    Returns:
+        Latest block height.
+    
+    Raises:
+        RuntimeError: If no block down to height 0 is indexed.
+    """
+    step = 1
+    if await block_indexed(known_height):
+        low, high = known_height, None
+        while high is None:
+            if await block_indexed(low + step):
+                low += step
+                step *= 2
+            else:
+                high = low + step
+    else:
+        low, high = None, known_height
+        while low is None:
+            candidate = max(high - step, 0)
+            if await block_indexed(candidate):
+                low = candidate
+            elif candidate == 0:
+                raise RuntimeError("Find has no indexed blocks")
+            else:
+                high = candidate
+                step *= 2
+    # low is indexed, high is not
+    while high - low > 1:
+        middle = (low + high) // 2
+        if await block_indexed(middle):
+            low = middle
+        else:
+            high = middle
+    return low
+
+
+class WindowScheduler:
+    """
+    Chooses the size of the next scan window from the backlog and past windows.
+    
+    Far behind the head, the window grows (doubling per window) up to
+    max_window so a backlog is covered in few, large windows. Within reach of
+    the head, a window starts as soon as tip_window blocks are ready and is
+    capped by what is ready. After each window the size is shrunk when the window
+    held more than target_events deposit events or took longer than
+    target_seconds.
+    
+    blocks_behind_head is the ingestion lag in blocks, updated on every
+    refresh_head() call.
+    """
+
+    def __init__(
+        self,
+        min_window: int = MIN_WINDOW,
+        max_window: int = MAX_WINDOW,
+        tip_window: int = TIP_WINDOW,
+        target_events: int = TARGET_WINDOW_EVENTS,
+        target_seconds: float = TARGET_WINDOW_SECONDS,
+        source: EventSource | None = None
+    ):
+        self.source = source or FindEventSource()
+        self.min_window = min_window
+        self.max_window = max_window
+        self.tip_window = tip_window
+        self.target_events = target_events
+        self.target_seconds = target_seconds
+        self.window = min_window
+        self.head: int | None = None
+        self.blocks_behind_head: int | None = None
+        self.head_behind_reads = 0
+
+    async def refresh_head(self, next_height: int) -> int:
+        """
+        Read the chain head once and update the lag.
+        
+        A head below the last stored block is logged; it can happen briefly
+        (e.g. after switching to a source that indexes further behind), but
+        HEAD_BEHIND_LIMIT reads in a row mean the source does not report
+        its newest block, and the scanner stops rather than wait forever.
+        
+        Args:
+            next_height: First block height not yet processed.
+        
+        Returns:
+            Latest indexed block height.
+        
+        Raises:
+            RuntimeError: If the head stayed below the checkpoint too long.
+        """
+        self.head = await self.source.get_head()
+        if self.head < next_height - 1:
+            self.head_behind_reads += 1
+            print(
+                f"Error: {self.source.name} head {self.head} is below the last stored block {next_height - 1} "
+                f"({self.head_behind_reads}/{HEAD_BEHIND_LIMIT})",
+                file=sys.stderr, flush=True
+            )
+            if self.head_behind_reads >= HEAD_BEHIND_LIMIT:
+                raise RuntimeError(
+                    f"{self.source.name} head {self.head} stayed below the checkpoint {next_height - 1}; "
+                    "is the head query returning the newest block?"
+                )
+        else:
+            self.head_behind_reads = 0
+        self.blocks_behind_head = max(0, self.head - next_height + 1)
+        SCANNER_HEAD.set(self.head)
+        SCANNER_BEHIND.set(self.blocks_behind_head)
+        return self.head
+
+    def next_window(self, next_height: int) -> int | None:
+        """
+        Size the next window starting at next_height.
+        
+        Args:
+            next_height: First block height not yet processed.
+        
+        Returns:
+            Number of blocks to scan, or None if fewer than tip_window blocks are ready.
+        """
+        ready = self.head - self.source.tip_delay - next_height + 1
+        if ready < self.tip_window:
+            return None
+        if ready > self.max_window:
+            return min(self.window, ready)
+        return min(max(self.window, self.tip_window), ready)
+
+    def record(self, blocks: int, events: int, seconds: float) -> None:
+        """
+        Adjust the window size from the last window's density and latency.
+        
+        Args:
+            blocks: Number of blocks in the window.
+            events: Number of deposit events the window contained.
+            seconds: Wall-clock time spent on the window.
+        """
+        size = blocks * 2
+        if events > self.target_events:
+            size = min(size, blocks * self.target_events // events)
+        if seconds > self.target_seconds:
+            size = min(size, int(blocks * self.target_seconds / seconds))
+        self.window = max(self.min_window, min(self.max_window, size))
+
+
+window_scheduler = WindowScheduler()
+
+
+# ==============================
+# INGESTION PIPELINE
+# ==============================
+@dataclass
+class ScanWindow:
+    """
+    One block window moving through the ingestion pipeline.
+    """
+    from_height: int
+    to_height: int
+    stats: list[RangeStats] = field(default_factory=list)
+    txn_ids: list[str] = field(default_factory=list)
+    gifts: list[dict] = field(default_factory=list)
+    rows: list[dict] = field(default_factory=list)
+    busy_seconds: float = 0.0  # time spent in stages, excluding queue waits
+
+
+async def fetch_stage(scheduler: WindowScheduler, next_height: int, out_queue: asyncio.Queue) -> None:
+    """
+    Stage 1: pick windows and find the gifts in each; transactions that range
+    events do not settle are left in txn_ids for the resolve stage.
+    
+    Args:
+        scheduler: Window scheduler that sizes each window.
+        next_height: First block height to scan.
+        out_queue: Queue of ScanWindow for the resolve stage.
+    """
+    while True:
+        await scheduler.refresh_head(next_height)
+        size = scheduler.next_window(next_height)
+        if size is None:
+            await asyncio.sleep(TIP_POLL_INTERVAL)
+            continue
+
+        started = time.monotonic()
+        window = ScanWindow(next_height, next_height + size - 1)
+        window.gifts, window.txn_ids = await scheduler.source.find_gifts(
+            window.from_height, window.to_height, window.stats
+        )
+        window.busy_seconds += time.monotonic() - started
+        await out_queue.put(window)
+        next_height = window.to_height + 1
+
+
+async def resolve_stage(
+    in_queue: asyncio.Queue,
+    out_queue: asyncio.Queue,
+    txn_concurrency: int = TXN_CONCURRENCY,
+    source: EventSource | None = None
+) -> None:
+    """
+    Stage 2: resolve each window's remaining transactions into gift records.
+    
+    A window whose lookups fail is held here, retrying only the failed
+    transactions every RESOLVE_RETRY_INTERVAL seconds, so the checkpoint
+    never moves past a gift that was not stored. Upstream stages block on
+    the full queue meanwhile.
+    
+    Args:
+        in_queue: Queue of ScanWindow from the fetch stage.
+        out_queue: Queue of ScanWindow for the score stage.
+        txn_concurrency: Maximum number of transaction lookups in flight.
+        source: Event source the transactions came from (default: Find).
+    """
+    source = source or FindEventSource()
+    while True:
+        window = await in_queue.get()
+        started = time.monotonic()
+        pending = window.txn_ids
+        while pending:
+            try:
+                window.gifts += await source.resolve_gifts(pending, txn_concurrency)
+                pending = []
+            except TransactionLookupError as e:
+                window.gifts += e.gifts
+                pending = [txn_id for txn_id in pending if txn_id in e.failures]
+                print(
+                    f"Holding window {window.from_height}-{window.to_height}: {len(pending)} transaction "
+                    f"lookups failed, retrying in {RESOLVE_RETRY_INTERVAL}s",
+                    file=sys.stderr, flush=True
+                )
+                await asyncio.sleep(RESOLVE_RETRY_INTERVAL)
+        window.busy_seconds += time.monotonic() - started
+        await out_queue.put(window)
+
+
+async def score_stage(in_queue: asyncio.Queue, out_queue: asyncio.Queue) -> None:
+    """
+    Stage 3: score each window's gifts with batched metadata lookups.
+    
+    Args:
+        in_queue: Queue of ScanWindow from the resolve stage.
+        out_queue: Queue of ScanWindow for the persist stage.
+    """
+    while True:
+        window = await in_queue.get()
+        started = time.monotonic()
+        window.rows = await score_gifts(window.gifts)
+        window.busy_seconds += time.monotonic() - started
+        await out_queue.put(window)
+
+
+async def persist_stage(in_queue: asyncio.Queue, scheduler: WindowScheduler, checkpoint: bool = True) -> None:
+    """
+    Stage 4: store each window's gifts and advance the block checkpoint.
+    
+    Windows arrive in block order. Gifts and checkpoint are written in one
+    transaction, so the checkpoint never moves past a window whose gifts
+    are not stored.
+    
+    Args:
+        in_queue: Queue of ScanWindow from the score stage.
+        scheduler: Window scheduler that receives each window's cost.
+        checkpoint: Whether to save the block checkpoint.
+    """
+    while True:
+        window = await in_queue.get()
+        started = time.monotonic()
+        inserted, updated = await asyncio.to_thread(
+            save_gifts, window.rows, LIVE_CHECKPOINT if checkpoint else None, window.to_height
+        )
+        window.busy_seconds += time.monotonic() - started
+
+        events = sum(range_stats.events for range_stats in window.stats if range_stats.event_name == DEPOSIT_EVENT)
+        scheduler.record(window.to_height - window.from_height + 1, events, window.busy_seconds)
+        SCANNER_WINDOW_SECONDS.observe(window.busy_seconds)
+        SCANNER_EVENTS.inc(events)
+        SCANNER_GIFTS.labels("inserted").inc(inserted)
+        SCANNER_GIFTS.labels("rescored").inc(updated)
+        if checkpoint:
+            SCANNER_CHECKPOINT.set(window.to_height)
+        print(
+            f"Window {window.from_height}-{window.to_height}: {len(window.rows)} gifts, {events} events, "
+            f"{window.busy_seconds:.1f}s, {scheduler.head - window.to_height} blocks behind head, "
+            f"next window {scheduler.window}"
+        )
+
+
 # ==============================
 # MAIN LOOP
 # ==============================
-async def main(offset: int = OFFSET) -> None:
+async def main(offset: int = OFFSET, source: EventSource | None = None) -> None:
     """
     Main processing loop that monitors blockchain for gift transactions.
     
+    Windows flow through four stages (range fetch → transaction resolution →
+    metadata scoring → persistence) joined by bounded queues, so the next
+    window's events load while the previous one is still scored and stored.
+    
     Args:
-        offset: Number of blocks to process in each iteration.
+        offset: Number of blocks to rewind from the last checkpoint on startup.
+            The checkpoint is only saved when this is the default OFFSET.
+        source: Where events and transactions are read from; defaults to
+            SCANNER_EVENT_SOURCE.
     """
     # all_gifts = []
     #reset_last_processed_block("129210000")
-    block_height = get_last_processed_block() - offset
+    await asyncio.to_thread(migrate)
+    block_height = get_live_checkpoint() - offset
+    source = source or get_event_source()
+    scheduler = window_scheduler
+    scheduler.source = source
 
-    while True:
-        new_gifts = await get_block_gifts(block_height, offset)
-
-        if new_gifts is False:
-            continue  # Do NOT advance block_height
-        for gift in new_gifts:
-            moment_id = int(gift['moment_id'])
-            # print(f"Checking moment ID {moment_id} for points...")
-            points = await get_moment_points(moment_id)
-            if points == 0:
-                points = await get_moment_points(moment_id)
-            # print(f"Transaction {gift['txn_id']} - Awarded {points} points")
-            # all_gifts.append((gift, points))
-            save_gift(
-                txn_id=gift['txn_id'],
-                moment_id=int(gift['moment_id']),
-                from_address=gift.get('from', 'unknown'),
-                points=points,
-                timestamp=gift.get('timestamp', '')
-            )
-        if offset == OFFSET:
-            save_last_processed_block(block_height + offset)
-        block_height += offset + 1
-        await asyncio.sleep(0.01)
-        # print(f"Next block_height: {block_height}")
-
-        # Optional stop condition
-        # if block_height > STARTING_HEIGHT + 1000:
-        #     break
\ No newline at end of file
+    resolve_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    score_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    persist_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stages = [
+        asyncio.ensure_future(fetch_stage(scheduler, block_height, resolve_queue)),
+        asyncio.ensure_future(resolve_stage(resolve_queue, score_queue, source=source)),
+        asyncio.ensure_future(score_stage(score_queue, persist_queue)),
+        asyncio.ensure_future(persist_stage(persist_queue, scheduler, checkpoint=offset == OFFSET)),
+    ]
+    try:
+        # Stages run forever; the first one to fail stops the pipeline.
+        await asyncio.gather(*stages)
+    finally:
+        for stage in stages:
+            stage.cancel()
+        await source.close()
+        await close_http_session()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the live Swapfest gift scanner.")
+    parser.add_argument("--offset", type=int, default=OFFSET, help="blocks to rewind from the checkpoint on startup")
+    parser.add_argument("--source", choices=sorted(EVENT_SOURCES), default=SCANNER_EVENT_SOURCE,
+                        help="read events from the Find API or directly from a Flow access node")
+    args = parser.parse_args()
+    start_snapshots("scanner")
+    asyncio.run(main(args.offset, get_event_source(args.source)))
@@ -0,0 +1,127 @@
+import asyncio
+import copy
+
+import swapfest
+from benchmarks.mock_upstream import MockConfig, block_events, transaction
+from swapfest import DEPOSIT_EVENT, FLOW_ACCOUNT, WITHDRAW_EVENT, TransferEvent, parse_gift_transaction
+
+
+FROM_HEIGHT, TO_HEIGHT = 1_000, 1_400
+TIMESTAMP = "2025-10-01T12:00:00Z"
+
+
+class ChainSource(swapfest.EventSource):
+    """
+    Event source over in-memory Find events and /transaction bodies.
+    """
+    name = "test"
+
+    def __init__(self, events: list[dict], transactions: dict[str, dict]):
+        super().__init__(correlate=True)
+        self.events = events
+        self.transactions = transactions
+
+    async def get_head(self) -> int:
+        return TO_HEIGHT
+
+    async def range_events(self, event_name, from_height, to_height, stats=None):
+        # Events whose height is malformed are returned with every range, as
+        # the API returned them for the range that was asked for
+        return [
+            TransferEvent.from_find(event) for event in self.events
+            if event["name"] == event_name
+            and (not isinstance(event["block_height"], int) or from_height <= event["block_height"] <= to_height)
+        ]
+
+    async def resolve_gifts(self, txn_ids, txn_concurrency=swapfest.TXN_CONCURRENCY):
+        # A fresh body per lookup, as if decoded from JSON: parsing edits it in place
+        gifts = (parse_gift_transaction(copy.deepcopy(self.transactions[txn_id])) for txn_id in txn_ids)
+        return [gift for gift in gifts if gift is not None]
+
+
+def _event(name: str, txn_id: str, index: int, moment_id: str, address: str, height) -> dict:
+    key = "to" if name == DEPOSIT_EVENT else "from"
+    return {"name": name, "transaction_hash": txn_id, "event_index": index, "block_height": height,
+            "timestamp": TIMESTAMP, "fields": {"id": moment_id, key: address}}
+
+
+def _multi_event_transactions(height: int) -> tuple[list[dict], dict[str, dict]]:
+    """
+    Transactions the mock chain does not produce: batched gifts, a gift with
+    a second deposit elsewhere, and one gift whose event has a bad height.
+    """
+    transfer = {"name": f"{swapfest.TOPSHOT_CONTRACT}.MomentTransferred", "fields": {}}
+    layouts = {
+        # Two moments gifted in one transaction
+        "b" * 64: [(WITHDRAW_EVENT, "m1", "0xaaa"), transfer, transfer, (DEPOSIT_EVENT, "m1", FLOW_ACCOUNT),
+                   (WITHDRAW_EVENT, "m2", "0xaaa"), (DEPOSIT_EVENT, "m2", FLOW_ACCOUNT)],
+        # A gift plus a transfer to someone else
+        "c" * 64: [(WITHDRAW_EVENT, "m3", "0xbbb"), transfer, transfer, (DEPOSIT_EVENT, "m3", FLOW_ACCOUNT),
+                   (WITHDRAW_EVENT, "m4", "0xbbb"), (DEPOSIT_EVENT, "m4", "0xccc")],
+        # A plain gift whose events carry a malformed block height
+        "d" * 64: [(WITHDRAW_EVENT, "m5", "0xddd"), transfer, transfer, (DEPOSIT_EVENT, "m5", FLOW_ACCOUNT)],
+    }
+    events, transactions = [], {}
+    for txn_id, layout in layouts.items():
+        body = []
+        for index, item in enumerate(layout):
+            if isinstance(item, dict):
+                body.append(item)
+                continue
+            name, moment_id, address = item
+            key = "to" if name == DEPOSIT_EVENT else "from"
+            body.append({"name": name, "fields": {"id": moment_id, key: address}})
+            events.append(_event(name, txn_id, index, moment_id, address, "n/a" if txn_id[0] == "d" else height))
+        transactions[txn_id] = {"transactions": [
+            {"id": txn_id, "status": "SEALED", "timestamp": TIMESTAMP, "events": body}
+        ]}
+    return events, transactions
+
+
+def _chain() -> ChainSource:
+    config = MockConfig(gifts_per_block=0.5, purchase_share=0.3)
+    events = [event for height in range(FROM_HEIGHT, TO_HEIGHT + 1) for event in block_events(config, height)]
+    transactions = {event["transaction_hash"]: transaction(config, event["transaction_hash"]) for event in events}
+    extra_events, extra_transactions = _multi_event_transactions(FROM_HEIGHT + 7)
+    return ChainSource(events + extra_events, {**transactions, **extra_transactions})
+
+
+def _key(gift: dict) -> tuple:
+    return gift["txn_id"], str(gift["moment_id"]), gift["from"], gift["timestamp"]
+
+
+def test_correlated_gifts_match_transaction_lookups():
+    source = _chain()
+
+    async def scan():
+        # Baseline: every treasury deposit transaction parsed in full
+        # (a batched transaction is listed once per deposit; gifts are keyed by txn_id)
+        txn_ids = await source.find_gift_txn_ids(FROM_HEIGHT, TO_HEIGHT)
+        expected = await source.resolve_gifts(list(dict.fromkeys(txn_ids)))
+        # Correlated: gifts from range events, lookups only for the rest
+        correlated, pending = await source.find_gifts(FROM_HEIGHT, TO_HEIGHT)
+        resolved = await source.resolve_gifts(pending)
+        return expected, correlated, pending, resolved
+
+    expected, correlated, pending, resolved = asyncio.run(scan())
+
+    assert sorted(map(_key, correlated + resolved)) == sorted(map(_key, expected))
+    assert correlated, "the mock chain has plain gifts that need no lookup"
+    # Purchases and multi-event transactions are never settled from events alone
+    purchases = {
+        event["transaction_hash"] for event in source.events
+        if event["name"] == DEPOSIT_EVENT and event["fields"]["to"] == FLOW_ACCOUNT and event["event_index"] == 4
+    }
+    assert purchases, "the mock chain has purchase deposits"
+    assert purchases | {"b" * 64, "c" * 64, "d" * 64} <= set(pending)
+    assert not purchases & {gift["txn_id"] for gift in expected}
+
+
+def test_malformed_block_height_is_left_for_lookup():
+    event = _event(DEPOSIT_EVENT, "e" * 64, 3, "m9", FLOW_ACCOUNT, "not-a-height")
+    transfer = TransferEvent.from_find(event)
+    assert transfer.block_height is None
+
+    withdraw = TransferEvent.from_find(_event(WITHDRAW_EVENT, "e" * 64, 0, "m9", "0xeee", 5))
+    gifts, ambiguous = swapfest.correlate_gifts([transfer], [withdraw])
+    assert gifts == [] and ambiguous == ["e" * 64]
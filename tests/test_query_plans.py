@@ -0,0 +1,18 @@
+import pytest
+
+import db
+from migrations import check_plans, migrate
+
+
+pytestmark = pytest.mark.skipif(db.db_type != 'sqlite', reason="uses a throwaway SQLite database")
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "SQLITE_PATH", str(tmp_path / "plans.db"))
+    migrate()
+
+
+def test_hot_queries_use_their_indexes(sqlite_db):
+    assert check_plans() == []
+
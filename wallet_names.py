@@ -0,0 +1,180 @@
+import argparse
+import threading
+import time
+from collections.abc import Callable, Iterable
+
+from db import get_pool
+from response_cache import VersionProbe
+from standings import bump_data_version, bump_leaderboard_version, get_data_version
+from utils.helpers import map_wallet_to_username
+
+
+# ==============================
+# CONFIG
+# ==============================
+USERNAME_CACHE_TTL = 600      # seconds a resolved username is reused
+USERNAME_VERSION_TTL = 5.0    # seconds between checks for mappings changed by other processes
+WALLET_NAMES_VERSION = "wallet_names"  # data_versions row bumped when a wallet mapping changes
+
+
+# ==============================
+# LOOKUPS
+# ==============================
+def lookup_usernames(addresses: Iterable[str]) -> dict[str, str]:
+    """
+    Resolve wallet addresses to display names.
+    
+    utils.helpers only resolves one address at a time, so this still makes
+    one map_wallet_to_username call per distinct address; UsernameCache
+    keeps that to the addresses it has not seen recently.
+    
+    Args:
+        addresses: Flow addresses.
+    
+    Returns:
+        Mapping of address to username (the helpers fall back to the address).
+    """
+    return {address: map_wallet_to_username(address) for address in set(addresses)}
+
+
+def read_wallet_names_version() -> int:
+    """
+    Read the wallet mapping data version.
+    
+    Returns:
+        Version number, 0 if no mapping change was ever recorded.
+    """
+    with get_pool().connection() as conn:
+        return get_data_version(conn.cursor(), WALLET_NAMES_VERSION)
+
+
+# ==============================
+# CACHE
+# ==============================
+class UsernameCache:
+    """
+    Shared TTL cache in front of a batched wallet -> username lookup.
+    
+    Callers pass every address they need at once; only the addresses that are
+    missing or expired go to the lookup, in a single call. The whole cache is
+    dropped when the wallet mapping data version changes, so a mapping edited
+    in another process shows up within version_ttl seconds.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[Iterable[str]], dict[str, str]] = lookup_usernames,
+        ttl: float = USERNAME_CACHE_TTL,
+        read_version: Callable[[], int] | None = read_wallet_names_version,
+        version_ttl: float = USERNAME_VERSION_TTL
+    ):
+        self.lookup = lookup
+        self.ttl = ttl
+        self._entries: dict[str, tuple[str, float]] = {}  # address -> (username, fetched_at)
+        self._lock = threading.Lock()
+        self._version_probe = VersionProbe(read_version, version_ttl) if read_version else None
+        self._version: int | None = None
+
+    def _check_version(self) -> None:
+        if self._version_probe is None:
+            return
+        version = self._version_probe.get()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def resolve(self, addresses: Iterable[str]) -> dict[str, str]:
+        """
+        Resolve many addresses with at most one lookup for the uncached ones.
+        
+        Args:
+            addresses: Flow addresses; duplicates are fine.
+        
+        Returns:
+            Mapping of every distinct address to its username.
+        """
+        addresses = set(addresses)
+        if not addresses:
+            return {}
+        self._check_version()
+        now = time.monotonic()
+        usernames = {}
+        with self._lock:
+            for address in addresses:
+                entry = self._entries.get(address)
+                if entry is not None and now - entry[1] < self.ttl:
+                    usernames[address] = entry[0]
+        missing = addresses - usernames.keys()
+        if missing:
+            found = self.lookup(missing)
+            with self._lock:
+                for address in missing:
+                    username = found.get(address, address)
+                    self._entries[address] = (username, now)
+                    usernames[address] = username
+        return usernames
+
+    def invalidate(self, addresses: Iterable[str] | None = None) -> None:
+        """
+        Drop cached usernames in this process.
+        
+        Args:
+            addresses: Addresses to drop, or None for all.
+        """
+        with self._lock:
+            if addresses is None:
+                self._entries.clear()
+            else:
+                for address in addresses:
+                    self._entries.pop(address, None)
+
+
+username_cache = UsernameCache()
+
+
+def resolve_usernames(addresses: Iterable[str]) -> dict[str, str]:
+    """
+    Resolve wallet addresses to usernames through the shared cache.
+    
+    Args:
+        addresses: Flow addresses.
+    
+    Returns:
+        Mapping of address to username.
+    """
+    return username_cache.resolve(addresses)
+
+
+def invalidate_usernames(addresses: Iterable[str] | None = None) -> None:
+    """
+    Forget cached usernames after a wallet mapping changed.
+    
+    Wallet mappings are owned by utils.helpers, outside this repository, so
+    nothing here calls this: it is the hook for the code that links, unlinks
+    or renames wallets, and for operators after editing mappings by hand
+    (python wallet_names.py --invalidate [ADDRESS ...]). Besides this
+    process's cache, it bumps the wallet mapping version so other processes
+    drop theirs, and the leaderboard version so cached leaderboard responses
+    are rebuilt with the new names.
+    
+    Args:
+        addresses: Addresses whose mapping changed, or None for all.
+    """
+    username_cache.invalidate(addresses)
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        bump_data_version(cursor, WALLET_NAMES_VERSION)
+        bump_leaderboard_version(cursor)
+        conn.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tell running Swapfest processes that wallet mappings changed.")
+    parser.add_argument("--invalidate", nargs="*", metavar="ADDRESS",
+                        help="addresses whose mapping changed (none: all)")
+    args = parser.parse_args()
+    if args.invalidate is None:
+        parser.error("nothing to do; pass --invalidate")
+    invalidate_usernames(args.invalidate or None)
+    print(f"Invalidated {len(args.invalidate) or 'all'} wallet mappings")
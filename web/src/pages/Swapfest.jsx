@@ -5,12 +5,86 @@ export default function Swapfest() {
   const [leaderboard, setLeaderboard] = useState([]);
 
   useEffect(() => {
-    fetch('https://mvponflow.cc/api/leaderboard')
-      .then(res => res.json())
-      .then(data => {
+    // The leaderboard comes from /api/leaderboard (cached, ETag-revalidated),
+    // polled until the live stream is up. The stream is an upgrade on top:
+    // a full snapshot on connect, then per-rank deltas. A server whose stream
+    // slots are full answers 503, and the page keeps polling meanwhile.
+    const API = 'https://mvponflow.cc/api/leaderboard';
+    const POLL_MS = 15000;
+    const STREAM_RETRY_MS = 30000;
+    let source;
+    let live = false;
+    let version = null;
+    let pollTimer;
+    let retryTimer;
+    let stopped = false;
+
+    const poll = () => {
+      if (stopped) return;
+      if (!live) {
+        fetch(API, { cache: 'no-cache' })
+          .then(res => (res.ok ? res.json() : null))
+          .then(data => {
+            if (data && !live && !stopped) {
+              setPrizePool(data.prize_pool);
+              setLeaderboard(data.leaderboard || []);
+            }
+          })
+          .catch(() => {});
+      }
+      pollTimer = setTimeout(poll, POLL_MS);
+    };
+
+    const connect = () => {
+      if (stopped) return;
+      source = new EventSource(`${API}/stream`);
+
+      source.addEventListener('snapshot', (event) => {
+        const data = JSON.parse(event.data);
+        live = true;
+        version = data.version;
         setPrizePool(data.prize_pool);
         setLeaderboard(data.leaderboard || []);
       });
+
+      source.addEventListener('delta', (event) => {
+        const data = JSON.parse(event.data);
+        if (data.from_version !== version) {
+          // Missed an update: reconnect to get a fresh snapshot
+          source.close();
+          live = false;
+          connect();
+          return;
+        }
+        version = data.version;
+        setPrizePool(data.prize_pool);
+        setLeaderboard(prev => {
+          const next = prev.slice(0, data.length);
+          data.changes.forEach(({ rank, entry }) => {
+            next[rank - 1] = entry;
+          });
+          return next;
+        });
+      });
+
+      source.onerror = () => {
+        // Back to polling; EventSource reconnects by itself unless the server
+        // refused the stream (e.g. 503), in which case retry it later
+        live = false;
+        if (source.readyState === EventSource.CLOSED) {
+          retryTimer = setTimeout(connect, STREAM_RETRY_MS);
+        }
+      };
+    };
+
+    poll();
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(pollTimer);
+      clearTimeout(retryTimer);
+      source.close();
+    };
   }, []);
 
   const formatTs = (ts) => {